@@ -1,6 +1,12 @@
 """
 Vercel serverless function handler for Django
+
+Django is set up and the WSGI handler (with its middleware chain) is built
+once per container at import time; every invocation reuses them. Heavy
+libraries (reportlab, geopy, requests) are only imported by the code paths
+that use them; check the cold-start cost with `python manage.py profile_imports`.
 """
+import io
 import os
 import sys
 from pathlib import Path
@@ -12,20 +18,16 @@ sys.path.insert(0, str(project_dir))
 # Set Django settings
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_driver_project.settings')
 
-import django
 from django.core.wsgi import get_wsgi_application
 
-# Initialize Django
-django.setup()
+# Initialize Django (get_wsgi_application() runs django.setup())
 application = get_wsgi_application()
 
 # Vercel handler
 def handler(request):
-    from django.http import HttpResponse
-    from django.core.handlers.wsgi import WSGIHandler
-    
-    # Create WSGI handler
-    wsgi_handler = WSGIHandler()
+    body = request.get('body') or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
     
     # Convert Vercel request to WSGI environ
     environ = {
@@ -33,12 +35,12 @@ def handler(request):
         'PATH_INFO': request.get('path', '/'),
         'QUERY_STRING': request.get('query', ''),
         'CONTENT_TYPE': request.get('headers', {}).get('content-type', ''),
-        'CONTENT_LENGTH': str(len(request.get('body', ''))),
+        'CONTENT_LENGTH': str(len(body)),
         'SERVER_NAME': 'localhost',
         'SERVER_PORT': '8000',
         'wsgi.version': (1, 0),
         'wsgi.url_scheme': 'https',
-        'wsgi.input': request.get('body', ''),
+        'wsgi.input': io.BytesIO(body),
         'wsgi.errors': sys.stderr,
         'wsgi.multithread': False,
         'wsgi.multiprocess': True,
@@ -49,8 +51,8 @@ def handler(request):
     for key, value in request.get('headers', {}).items():
         environ[f'HTTP_{key.upper().replace("-", "_")}'] = value
     
-    # Process request
-    response = wsgi_handler(environ, lambda *args: None)
+    # Process request with the handler built at import (one per container)
+    response = application(environ, lambda *args: None)
     
     return {
         'statusCode': response.status_code,
@@ -0,0 +1,36 @@
+"""
+Shared Django bootstrap for the standalone benchmark scripts.
+
+Run benchmarks from the backend directory, e.g.::
+
+    python benchmarks/bench_route_response.py
+
+Benchmarks that read the database expect the standard synthetic fleet,
+generated once with::
+
+    python manage.py generate_fleet --scale 0.1
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the project directory to the Python path
+project_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_dir))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_driver_project.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+
+def timeit(fn, repeat=5):
+    """Return the best wall-clock time (seconds) of `repeat` calls to fn."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
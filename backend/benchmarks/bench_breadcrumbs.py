@@ -0,0 +1,73 @@
+"""
+Benchmark: GPS breadcrumb batch insert and downsampled truck-month queries.
+
+Loads one truck-month of pings (one every 5 seconds) for the first user in
+the database, then times the map queries in both downsampling modes.
+Pass --keep to leave the rows in place for repeated query runs.
+"""
+import datetime
+import math
+import sys
+import time
+
+from _bootstrap import timeit
+
+from django.contrib.auth.models import User
+
+from trips.breadcrumbs import breadcrumb_track, record_breadcrumbs
+from trips.models import Breadcrumb
+
+START = datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc)
+END = datetime.datetime(2024, 4, 1, tzinfo=datetime.timezone.utc)
+INTERVAL = 5  # seconds between pings
+UPLOAD_SIZE = 10000
+
+
+def make_points():
+    """A truck wandering across the country: 11 hours driving a day at ~60 mph."""
+    lat, lng = 35.0, -100.0
+    seconds = int((END - START).total_seconds())
+    for offset in range(0, seconds, INTERVAL):
+        hour = (offset // 3600) % 24
+        moving = hour < 11
+        if moving:
+            heading = (offset / 86400.0) * 40 + 10 * math.sin(offset / 900.0)
+            lat += 0.00008 * math.cos(math.radians(heading))
+            lng += 0.00008 * math.sin(math.radians(heading))
+        yield (START + datetime.timedelta(seconds=offset), int(round(lat * 1e6)), int(round(lng * 1e6)),
+               60 if moving else 0, int(heading) % 360 if moving else None)
+
+
+def main():
+    user = User.objects.order_by('id').first()
+    if user is None:
+        sys.exit("Create a user first")
+
+    existing = Breadcrumb.objects.filter(user=user, recorded_at__gte=START, recorded_at__lt=END).count()
+    if not existing:
+        points = list(make_points())
+        started = time.perf_counter()
+        for i in range(0, len(points), UPLOAD_SIZE):
+            record_breadcrumbs(user.id, points[i:i + UPLOAD_SIZE])
+        elapsed = time.perf_counter() - started
+        print(f"inserted {len(points):,} pings in {elapsed:.2f}s ({len(points) / elapsed:,.0f} rows/s)")
+    else:
+        print(f"using {existing:,} existing pings")
+
+    print(f"{'mode':>10}{'max_points':>12}{'points':>8}{'seconds':>10}")
+    for mode in ('bucket', 'simplify'):
+        for max_points in (500, 2000, 10000):
+            track = {}
+
+            def run():
+                track['result'] = breadcrumb_track(START, END, user_id=user.id, mode=mode, max_points=max_points)
+
+            seconds = timeit(run, repeat=3)
+            print(f"{mode:>10}{max_points:>12}{track['result']['properties']['points']:>8}{seconds:>10.3f}")
+
+    if '--keep' not in sys.argv:
+        Breadcrumb.objects.filter(user=user, recorded_at__gte=START, recorded_at__lt=END).delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark: HOS compliance checks per second over a long driver history.
+
+Builds a synthetic multi-year duty pattern in memory (no database needed)
+and times one streaming pass, showing the cost per status change stays
+flat as the history grows.
+"""
+import datetime
+import time
+
+from _bootstrap import timeit  # noqa: F401 - sets up Django
+
+from logs.compliance import HOSComplianceChecker
+
+# One shift per day: on duty, drive, break, drive (sometimes too long), on duty, rest
+DAY_PATTERN = [
+    ('on_duty', 0.0, 1.0), ('driving', 1.0, 8.0), ('off_duty', 8.0, 8.5),
+    ('driving', 8.5, 12.5), ('on_duty', 12.5, 13.5), ('sleeper_berth', 13.5, 24.0),
+]
+
+
+def make_history(days):
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    for day in range(days):
+        base = start + datetime.timedelta(days=day)
+        for status, begin, end in DAY_PATTERN:
+            if status == 'driving' and begin > 8 and day % 7 == 3:
+                end += 1.0  # an over-long drive once a week
+            yield (status, base + datetime.timedelta(hours=begin),
+                   base + datetime.timedelta(hours=min(end, 24.0)))
+
+
+def main():
+    print(f"{'days':>8}{'changes':>10}{'seconds':>10}{'changes/s':>12}{'violations':>12}")
+    for days in (365, 365 * 4, 365 * 16):
+        history = list(make_history(days))
+        checker = HOSComplianceChecker()
+        start = time.perf_counter()
+        violations = 0
+        for status, begin, end in history:
+            violations += len(checker.add(status, begin, end))
+        elapsed = time.perf_counter() - start
+        print(f"{days:>8}{len(history):>10}{elapsed:>10.3f}{len(history) / elapsed:>12.0f}{violations:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark: per-request latency of each database connection mode.
+
+Replays Django's request lifecycle (request_started, one small query,
+request_finished) against the configured PostgreSQL database under the
+direct, persistent and pooled modes of settings.DB_CONN_MODE, first from
+one thread and then from several, and reports the latency per request and
+how many connects it took (for the pooled modes: borrows from the pool,
+which opens only a few server connections). The connect cost measured
+against a local server is a lower bound: over a network, with TLS, each
+connect costs several more round trips.
+"""
+import statistics
+import threading
+import time
+
+from _bootstrap import timeit  # noqa: F401 - sets up Django
+
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+
+from truck_driver_project.postgres.base import POOL_DEFAULTS, _counters, close_pools, connection_metrics
+
+REQUESTS = 500
+THREADS = 8
+
+MODES = {
+    'direct': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'POOL': None},
+    'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'POOL': None},
+    'pooled': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+               'POOL': {**POOL_DEFAULTS, 'min_size': 2, 'max_size': THREADS}},
+    'pooled (no check)': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+                          'POOL': {**POOL_DEFAULTS, 'min_size': 2, 'max_size': THREADS, 'check': False}},
+}
+
+
+def one_request():
+    request_started.send(sender=None)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM logs_logsheet WHERE id < %s", [100])
+            cursor.fetchone()
+    finally:
+        request_finished.send(sender=None)
+
+
+def run(requests):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        one_request()
+        latencies.append((time.perf_counter() - started) * 1000)
+    connections.close_all()
+    return latencies
+
+
+def run_threads(threads, requests):
+    results = []
+
+    def worker():
+        results.extend(run(requests))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results
+
+
+def configure(mode):
+    connections.close_all()
+    close_pools()
+    settings_dict = connections['default'].settings_dict
+    settings_dict.update({key: value for key, value in MODES[mode].items() if key != 'POOL'})
+    if MODES[mode]['POOL'] is None:
+        settings_dict.pop('POOL', None)
+    else:
+        settings_dict['POOL'] = MODES[mode]['POOL']
+    _counters.clear()
+
+
+def report(label, latencies, wall):
+    connects = _counters['default']['connects']
+    print(f"  {label:<28} {statistics.mean(latencies):7.3f} ms mean  "
+          f"{statistics.median(latencies):7.3f} ms p50  "
+          f"{sorted(latencies)[int(len(latencies) * 0.99) - 1]:7.3f} ms p99  "
+          f"{len(latencies) / wall:8.0f} req/s  {connects:5d} connects")
+
+
+def main():
+    if connection.vendor != 'postgresql':
+        print(f"Needs PostgreSQL (the configured database is {connection.vendor}); skipping")
+        return
+    results = {}
+    for mode in MODES:
+        configure(mode)
+        run(20)  # Warm up (opens the pool, primes caches)
+        print(f"{mode}:")
+        _counters.clear()
+        started = time.perf_counter()
+        latencies = run(REQUESTS)
+        report('sequential', latencies, time.perf_counter() - started)
+        results[mode] = statistics.mean(latencies)
+
+        _counters.clear()
+        started = time.perf_counter()
+        latencies = run_threads(THREADS, REQUESTS // THREADS * 2)
+        report(f"{THREADS} threads", latencies, time.perf_counter() - started)
+        if MODES[mode]['POOL']:
+            print(f"  pool: {connection_metrics()['default'].get('pool')}")
+
+    for mode in MODES:
+        if mode != 'direct':
+            print(f"{mode} saves {results['direct'] - results[mode]:.3f} ms per request over direct "
+                  f"({results['direct'] / results[mode]:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: building duty grids and per-status totals for a fleet-month.
+
+Compares the previous hour-granularity list-of-lists grid with the
+minute-resolution DutyGrid (1440-byte array per day), reporting build
+time and memory held for every sheet of 1,000 drivers over 30 days.
+"""
+import datetime
+import random
+import tracemalloc
+
+from _bootstrap import timeit
+
+from logs.models import DutyStatusChange
+from logs.utils import DutyGrid
+
+DRIVERS = 1000
+DAYS = 30
+
+
+def make_day(date, rnd):
+    """A plausible day: off / on / driving / break / driving / off."""
+    at = lambda minute: datetime.datetime.combine(date, datetime.time(0), tzinfo=datetime.timezone.utc) \
+        + datetime.timedelta(minutes=minute)
+    start = rnd.randrange(300, 600)
+    cuts = [0, start, start + 45, start + 45 + 480, start + 45 + 510, start + 45 + 690, 1440]
+    statuses = ['off_duty', 'on_duty', 'driving', 'off_duty', 'driving', 'off_duty']
+    return [
+        DutyStatusChange(status=status, start_time=at(a), end_time=at(b), location='X', remarks='')
+        for status, a, b in zip(statuses, cuts, cuts[1:])
+    ]
+
+
+def hourly_grid(date, status_changes):
+    """The previous LogGenerator grid: 4 x 24 lists, partial hours rounded up."""
+    rows = {'off_duty': 0, 'sleeper_berth': 1, 'driving': 2, 'on_duty': 3}
+    grid = [[None for _ in range(24)] for _ in range(4)]
+    for change in status_changes:
+        if change.start_time.date() != date:
+            continue
+        end_hour = change.end_time.hour + (1 if change.end_time.minute else 0) \
+            if change.end_time.date() == date else 24
+        for hour in range(change.start_time.hour, end_hour):
+            grid[rows[change.status]][hour] = 1
+    totals = {status: sum(1 for cell in grid[row] if cell) for status, row in rows.items()}
+    return grid, totals
+
+
+def minute_list_grid(date, status_changes):
+    """The old list-of-lists layout widened to one cell per minute."""
+    rows = {'off_duty': 0, 'sleeper_berth': 1, 'driving': 2, 'on_duty': 3}
+    grid = [[None] * 1440 for _ in range(4)]
+    for change in status_changes:
+        start = change.start_time.hour * 60 + change.start_time.minute
+        end = change.end_time.hour * 60 + change.end_time.minute if change.end_time.date() == date else 1440
+        row = grid[rows[change.status]]
+        for minute in range(start, end):
+            row[minute] = 1
+    totals = {status: sum(1 for cell in grid[row] if cell) for status, row in rows.items()}
+    return grid, totals
+
+
+def minute_grid(date, status_changes):
+    grid = DutyGrid.from_status_changes(date, status_changes)
+    return grid, grid.minutes_by_status()
+
+
+def main():
+    rnd = random.Random(7)
+    start = datetime.date(2025, 1, 1)
+    sheets = []
+    for _ in range(DRIVERS):
+        for d in range(DAYS):
+            date = start + datetime.timedelta(days=d)
+            sheets.append((date, make_day(date, rnd)))
+    print(f"{len(sheets)} sheets ({DRIVERS} drivers x {DAYS} days)")
+    print(f"{'grid':<32}{'build s':>10}{'held MB':>10}")
+
+    for label, build in [('hourly list-of-lists (old)', hourly_grid),
+                         ('minute list-of-lists', minute_list_grid),
+                         ('DutyGrid 1440 x uint8', minute_grid)]:
+        t = timeit(lambda: [build(date, changes) for date, changes in sheets], repeat=3)
+        tracemalloc.start()
+        held = [build(date, changes)[0] for date, changes in sheets]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del held
+        print(f"{label:<32}{t:>10.2f}{size / 1e6:>10.1f}")
+
+    grids = [DutyGrid.from_status_changes(date, changes) for date, changes in sheets]
+    t = timeit(lambda: [g.runs() for g in grids], repeat=3)
+    print(f"{'run-length encode all':<32}{t:>10.2f}")
+    t = timeit(lambda: [g.to_visual_log_data() for g in grids], repeat=3)
+    print(f"{'to visual_log_data all':<32}{t:>10.2f}")
+    t = timeit(lambda: [g.rows(15) for g in grids], repeat=3)
+    print(f"{'15-minute rows all':<32}{t:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
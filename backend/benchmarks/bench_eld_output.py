@@ -0,0 +1,91 @@
+"""
+Benchmark: FMCSA ELD output file throughput.
+
+Streams output files from the database for the driver with the most log
+sheets (six months and their whole history), then formats a large
+synthetic history in memory to show the per-event cost and that peak
+memory does not grow with the number of events.
+"""
+import datetime
+import time
+import tracemalloc
+import zoneinfo
+
+from _bootstrap import timeit  # noqa: F401 - sets up Django
+
+from django.db.models import Count, Max, Min
+from django.contrib.auth.models import User
+
+from logs.eld_output import ELDOutputWriter, duty_status_events, event_list_lines, stream_eld_output
+from logs.models import DutyStatusChange
+
+DAY_PATTERN = [
+    ('on_duty', 0.0, 1.0), ('driving', 1.0, 8.0), ('off_duty', 8.0, 8.5),
+    ('driving', 8.5, 12.5), ('on_duty', 12.5, 13.5), ('sleeper_berth', 13.5, 24.0),
+]
+
+
+def synthetic_rows(days):
+    """Rows shaped like the status change query: six changes a day, with positions and remarks."""
+    start = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+    for day in range(days):
+        base = start + datetime.timedelta(days=day)
+        for status, begin, end in DAY_PATTERN:
+            yield (status, base + datetime.timedelta(hours=begin), base + datetime.timedelta(hours=end),
+                   35.0 + day * 0.001, -100.0 - day * 0.001, 'Amarillo TX', 'Pre-trip inspection', None, 'TRK-1')
+
+
+def bench_database():
+    user = (
+        User.objects.annotate(sheets=Count('log_sheets'))
+        .filter(sheets__gt=0).order_by('-sheets').first()
+    )
+    if user is None:
+        print("No log sheets in the database; skipping the database runs")
+        return
+    span = user.log_sheets.aggregate(first=Min('date'), last=Max('date'))
+    ranges = [
+        ('six months', max(span['first'], span['last'] - datetime.timedelta(days=182)), span['last']),
+        ('all', span['first'], span['last']),
+    ]
+    print(f"driver {user.username}: {user.sheets} log sheets")
+    print(f"{'range':>12}{'changes':>10}{'KiB':>9}{'seconds':>10}{'changes/s':>12}")
+    for label, start, end in ranges:
+        changes = DutyStatusChange.objects.filter(
+            log_sheet__user=user, log_sheet__date__gte=start, log_sheet__date__lte=end
+        ).count()
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in stream_eld_output(user, start, end))
+        elapsed = time.perf_counter() - started
+        print(f"{label:>12}{changes:>10}{size / 1024:>9.0f}{elapsed:>10.3f}{changes / elapsed:>12,.0f}")
+
+
+def format_events(days):
+    """Format the event list of a synthetic history; returns (events, characters)."""
+    writer = ELDOutputWriter()
+    size = events = 0
+    for line in event_list_lines(writer, duty_status_events(synthetic_rows(days)), 'driver1',
+                                 zoneinfo.ZoneInfo('America/Chicago'), {'TRK-1': 1}):
+        size += len(line)
+        events += 1
+    writer.file_check_value()
+    return events, size
+
+
+def bench_synthetic():
+    print(f"\n{'days':>8}{'events':>10}{'MiB':>8}{'seconds':>10}{'events/s':>12}{'peak KiB':>10}")
+    for days in (365, 365 * 4, 365 * 16):
+        started = time.perf_counter()
+        events, size = format_events(days)
+        elapsed = time.perf_counter() - started
+        # Separate run: tracing allocations slows the formatting down severalfold
+        tracemalloc.start()
+        format_events(days)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{days:>8}{events:>10}{size / 2 ** 20:>8.1f}{elapsed:>10.2f}{events / elapsed:>12,.0f}{peak / 1024:>10.0f}")
+
+
+if __name__ == '__main__':
+    bench_database()
+    bench_synthetic()
@@ -0,0 +1,66 @@
+"""
+Benchmark: sustained ELD event ingest throughput (rows per second).
+
+Streams synthetic NDJSON events for the existing log sheets through
+EventIngestor against the configured database (COPY on PostgreSQL,
+bulk_create elsewhere), then deletes the rows it loaded. Needs at least
+one LogSheet; create some with the generate endpoint first.
+"""
+import datetime
+import io
+import json
+import sys
+
+from _bootstrap import timeit  # noqa: F401 - sets up Django
+
+from logs.ingest import EventIngestor, read_ndjson
+from logs.models import LogSheet, DutyStatusChange
+from logs.signals import defer_hour_totals
+
+EVENTS = 100_000
+STATUSES = ('off_duty', 'on_duty', 'driving', 'sleeper_berth')
+
+
+def make_body(sheets, prefix):
+    lines = []
+    for i in range(EVENTS):
+        sheet_id, date = sheets[i % len(sheets)]
+        start = datetime.datetime.combine(date, datetime.time(0), tzinfo=datetime.timezone.utc)
+        start += datetime.timedelta(minutes=(i // len(sheets)) % 1440)
+        lines.append(json.dumps({
+            'event_id': f'{prefix}-{i}',
+            'log_sheet_id': sheet_id,
+            'status': STATUSES[i % 4],
+            'start_time': start.isoformat(),
+            'end_time': (start + datetime.timedelta(minutes=1)).isoformat(),
+            'location': 'Benchmark Rd',
+            'latitude': 39.78,
+            'longitude': -89.65,
+        }))
+    return '\n'.join(lines).encode()
+
+
+def main():
+    sheets = list(LogSheet.objects.values_list('id', 'date')[:200])
+    if not sheets:
+        sys.exit('No log sheets found; generate some first.')
+
+    prefix = 'bench-ingest'
+    body = make_body(sheets, prefix)
+    try:
+        ingestor = EventIngestor()
+        mode = 'COPY' if ingestor.use_copy else 'bulk_create'
+        summary = ingestor.ingest(read_ndjson(io.BytesIO(body)))
+        print(f"{mode}: {summary['inserted']} rows in {summary['elapsed_ms'] / 1000:.2f}s "
+              f"= {summary['rows_per_second']} rows/s ({len(body) / 1e6:.1f} MB NDJSON)")
+
+        # Resending the same batch is idempotent and only pays for validation and lookups
+        summary = EventIngestor().ingest(read_ndjson(io.BytesIO(body)))
+        print(f"resend: {summary['duplicates']} duplicates skipped at {summary['rows_per_second']} rows/s")
+    finally:
+        with defer_hour_totals():
+            DutyStatusChange.objects.filter(event_id__startswith=f'{prefix}-').delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: log sheet pages per second, canvas renderer vs Platypus tables.
+
+Uses unsaved DutyStatusChange objects and a stand-in sheet, so no database
+is needed.
+"""
+import datetime
+import io
+import time
+from types import SimpleNamespace
+
+from _bootstrap import timeit  # noqa: F401 - sets up Django
+
+from logs.models import DutyStatusChange
+from logs.rendering import ELDCanvasRenderer
+from logs.utils import LogGenerator
+
+PAGES = 200
+
+
+class _Changes(list):
+    """Stand-in for the status_changes related manager."""
+
+    def all(self):
+        return self
+
+
+def make_sheet(day):
+    date = datetime.date(2025, 1, 1) + datetime.timedelta(days=day)
+    at = lambda h, m=0: datetime.datetime.combine(date, datetime.time(h, m), tzinfo=datetime.timezone.utc)
+    spans = [('off_duty', at(0), at(6)), ('on_duty', at(6), at(7)), ('driving', at(7), at(12)),
+             ('off_duty', at(12), at(12, 30)), ('driving', at(12, 30), at(18)),
+             ('on_duty', at(18), at(18, 45)), ('sleeper_berth', at(18, 45), None)]
+    changes = _Changes(
+        DutyStatusChange(status=s, start_time=a, end_time=b, location='Springfield, IL', remarks='')
+        for s, a, b in spans
+    )
+    sheet = SimpleNamespace(id=day + 1, trip_id=1, date=date, vehicle_number='TRK-1',
+                            trailer_number='TRL-9', status_changes=changes)
+    return sheet, changes
+
+
+def main():
+    sheets = [make_sheet(day) for day in range(PAGES)]
+    driver = {'name': 'Bench Driver', 'id': 'bench'}
+
+    # Warm up fonts and imports
+    LogGenerator.generate_table_pdf(sheets[0][0], driver)
+
+    print(f"{'renderer':<40}{'pages/s':>10}{'KB/page':>10}")
+
+    start = time.perf_counter()
+    size = 0
+    for sheet, _ in sheets:
+        size += len(LogGenerator.generate_table_pdf(sheet, driver))
+    elapsed = time.perf_counter() - start
+    print(f"{'Platypus tables, one PDF per sheet':<40}{PAGES / elapsed:>10.0f}{size / PAGES / 1024:>10.1f}")
+
+    start = time.perf_counter()
+    size = 0
+    for sheet, changes in sheets:
+        buffer = io.BytesIO()
+        renderer = ELDCanvasRenderer(buffer)
+        renderer.draw_page(sheet, changes, driver)
+        renderer.save()
+        size += len(buffer.getvalue())
+    elapsed = time.perf_counter() - start
+    print(f"{'canvas, one PDF per sheet':<40}{PAGES / elapsed:>10.0f}{size / PAGES / 1024:>10.1f}")
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    renderer = ELDCanvasRenderer(buffer)
+    for sheet, changes in sheets:
+        renderer.draw_page(sheet, changes, driver)
+    renderer.save()
+    elapsed = time.perf_counter() - start
+    print(f"{'canvas, all sheets in one PDF':<40}{PAGES / elapsed:>10.0f}"
+          f"{len(buffer.getvalue()) / PAGES / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: rendering and compressing a 20k-point `calculate` response.
+
+Compares the stock DRF JSONRenderer with FastJSONRenderer, with and
+without coordinate rounding, and reports gzip/brotli sizes and timings.
+"""
+import gzip
+import random
+
+from _bootstrap import timeit
+
+from rest_framework.renderers import JSONRenderer
+from truck_driver_project.renderers import FastJSONRenderer
+from trips.utils import round_coordinates
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+POINTS = 20000
+
+
+def make_route(n, seed=42):
+    rnd = random.Random(seed)
+    lat, lng = 34.0522, -118.2437
+    coords = []
+    for _ in range(n):
+        lat += rnd.uniform(-0.001, 0.002)
+        lng += rnd.uniform(0.0005, 0.003)
+        coords.append([lat, lng])
+    return coords
+
+
+def make_payload(coords):
+    half = len(coords) // 2
+    return {
+        'success': True,
+        'trip_id': 1,
+        'trip': {'id': 1, 'name': 'Benchmark trip', 'stops': [], 'route_segments': []},
+        'hos_plan': {'feasible': True, 'driving_time': 40.2, 'total_trip_time': 62.7},
+        'route': {
+            'current_to_pickup': {'distance_miles': 120.4, 'duration_hours': 2.1,
+                                  'coordinates': coords[:half]},
+            'pickup_to_dropoff': {'distance_miles': 2100.9, 'duration_hours': 38.1,
+                                  'coordinates': coords[half:]},
+        },
+    }
+
+
+def main():
+    coords = make_route(POINTS)
+    raw = make_payload(coords)
+    rounded = make_payload(round_coordinates(coords))
+
+    print(f"Route response with {POINTS} points")
+    print(f"{'variant':<34}{'bytes':>12}{'ms':>10}")
+    for label, renderer, payload in [
+        ('stdlib JSONRenderer', JSONRenderer(), raw),
+        ('stdlib JSONRenderer + rounding', JSONRenderer(), rounded),
+        ('FastJSONRenderer', FastJSONRenderer(), raw),
+        ('FastJSONRenderer + rounding', FastJSONRenderer(), rounded),
+    ]:
+        body = renderer.render(payload)
+        t = timeit(lambda: renderer.render(payload))
+        print(f"{label:<34}{len(body):>12}{t * 1000:>10.2f}")
+
+    body = FastJSONRenderer().render(rounded)
+    print()
+    print(f"{'encoding':<34}{'bytes':>12}{'ms':>10}")
+    t = timeit(lambda: gzip.compress(body, compresslevel=6, mtime=0))
+    print(f"{'gzip (level 6)':<34}{len(gzip.compress(body, 6, mtime=0)):>12}{t * 1000:>10.2f}")
+    if brotli is not None:
+        t = timeit(lambda: brotli.compress(body, quality=5))
+        print(f"{'brotli (quality 5)':<34}{len(brotli.compress(body, quality=5)):>12}{t * 1000:>10.2f}")
+    else:
+        print('brotli not installed; skipping')
+
+
+if __name__ == '__main__':
+    main()
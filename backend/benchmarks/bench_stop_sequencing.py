@@ -0,0 +1,75 @@
+"""
+Benchmark: solve time and tour quality of the multi-stop sequencer.
+
+Orders random LTL tours (seeded, so runs are comparable) of 5 to 30 stops
+around the Midwest with trips.routing.solve(): the nearest-neighbour start,
+the 2-opt/Or-opt result, and the time both took, without and with time
+windows and pinned stops. Also times the full HOS plan over the chosen legs.
+No database needed.
+"""
+import random
+import statistics
+import time
+
+from _bootstrap import timeit  # noqa: F401 - sets up Django
+
+from trips.matrix import estimate_matrix
+from trips.routing import StopSequencer, solve
+from trips.utils import HOSCalculator
+
+SIZES = (5, 10, 20, 30)
+TOURS = 20
+CENTER = (41.0, -89.0)
+
+
+def make_tour(rng, size, constrained):
+    start = (CENTER[0] + rng.uniform(-1, 1), CENTER[1] + rng.uniform(-1, 1))
+    points = [(CENTER[0] + rng.uniform(-4, 4), CENTER[1] + rng.uniform(-6, 6)) for _ in range(size)]
+    service = [rng.choice((0.5, 1.0, 1.5)) for _ in range(size)]
+    distances, durations = (array.tolist() for array in estimate_matrix([start] + points, [start] + points))
+    windows, fixed = None, None
+    if constrained:
+        # Windows around the arrivals of a hidden random order, so a tour meeting all of them exists
+        hidden = rng.sample(range(size), size)
+        states = StopSequencer(durations, service).prefix_states(hidden)
+        windows = [(None, None)] * size
+        for position in rng.sample(range(size), max(1, size // 3)):
+            arrival = states[position + 1][0] - service[hidden[position]]
+            windows[hidden[position]] = (max(0.0, arrival - rng.uniform(2, 6)), arrival + rng.uniform(2, 6))
+        fixed = {hidden[0]: 0}
+    return distances, durations, service, windows, fixed
+
+
+def main():
+    rng = random.Random(2026)
+    print(f"{'stops':>6}{'constraints':>13}{'nn cost h':>11}{'final h':>9}{'saved':>8}"
+          f"{'solve ms p50':>14}{'p95':>8}{'plan ms':>9}{'late tours':>12}")
+    for size in SIZES:
+        for constrained in (False, True):
+            initial, final, solve_ms, plan_ms, late = [], [], [], [], 0
+            for _ in range(TOURS):
+                distances, durations, service, windows, fixed = make_tour(rng, size, constrained)
+                solution = solve(durations, service, windows, fixed)
+                initial.append(solution.initial_cost)
+                final.append(solution.cost)
+                solve_ms.append(solution.solve_ms)
+                late += bool(solution.late_stops)
+
+                started = time.perf_counter()
+                legs, at = [], 0
+                for stop in solution.order:
+                    legs.append({'distance_miles': distances[at][stop + 1], 'duration_hours': durations[at][stop + 1],
+                                 'stop_type': 'dropoff', 'service_hours': service[stop],
+                                 'window_start': windows[stop][0] if windows else None,
+                                 'window_end': windows[stop][1] if windows else None})
+                    at = stop + 1
+                HOSCalculator.plan_legs(legs, 0)
+                plan_ms.append((time.perf_counter() - started) * 1000)
+            saved = 1 - sum(final) / sum(initial)
+            print(f"{size:>6}{'windows+pin' if constrained else '-':>13}{statistics.mean(initial):>11.1f}"
+                  f"{statistics.mean(final):>9.1f}{saved:>8.1%}{statistics.median(solve_ms):>14.1f}"
+                  f"{sorted(solve_ms)[int(TOURS * 0.95) - 1]:>8.1f}{statistics.mean(plan_ms):>9.2f}{late:>8}/{TOURS}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Run background job workers
+"""
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.utils import JobQueue
+
+
+def _worker(poll_interval, once):
+    stopping = threading.Event()
+    # Finish the current job, then exit, on SIGTERM/SIGINT
+    signal.signal(signal.SIGTERM, lambda *args: stopping.set())
+    signal.signal(signal.SIGINT, lambda *args: stopping.set())
+    JobQueue.work(poll_interval=poll_interval, once=once, should_stop=stopping.is_set)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Claim and run queued jobs (log sheet PDFs and exports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes to run (forked; more than one needs a fork-capable OS)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before polling an empty queue again')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers must be at least 1')
+
+        if workers == 1:
+            try:
+                processed = JobQueue.work(poll_interval=options['poll_interval'], once=options['once'])
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
+            return
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('Multiple workers need the fork start method; run one process per worker instead')
+        context = multiprocessing.get_context('fork')
+
+        # Children must open their own database connections
+        connections.close_all()
+        processes = [
+            context.Process(target=_worker, args=(options['poll_interval'], options['once']),
+                            name=f'job-worker-{index}')
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {workers} job workers")
+
+        # Pass SIGTERM on so every worker finishes its current job before exiting
+        signal.signal(signal.SIGTERM, lambda *args: [process.terminate() for process in processes])
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # Ctrl-C reaches the whole process group; wait for the workers to wind down
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS('Job workers stopped'))
@@ -0,0 +1,52 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+from logs.serializers import LogSheetExportSerializer
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'attempts', 'max_attempts', 'error',
+            'result_url', 'result_name', 'result_content_type', 'result_size', 'expires_at',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+    
+    def get_result_url(self, obj):
+        if obj.status != 'succeeded':
+            return None
+        return reverse('job-result', args=[obj.id], request=self.context.get('request'))
+
+
+class JobCreateSerializer(serializers.Serializer):
+    """
+    Serializer for job enqueue input
+    """
+    kind = serializers.ChoiceField(choices=Job.KIND_CHOICES)
+    params = serializers.DictField(required=False, default=dict)
+    callback_url = serializers.URLField(required=False, allow_blank=True, default='')
+    
+    def validate(self, data):
+        params = data['params']
+        if data['kind'] == 'log_pdf':
+            log_sheet_id = params.get('log_sheet_id')
+            if not isinstance(log_sheet_id, int):
+                raise serializers.ValidationError({'params': "'log_sheet_id' (integer) is required."})
+            data['params'] = {'log_sheet_id': log_sheet_id}
+        elif data['kind'] == 'log_export':
+            export = LogSheetExportSerializer(data=params)
+            export.is_valid(raise_exception=True)
+            data['params'] = export_params(export.validated_data)
+        return data
+
+
+def export_params(validated_data):
+    """JSON-safe job params from LogSheetExportSerializer data."""
+    return {
+        key: value.isoformat() if hasattr(value, 'isoformat') else value
+        for key, value in validated_data.items()
+    }
@@ -0,0 +1,52 @@
+"""
+Job handlers: each renders its result into an open binary file
+"""
+from logs.archive import rehydrate_log_sheets
+from logs.export import driver_info_for, export_filename, export_queryset, stream_pdf, stream_zip
+from logs.models import LogSheet
+from logs.utils import LogGenerator
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot succeed (bad params, missing rows)."""
+
+
+def render_log_pdf(params, output):
+    """
+    Render a single log sheet PDF
+
+    Params: {'log_sheet_id': int}
+    """
+    try:
+        log_sheet = LogSheet.objects.select_related('user').get(id=params['log_sheet_id'])
+    except (KeyError, LogSheet.DoesNotExist):
+        raise PermanentJobError(f"Log sheet {params.get('log_sheet_id')} not found")
+    if log_sheet.archived_at:
+        rehydrate_log_sheets([log_sheet.id])
+        log_sheet.refresh_from_db()
+    output.write(LogGenerator.get_pdf(log_sheet, driver_info_for(log_sheet.user)))
+    return f"log_sheet_{log_sheet.date}.pdf", 'application/pdf'
+
+
+def render_log_export(params, output):
+    """
+    Render a multi-sheet export as one PDF or a ZIP of PDFs
+
+    Params: validated LogSheetExportSerializer data (dates as ISO strings)
+    """
+    log_sheets = export_queryset(params)
+    if not log_sheets.exists():
+        raise PermanentJobError('No log sheets found')
+    if params.get('output') == 'zip':
+        chunks, extension, content_type = stream_zip(log_sheets), 'zip', 'application/zip'
+    else:
+        chunks, extension, content_type = stream_pdf(log_sheets), 'pdf', 'application/pdf'
+    for chunk in chunks:
+        output.write(chunk)
+    return f"{export_filename(params)}.{extension}", content_type
+
+
+TASKS = {
+    'log_pdf': render_log_pdf,
+    'log_export': render_log_export,
+}
@@ -0,0 +1,209 @@
+import datetime
+import os
+import socket
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+from .tasks import TASKS, PermanentJobError
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class JobQueue:
+    """
+    Database-backed job queue
+
+    Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+    of worker processes (on any number of hosts) can poll the same table
+    without handing out a job twice. Results are written under
+    MEDIA_ROOT/JOB_RESULT_DIR and removed once they expire.
+    """
+
+    @staticmethod
+    def enqueue(kind, params, callback_url='', max_attempts=None):
+        """
+        Queue a job and return it
+
+        Args:
+            kind: One of the Job.KIND_CHOICES keys
+            params: JSON-serializable handler parameters
+            callback_url: URL POSTed to with the job status when it finishes
+            max_attempts: Attempts before the job is marked failed
+        """
+        if kind not in TASKS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        return Job.objects.create(
+            kind=kind,
+            params=params,
+            callback_url=callback_url,
+            max_attempts=max_attempts or _setting('JOB_MAX_ATTEMPTS', 3),
+        )
+
+    @staticmethod
+    def claim(worker_id):
+        """
+        Lock and return the next runnable job, or None when the queue is empty
+
+        Jobs left 'running' by a worker that died are picked up again once
+        their lock is older than JOB_LOCK_TIMEOUT seconds.
+        """
+        now = timezone.now()
+        stale = now - datetime.timedelta(seconds=_setting('JOB_LOCK_TIMEOUT', 15 * 60))
+        with transaction.atomic():
+            job = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(Q(status='queued', run_after__lte=now) | Q(status='running', locked_at__lt=stale))
+                .order_by('run_after', 'created_at')
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = 'running'
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_at = now
+            job.started_at = now
+            job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_at', 'started_at', 'updated_at'])
+        return job
+
+    @staticmethod
+    def run(job):
+        """
+        Run a claimed job, store its result and schedule a retry on failure
+        """
+        if job.attempts > job.max_attempts:
+            # Reclaimed after its workers died on every attempt
+            job.status = 'failed'
+            job.error = job.error or 'Worker stopped while running the job'
+            job.finished_at = timezone.now()
+            job.locked_by = ''
+            job.locked_at = None
+            job.save()
+            JobQueue.notify(job)
+            return job
+
+        relative_path = os.path.join(_setting('JOB_RESULT_DIR', 'jobs'), str(job.id))
+        path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = f"{path}.part"
+
+        try:
+            with open(partial_path, 'wb') as output:
+                name, content_type = TASKS[job.kind](job.params, output)
+            os.replace(partial_path, path)
+        except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {e}")
+            job.error = traceback.format_exc()
+            job.locked_by = ''
+            job.locked_at = None
+            if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = timezone.now()
+            else:
+                # Exponential backoff: delay, 2 x delay, 4 x delay, ...
+                delay = _setting('JOB_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+                job.status = 'queued'
+                job.run_after = timezone.now() + datetime.timedelta(seconds=delay)
+            job.save()
+            if job.status == 'failed':
+                JobQueue.notify(job)
+            return job
+
+        now = timezone.now()
+        job.status = 'succeeded'
+        job.error = ''
+        job.result_path = relative_path
+        job.result_name = name
+        job.result_content_type = content_type
+        job.result_size = os.path.getsize(path)
+        job.finished_at = now
+        job.expires_at = now + datetime.timedelta(seconds=_setting('JOB_RESULT_TTL', 24 * 60 * 60))
+        job.locked_by = ''
+        job.locked_at = None
+        job.save()
+        JobQueue.notify(job)
+        return job
+
+    @staticmethod
+    def notify(job):
+        """POST the finished job's status to its callback URL, if it has one."""
+        if not job.callback_url:
+            return
+        import requests
+
+        try:
+            requests.post(job.callback_url, json={
+                'id': str(job.id),
+                'kind': job.kind,
+                'status': job.status,
+            }, timeout=5)
+        except requests.RequestException as e:
+            print(f"Job {job.id} callback to {job.callback_url} failed: {e}")
+
+    @staticmethod
+    def result_file(job):
+        """Absolute path of a job's result file (None if it has none)."""
+        if not job.result_path:
+            return None
+        return os.path.join(settings.MEDIA_ROOT, job.result_path)
+
+    @staticmethod
+    def purge_expired():
+        """
+        Delete expired result files and mark their jobs expired
+
+        Returns:
+            Number of jobs expired
+        """
+        expired = list(Job.objects.filter(status='succeeded', expires_at__lte=timezone.now()))
+        for job in expired:
+            path = JobQueue.result_file(job)
+            if path and os.path.exists(path):
+                os.remove(path)
+        Job.objects.filter(id__in=[job.id for job in expired]).update(
+            status='expired', result_path='', result_size=None, updated_at=timezone.now()
+        )
+        return len(expired)
+
+    @staticmethod
+    def work(worker_name=None, poll_interval=1.0, once=False, should_stop=lambda: False):
+        """
+        Claim and run jobs until `should_stop()` is true (or the queue is empty, with once=True)
+
+        Returns:
+            Number of jobs run
+        """
+        worker_id = worker_name or f"{socket.gethostname()}:{os.getpid()}"
+        purge_interval = _setting('JOB_PURGE_INTERVAL', 60)
+        last_purge = 0.0
+        processed = 0
+        while not should_stop():
+            # Drop connections the database (or a pooler) has closed meanwhile
+            close_old_connections()
+            if time.monotonic() - last_purge >= purge_interval:
+                JobQueue.purge_expired()
+                last_purge = time.monotonic()
+
+            job = JobQueue.claim(worker_id)
+            if job is None:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            started = time.perf_counter()
+            job = JobQueue.run(job)
+            processed += 1
+            print(f"[{worker_id}] {job.kind} job {job.id}: {job.status} "
+                  f"in {time.perf_counter() - started:.2f}s")
+        return processed
@@ -0,0 +1,57 @@
+from django.http import FileResponse
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from rest_framework.reverse import reverse
+from .models import Job
+from .serializers import JobSerializer, JobCreateSerializer
+from .utils import JobQueue
+
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    ViewSet to enqueue background jobs, poll their status and download results
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def create(self, request):
+        """
+        Queue a job (public). Returns 202 with the job; poll it until it finishes.
+        """
+        serializer = JobCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        job = JobQueue.enqueue(**serializer.validated_data)
+        return job_accepted(job, request)
+    
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def result(self, request, pk=None):
+        """
+        Download a finished job's result file
+        """
+        job = self.get_object()
+        if job.status == 'expired':
+            return Response({'error': 'Job result has expired'}, status=status.HTTP_410_GONE)
+        if job.status != 'succeeded':
+            return Response({'error': f'Job is {job.status}', 'job': JobSerializer(job, context={'request': request}).data},
+                            status=status.HTTP_409_CONFLICT)
+        
+        path = JobQueue.result_file(job)
+        try:
+            result = open(path, 'rb')
+        except (TypeError, FileNotFoundError):
+            return Response({'error': 'Job result is no longer available'}, status=status.HTTP_410_GONE)
+        return FileResponse(result, as_attachment=True, filename=job.result_name,
+                            content_type=job.result_content_type)
+
+
+def job_accepted(job, request):
+    """202 response pointing the client at the job's status URL."""
+    data = JobSerializer(job, context={'request': request}).data
+    response = Response(data, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = reverse('job-detail', args=[job.id], request=request)
+    return response
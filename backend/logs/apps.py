@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class LogsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'logs'
\ No newline at end of file
+    name = 'logs'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - connects the hour total and change event receivers
@@ -0,0 +1,212 @@
+"""
+Cold archival of old certified log sheets to compressed, month-partitioned files
+
+Archiving writes a batch of sheets and their status changes to a gzip file of
+column-oriented JSON ({"log_sheets": {column: [values]}, "status_changes": ...})
+under settings.LOG_ARCHIVE_DIR/<year>/<month>/, then deletes the status
+changes and empties visual_log_data. The sheet row stays behind as a
+tombstone (archived_at, archive_path) that keeps its date, status and hour
+totals, so listings and hours reports still work from the hot table.
+Anything that needs the status changes or the drawn log calls
+rehydrate_log_sheets() first, which loads them back from the file.
+"""
+import bisect
+import collections
+import datetime
+import gzip
+import json
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import LogSheet, DutyStatusChange
+from .signals import defer_hour_totals, log_sheets_changed
+
+ARCHIVE_FORMAT = 1
+# Sheets written per archive file (and per transaction)
+ARCHIVE_BATCH_SIZE = 500
+
+
+def archive_root():
+    return Path(getattr(settings, 'LOG_ARCHIVE_DIR', Path(settings.MEDIA_ROOT) / 'archive'))
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _encode(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive {type(value).__name__} values")
+
+
+def _to_columns(names, rows):
+    return {name: [row[index] for row in rows] for index, name in enumerate(names)}
+
+
+def _from_columns(model, columns, index):
+    """Field values of row `index`, converted back to Python (columns the model no longer has are skipped)."""
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    return {
+        name: None if values[index] is None else fields[name].to_python(values[index])
+        for name, values in columns.items() if name in fields
+    }
+
+
+def write_archive(relative_path, data):
+    """Write an archive file atomically (a crash never leaves a partial file at the final path)."""
+    path = archive_root() / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.tmp")
+    with gzip.open(temporary, 'wt', encoding='utf-8') as output:
+        json.dump(data, output, default=_encode, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def read_archive(relative_path):
+    with gzip.open(archive_root() / relative_path, 'rt', encoding='utf-8') as archive:
+        data = json.load(archive)
+    if data.get('format') != ARCHIVE_FORMAT:
+        raise ValueError(f"{relative_path}: unsupported archive format {data.get('format')}")
+    return data
+
+
+def archivable_log_sheets(before):
+    """Certified sheets dated before `before` that are still in the hot tables."""
+    return LogSheet.objects.filter(date__lt=before, certified_at__isnull=False, archived_at__isnull=True)
+
+
+def archive_counts(before):
+    """Return [(month, sheets)] that archive_log_sheets() would archive, oldest first."""
+    return [
+        (row['month'], row['sheets'])
+        for row in archivable_log_sheets(before)
+        .annotate(month=TruncMonth('date')).values('month')
+        .annotate(sheets=Count('id')).order_by('month')
+    ]
+
+
+def archive_batch(log_sheet_ids):
+    """
+    Archive one batch of sheets, all from the same month, into a new file
+
+    Returns:
+        (archive path relative to the archive root, number of sheets archived)
+    """
+    sheet_columns = _columns(LogSheet)
+    change_columns = _columns(DutyStatusChange)
+    with transaction.atomic():
+        sheets = list(
+            LogSheet.objects.select_for_update()
+            .filter(id__in=list(log_sheet_ids), archived_at__isnull=True)
+            .order_by('id').values_list(*sheet_columns)
+        )
+        if not sheets:
+            return None, 0
+        ids = [row[sheet_columns.index('id')] for row in sheets]
+        # Sorted by sheet so rehydration can bisect on log_sheet_id
+        changes = list(
+            DutyStatusChange.objects.filter(log_sheet_id__in=ids)
+            .order_by('log_sheet_id', 'start_time', 'id').values_list(*change_columns)
+        )
+        month = sheets[0][sheet_columns.index('date')]
+        relative_path = f"{month:%Y}/{month:%m}/log_sheets-{uuid.uuid4().hex[:12]}.json.gz"
+        archived_at = timezone.now()
+        write_archive(relative_path, {
+            'format': ARCHIVE_FORMAT,
+            'archived_at': archived_at,
+            'log_sheets': _to_columns(sheet_columns, sheets),
+            'status_changes': _to_columns(change_columns, changes),
+        })
+
+        # The tombstones keep their hour totals, so do not recompute them from the (now empty) changes
+        with defer_hour_totals(refresh=False):
+            DutyStatusChange.objects.filter(log_sheet_id__in=ids).delete()
+        LogSheet.objects.filter(id__in=ids).update(
+            visual_log_data={}, archived_at=archived_at, archive_path=relative_path,
+        )
+        log_sheets_changed(ids)
+    return relative_path, len(ids)
+
+
+def archive_log_sheets(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive every certified sheet dated before `before`, month by month
+
+    Yields:
+        (archive path, number of sheets) per file written
+    """
+    while True:
+        oldest = archivable_log_sheets(before).order_by('date').values_list('date', flat=True).first()
+        if oldest is None:
+            return
+        month = oldest.replace(day=1)
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        ids = list(
+            archivable_log_sheets(before).filter(date__gte=month, date__lt=next_month)
+            .order_by('date', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        path, count = archive_batch(ids)
+        if count:
+            yield path, count
+
+
+def _rehydrate_file(relative_path, log_sheet_ids):
+    data = read_archive(relative_path)
+    sheet_columns, change_columns = data['log_sheets'], data['status_changes']
+    sheet_rows = {sheet_id: index for index, sheet_id in enumerate(sheet_columns['id'])}
+    change_sheet_ids = change_columns['log_sheet_id']
+
+    with transaction.atomic():
+        # Re-read under lock: a concurrent request may have rehydrated them already
+        ids = list(
+            LogSheet.objects.select_for_update()
+            .filter(id__in=log_sheet_ids, archive_path=relative_path, archived_at__isnull=False)
+            .values_list('id', flat=True)
+        )
+        sheets, changes = [], []
+        for sheet_id in ids:
+            if sheet_id not in sheet_rows:
+                raise ValueError(f"{relative_path}: log sheet {sheet_id} is not in the archive")
+            archived = _from_columns(LogSheet, sheet_columns, sheet_rows[sheet_id])
+            sheets.append(LogSheet(
+                id=sheet_id, visual_log_data=archived.get('visual_log_data') or {},
+                archived_at=None, archive_path='',
+            ))
+            start = bisect.bisect_left(change_sheet_ids, sheet_id)
+            end = bisect.bisect_right(change_sheet_ids, sheet_id)
+            changes.extend(
+                DutyStatusChange(**_from_columns(DutyStatusChange, change_columns, index))
+                for index in range(start, end)
+            )
+        # Original ids are restored (ids are never reused); an event_id ingested again
+        # since archiving already has its row, which is kept
+        DutyStatusChange.objects.bulk_create(changes, batch_size=1000, ignore_conflicts=True)
+        LogSheet.objects.bulk_update(sheets, ['visual_log_data', 'archived_at', 'archive_path'], batch_size=500)
+        log_sheets_changed(ids)
+    return len(ids)
+
+
+def rehydrate_log_sheets(log_sheets):
+    """
+    Load archived sheets back into the hot tables (sheets that are not archived are skipped)
+
+    Args:
+        log_sheets: LogSheet queryset or iterable of ids
+
+    Returns:
+        Number of sheets rehydrated
+    """
+    if not hasattr(log_sheets, 'filter'):
+        log_sheets = LogSheet.objects.filter(id__in=list(log_sheets))
+    by_file = collections.defaultdict(list)
+    for sheet_id, path in log_sheets.filter(archived_at__isnull=False).values_list('id', 'archive_path'):
+        by_file[path].append(sheet_id)
+    return sum(_rehydrate_file(path, ids) for path, ids in by_file.items())
@@ -0,0 +1,240 @@
+"""
+Streaming Hours of Service compliance checks over duty status changes
+"""
+import collections
+import datetime
+
+from trips.utils import HOSCalculator
+from .archive import rehydrate_log_sheets
+from .models import DutyStatusChange, LogSheet
+
+
+Violation = collections.namedtuple(
+    'Violation',
+    ['rule', 'at', 'until', 'hours', 'limit', 'log_sheet_id', 'message'],
+)
+
+# Rule identifiers
+DRIVING_LIMIT = 'driving_limit'    # more than 11 hours driving in a shift
+DUTY_WINDOW = 'duty_window'        # driving after the 14th hour of a shift
+BREAK_REQUIRED = 'break_required'  # more than 8 hours driving without a 30-minute break
+CYCLE_LIMIT = 'cycle_limit'        # driving after 70 on-duty hours in 8 days
+
+OFF_STATUSES = ('off_duty', 'sleeper_berth')
+CYCLE_DAYS = 8
+
+_EPSILON = 1e-6
+
+
+def _hours(delta):
+    return delta.total_seconds() / 3600.0
+
+
+def _later(moment, hours):
+    return moment + datetime.timedelta(hours=hours)
+
+
+class HOSComplianceChecker:
+    """
+    Detect 11-hour, 14-hour, 30-minute-break and 70-hour/8-day violations
+
+    Status changes are fed in start-time order and each one is processed in
+    constant time against running shift counters and an 8-day window of
+    on-duty hours per day, so a driver's whole history is checked in a
+    single O(n) pass. The checker keeps its state between calls to `feed`,
+    so new changes can be appended as they are logged.
+
+    Gaps between changes count as off-duty time; overlapping changes are
+    clipped to the end of the previous one.
+    """
+
+    def __init__(self):
+        self.last_end = None
+        self.shift_start = None
+        self.driving_in_shift = 0.0
+        self.driving_since_break = 0.0
+        self.off_streak = 0.0          # consecutive off-duty/sleeper hours
+        self.non_driving_streak = 0.0  # consecutive hours not driving (breaks)
+        self.days = collections.deque()  # (date, on-duty hours), oldest first
+        self.cycle_hours = 0.0
+        self._break_epoch = 0
+        self._reported = set()
+
+    def feed(self, changes):
+        """
+        Check status changes (in start-time order) and return the violations they add
+
+        Args:
+            changes: Iterable of DutyStatusChange objects (or anything with
+                status, start_time, end_time and optionally log_sheet_id)
+
+        Returns:
+            List of Violation tuples, in time order
+        """
+        violations = []
+        for change in changes:
+            violations.extend(self.add(change.status, change.start_time, change.end_time,
+                                       getattr(change, 'log_sheet_id', None)))
+        return violations
+
+    def add(self, status, start, end, log_sheet_id=None):
+        """Check a single status interval; returns the list of new violations."""
+        end = end or start
+        if self.last_end is not None:
+            if start > self.last_end:
+                # Unlogged time counts as off duty
+                self._advance('off_duty', self.last_end, start, None, [])
+            start = max(start, self.last_end)
+        if end <= start:
+            return []
+
+        violations = []
+        # Split at midnight so on-duty hours land in the right day of the 8-day window
+        segment_start = start
+        while segment_start < end:
+            midnight = datetime.datetime.combine(
+                segment_start.date() + datetime.timedelta(days=1), datetime.time(0), tzinfo=segment_start.tzinfo
+            )
+            segment_end = min(end, midnight)
+            self._advance(status, segment_start, segment_end, log_sheet_id, violations)
+            segment_start = segment_end
+        return violations
+
+    def _advance(self, status, start, end, log_sheet_id, violations):
+        hours = _hours(end - start)
+        self.last_end = end
+
+        if status in OFF_STATUSES:
+            self.off_streak += hours
+            self.non_driving_streak += hours
+            if self.non_driving_streak >= HOSCalculator.BREAK_DURATION - _EPSILON:
+                self._reset_break()
+            if self.off_streak >= HOSCalculator.REQUIRED_REST_PERIOD - _EPSILON:
+                self._reset_shift()
+            if self.off_streak >= HOSCalculator.RESTART_HOURS - _EPSILON:
+                self.days.clear()
+                self.cycle_hours = 0.0
+                self._reported = {key for key in self._reported if key[0] != CYCLE_LIMIT}
+            return
+
+        self.off_streak = 0.0
+        if self.shift_start is None:
+            self.shift_start = start
+        cycle_before = self._add_cycle_hours(start.date(), hours)
+
+        if status != 'driving':
+            self.non_driving_streak += hours
+            if self.non_driving_streak >= HOSCalculator.BREAK_DURATION - _EPSILON:
+                self._reset_break()
+            return
+        self.non_driving_streak = 0.0
+
+        # 11 hours of driving per shift
+        limit = HOSCalculator.DAILY_DRIVING_LIMIT
+        if self.driving_in_shift + hours > limit + _EPSILON:
+            self._report(violations, DRIVING_LIMIT, self.shift_start,
+                         _later(start, max(0.0, limit - self.driving_in_shift)), end,
+                         self.driving_in_shift + hours, limit, log_sheet_id,
+                         f"Drove {self.driving_in_shift + hours:.2f}h in a shift (limit {limit}h)")
+
+        # No driving after the 14th hour since coming on duty
+        limit = HOSCalculator.DAILY_DUTY_WINDOW
+        window_end = _later(self.shift_start, limit)
+        if end > window_end + datetime.timedelta(seconds=1):
+            self._report(violations, DUTY_WINDOW, self.shift_start, max(start, window_end), end,
+                         _hours(end - self.shift_start), limit, log_sheet_id,
+                         f"Drove {_hours(end - self.shift_start):.2f}h after coming on duty (limit {limit}h)")
+
+        # 30-minute break after 8 hours of driving
+        limit = HOSCalculator.BREAK_AFTER_DRIVING
+        if self.driving_since_break + hours > limit + _EPSILON:
+            self._report(violations, BREAK_REQUIRED, ('break', self.shift_start, self._break_epoch),
+                         _later(start, max(0.0, limit - self.driving_since_break)), end,
+                         self.driving_since_break + hours, limit, log_sheet_id,
+                         f"Drove {self.driving_since_break + hours:.2f}h without a 30-minute break "
+                         f"(limit {limit}h)")
+
+        # 70 on-duty hours in 8 consecutive days
+        limit = HOSCalculator.WEEKLY_LIMIT
+        if self.cycle_hours > limit + _EPSILON:
+            self._report(violations, CYCLE_LIMIT, start.date(),
+                         _later(start, max(0.0, limit - cycle_before)), end,
+                         self.cycle_hours, limit, log_sheet_id,
+                         f"Drove with {self.cycle_hours:.2f}h on duty in {CYCLE_DAYS} days (limit {limit}h)")
+
+        self.driving_in_shift += hours
+        self.driving_since_break += hours
+
+    def _add_cycle_hours(self, date, hours):
+        """Add on-duty hours to `date` and return the 8-day total before them."""
+        oldest = date - datetime.timedelta(days=CYCLE_DAYS - 1)
+        if self.days and self.days[0][0] < oldest:
+            while self.days and self.days[0][0] < oldest:
+                self.cycle_hours -= self.days.popleft()[1]
+            self._reported = {key for key in self._reported
+                              if key[0] != CYCLE_LIMIT or key[1] >= oldest}
+        cycle_before = self.cycle_hours
+        if self.days and self.days[-1][0] == date:
+            self.days[-1] = (date, self.days[-1][1] + hours)
+        else:
+            self.days.append((date, hours))
+        self.cycle_hours += hours
+        return cycle_before
+
+    def _reset_break(self):
+        if self.driving_since_break:
+            self.driving_since_break = 0.0
+            self._break_epoch += 1
+
+    def _reset_shift(self):
+        self.shift_start = None
+        self.driving_in_shift = 0.0
+        self.driving_since_break = 0.0
+        # Violations are reported once per shift, break period or cycle day
+        self._reported = {key for key in self._reported if key[0] == CYCLE_LIMIT}
+
+    def _report(self, violations, rule, scope, at, until, hours, limit, log_sheet_id, message):
+        key = (rule, scope)
+        if key in self._reported:
+            return
+        self._reported.add(key)
+        violations.append(Violation(rule, at, until, round(hours, 2), limit, log_sheet_id, message))
+
+
+def iter_violations(status_changes, checker=None, chunk_size=2000):
+    """
+    Yield violations for a queryset of status changes, streaming it from the database
+
+    Args:
+        status_changes: DutyStatusChange queryset (one driver's changes)
+        checker: HOSComplianceChecker to continue from (a new one by default)
+        chunk_size: Rows fetched per database round trip
+    """
+    checker = checker or HOSComplianceChecker()
+    rows = (
+        status_changes.order_by('start_time', 'id')
+        .only('status', 'start_time', 'end_time', 'log_sheet_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for change in rows:
+        yield from checker.add(change.status, change.start_time, change.end_time, change.log_sheet_id)
+
+
+def driver_violations(user_id, start_date=None, end_date=None):
+    """
+    Return a driver's violations, optionally limited to a date range
+
+    History from the 7 days before `start_date` is replayed as well so the
+    70-hour/8-day window is correct on the first day of the range.
+    """
+    log_sheets = LogSheet.objects.filter(user_id=user_id)
+    if start_date:
+        log_sheets = log_sheets.filter(date__gte=start_date - datetime.timedelta(days=CYCLE_DAYS - 1))
+    if end_date:
+        log_sheets = log_sheets.filter(date__lte=end_date)
+    rehydrate_log_sheets(log_sheets)
+    status_changes = DutyStatusChange.objects.filter(log_sheet__in=log_sheets)
+    return [
+        violation for violation in iter_violations(status_changes)
+        if start_date is None or violation.at.date() >= start_date
+    ]
@@ -0,0 +1,278 @@
+"""
+Streaming FMCSA ELD output file (49 CFR 395 Subpart B, Appendix section 4.8.2)
+"""
+import datetime
+import uuid
+import zoneinfo
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import rehydrate_log_sheets
+from .models import LogSheet, DutyStatusChange
+
+# Rows fetched per database round trip
+ELD_CHUNK_SIZE = 2000
+# Characters handed to the response per chunk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+LINE_END = '\r\n'
+
+SECTIONS = (
+    'ELD File Header Segment:',
+    'User List:',
+    'CMV List:',
+    'ELD Event List:',
+    'ELD Event Annotations or Comments:',
+    "Driver's Certification/Recertification Actions:",
+    'Malfunctions and Data Diagnostic Events:',
+    'ELD Login/Logout Report:',
+    'CMV Engine Power-Up and Shut Down Activity:',
+    'Unidentified Driver Profile Records:',
+    'End of File:',
+)
+
+# Event type 1 (change in duty status) codes
+EVENT_TYPE_DUTY_STATUS = 1
+DUTY_STATUS_CODES = {'off_duty': 1, 'sleeper_berth': 2, 'driving': 3, 'on_duty': 4}
+RECORD_STATUS_ACTIVE = 1
+RECORD_ORIGIN_ELD = 1     # recorded automatically (ingested device events)
+RECORD_ORIGIN_DRIVER = 2  # entered or edited by the driver (planned logs)
+MULTIDAY_BASIS = 8        # 70 hours / 8 days
+
+# Check value character mapping: ASCII code minus 48 for letters and digits, 0 for anything else
+_CHAR_VALUES = bytes(code - 48 if chr(code).isalnum() else 0 for code in range(128)) + bytes(128)
+
+
+def _char_sum(text):
+    return sum(text.encode('ascii', 'replace').translate(_CHAR_VALUES))
+
+
+def _rotate_left(value, bits, width):
+    mask = (1 << width) - 1
+    return ((value << bits) | (value >> (width - bits))) & mask
+
+
+def event_check_value(*fields):
+    """Event data check value (4.4.5.1) of an event's type, code, date, time, miles, hours, position, CMV and user."""
+    return f"{_rotate_left(_char_sum(''.join(fields)) & 0xFF, 3, 8) ^ 0xC3:02X}"
+
+
+def line_check_value(line):
+    """Line data check value (4.4.5.2) of a line's fields."""
+    return f"{_rotate_left(_char_sum(line) & 0xFF, 3, 8) ^ 0x96:02X}"
+
+
+def _text(value, length=None):
+    """Free text as a field: commas and line breaks would break the format, and the file is ASCII."""
+    text = (value or '')[:length]
+    for character in ',\r\n':
+        text = text.replace(character, ' ')
+    return text.encode('ascii', 'replace').decode('ascii')
+
+
+class ELDOutputWriter:
+    """
+    Format output file lines, keeping the file data check value (4.4.5.3) as it goes
+
+    Each data line ends with its line data check value; the file check value
+    is folded from those one line at a time, so nothing has to be buffered.
+    Free-text fields must be passed through _text() first.
+    """
+
+    def __init__(self):
+        self._line_sum = 0
+
+    def line(self, *fields):
+        text = ','.join(['' if value is None else str(value) for value in fields])
+        check = line_check_value(text)
+        self._line_sum += int(check, 16)
+        return f"{text},{check}{LINE_END}"
+
+    def section(self, title):
+        return f"{title}{LINE_END}"
+
+    def file_check_value(self):
+        return f"{_rotate_left(self._line_sum & 0xFFFF, 3, 16) ^ 0x969C:04X}"
+
+    def end(self):
+        return f"{SECTIONS[-1]}{LINE_END}{self.file_check_value()}{LINE_END}"
+
+
+def _setting(name):
+    return _text(getattr(settings, name, ''))
+
+
+def _home_timezone():
+    return zoneinfo.ZoneInfo(getattr(settings, 'ELD_HOME_TIMEZONE', '') or settings.TIME_ZONE)
+
+
+def _date(moment):
+    return f"{moment:%m%d%y}"
+
+
+def _time(moment):
+    return f"{moment:%H%M%S}"
+
+
+def _coordinate(value):
+    # Output files carry positions rounded to two decimals
+    return '' if value is None else f"{value:.2f}"
+
+
+def _sequence(number):
+    return f"{number & 0xFFFF:X}"
+
+
+def _status_changes(user_id, start_date, end_date):
+    return (
+        DutyStatusChange.objects
+        .filter(log_sheet__user_id=user_id, log_sheet__date__gte=start_date, log_sheet__date__lte=end_date)
+        .order_by('start_time', 'id')
+        .values_list('status', 'start_time', 'end_time', 'latitude', 'longitude', 'location', 'remarks',
+                     'event_id', 'log_sheet__vehicle_number')
+        .iterator(chunk_size=ELD_CHUNK_SIZE)
+    )
+
+
+def duty_status_events(rows):
+    """
+    Yield (sequence number, row) for each change of duty status
+
+    Stored changes are split at midnight and may repeat a status; a row that
+    continues the previous status without a gap is not a new event.
+    """
+    number = 0
+    previous_status = previous_end = None
+    for row in rows:
+        status, start_time, end_time = row[0], row[1], row[2]
+        continues = status == previous_status and start_time == previous_end
+        previous_status, previous_end = status, end_time or start_time
+        if continues:
+            continue
+        number += 1
+        yield number, row
+
+
+def event_list_lines(writer, events, username, home_tz, cmv_order):
+    """
+    Yield ELD Event List lines for (sequence number, row) pairs from duty_status_events
+
+    Returns:
+        The last sequence number written
+    """
+    last_number = 0
+    for number, row in events:
+        status, start_time, _, latitude, longitude, _, _, event_id, vehicle = row
+        moment = start_time.astimezone(home_tz)
+        code = DUTY_STATUS_CODES.get(status, 1)
+        date, time, lat, lng = _date(moment), _time(moment), _coordinate(latitude), _coordinate(longitude)
+        check = event_check_value(str(EVENT_TYPE_DUTY_STATUS), str(code), date, time, '0', '0.0',
+                                  lat, lng, _text(vehicle), username)
+        yield writer.line(
+            _sequence(number), RECORD_STATUS_ACTIVE, RECORD_ORIGIN_ELD if event_id else RECORD_ORIGIN_DRIVER,
+            EVENT_TYPE_DUTY_STATUS, code, date, time, 0, '0.0', lat, lng, 0,
+            cmv_order.get(vehicle or '', 1), 1, 0, 0, check,
+        )
+        last_number = number
+    return last_number
+
+
+def iter_eld_output(user, start_date, end_date, comment=''):
+    """
+    Yield the lines of a driver's ELD output file for a date range
+
+    Status changes are read from the database in chunks (twice: once for
+    the event list and once for its annotations, so neither list is held in
+    memory) and check values are computed as each line is written.
+
+    Args:
+        user: Driver (User)
+        start_date: First log date
+        end_date: Last log date
+        comment: Output file comment (e.g. the inspector's reference)
+    """
+    writer = ELDOutputWriter()
+    home_tz = _home_timezone()
+    now = timezone.now().astimezone(home_tz)
+    log_sheets = LogSheet.objects.filter(user=user, date__gte=start_date, date__lte=end_date)
+    rehydrate_log_sheets(log_sheets)
+    latest_sheet = log_sheets.order_by('-date', '-id').values('vehicle_number', 'trailer_number').first() or {}
+    vehicles = sorted(set(log_sheets.values_list('vehicle_number', flat=True).distinct())) or ['']
+    cmv_order = {vehicle: index for index, vehicle in enumerate(vehicles, start=1)}
+    last_position = (
+        DutyStatusChange.objects
+        .filter(log_sheet__in=log_sheets, latitude__isnull=False)
+        .order_by('-start_time').values_list('latitude', 'longitude').first()
+    ) or (None, None)
+    offset = home_tz.utcoffset(datetime.datetime.combine(start_date, datetime.time(12)))
+    username = _text(user.username)
+    last_name, first_name = _text(user.last_name), _text(user.first_name)
+
+    yield writer.section(SECTIONS[0])
+    yield writer.line(last_name, first_name, username, '', '')
+    yield writer.line('', '', '')  # No co-driver
+    yield writer.line(_text(latest_sheet.get('vehicle_number')), '', _text(latest_sheet.get('trailer_number')))
+    yield writer.line(_setting('ELD_CARRIER_USDOT'), _setting('ELD_CARRIER_NAME'), MULTIDAY_BASIS, '000000',
+                      f"{abs(int(offset.total_seconds() // 3600)):02d}")
+    yield writer.line('', 0)  # Shipping document number, exempt driver configuration
+    yield writer.line(_date(now), _time(now), _coordinate(last_position[0]), _coordinate(last_position[1]), 0, '0.0')
+    yield writer.line(_setting('ELD_REGISTRATION_ID'), _setting('ELD_IDENTIFIER'), '', _text(comment, 60))
+
+    yield writer.section(SECTIONS[1])
+    yield writer.line(1, 'D', last_name, first_name)
+
+    yield writer.section(SECTIONS[2])
+    for vehicle, order in cmv_order.items():
+        yield writer.line(order, _text(vehicle), '')
+
+    yield writer.section(SECTIONS[3])
+    last_number = yield from event_list_lines(
+        writer, duty_status_events(_status_changes(user.id, start_date, end_date)), username, home_tz, cmv_order,
+    )
+
+    yield writer.section(SECTIONS[4])
+    for number, row in duty_status_events(_status_changes(user.id, start_date, end_date)):
+        remarks, location = row[6], row[5]
+        if remarks:
+            moment = row[1].astimezone(home_tz)
+            yield writer.line(_sequence(number), username, _text(remarks, 60), _date(moment), _time(moment),
+                              _text(location, 60))
+
+    yield writer.section(SECTIONS[5])
+    certified = log_sheets.filter(certified_at__isnull=False).order_by('certified_at', 'id')
+    for date, certified_at, vehicle in certified.values_list('date', 'certified_at', 'vehicle_number').iterator(
+            chunk_size=ELD_CHUNK_SIZE):
+        last_number += 1
+        moment = certified_at.astimezone(home_tz)
+        yield writer.line(_sequence(last_number), 1, _date(moment), _time(moment), _date(date),
+                          cmv_order.get(vehicle, 1))
+
+    # No malfunctions, logins, engine power cycles or unidentified driving are recorded
+    for title in SECTIONS[6:-1]:
+        yield writer.section(title)
+    yield writer.end()
+
+
+def stream_eld_output(user, start_date, end_date, comment='', chunk_size=STREAM_CHUNK_SIZE):
+    """Join the output file lines into chunks of about `chunk_size` characters for a streaming response."""
+    buffer = []
+    size = 0
+    for line in iter_eld_output(user, start_date, end_date, comment):
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def eld_output_filename(user, today=None):
+    """
+    Output file name: first five letters of the last name, last four of the
+    license number (0000 here), file date (MMDDYY) and a unique suffix
+    """
+    today = today or timezone.now().date()
+    last_name = ''.join(c for c in (user.last_name or user.username) if c.isalnum())[:5] or 'ELD'
+    return f"{last_name}0000{today:%m%d%y}-{uuid.uuid4().hex[:10].upper()}.csv"
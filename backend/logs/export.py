@@ -0,0 +1,140 @@
+"""
+Streaming multi-sheet exports (one multi-page PDF, or a ZIP of PDFs)
+"""
+import io
+import tempfile
+import zipfile
+
+from .archive import rehydrate_log_sheets
+from .models import LogSheet
+from .rendering import ELDCanvasRenderer
+
+# Sheets (with their status changes) fetched per database round trip
+EXPORT_CHUNK_SIZE = 100
+
+# Bytes per chunk handed to the response, and in-memory limit for PDF spooling
+STREAM_CHUNK_SIZE = 64 * 1024
+PDF_SPOOL_LIMIT = 8 * 1024 * 1024
+
+
+def driver_info_for(user):
+    """Driver details printed on a log sheet (falls back to the username)."""
+    return {
+        'name': getattr(user, 'get_full_name', lambda: '')() or user.username,
+        'id': user.username,
+    }
+
+
+def export_queryset(params):
+    """
+    Return the log sheets selected by LogSheetExportSerializer data
+
+    Args:
+        params: Dictionary with 'trip_id', or 'user_id' with 'start_date' and
+            'end_date' (dates or ISO strings)
+    """
+    log_sheets = LogSheet.objects.all()
+    if params.get('trip_id'):
+        log_sheets = log_sheets.filter(trip_id=params['trip_id'])
+    if params.get('user_id'):
+        log_sheets = log_sheets.filter(user_id=params['user_id'])
+    if params.get('start_date'):
+        log_sheets = log_sheets.filter(date__gte=params['start_date'])
+    if params.get('end_date'):
+        log_sheets = log_sheets.filter(date__lte=params['end_date'])
+    return log_sheets
+
+
+def export_filename(params):
+    """Download file name (without extension) for an export."""
+    if params.get('trip_id'):
+        return f"trip_{params['trip_id']}_logs"
+    return f"driver_{params['user_id']}_logs"
+
+
+def iter_sheets(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield (log_sheet, status_changes) in date order, reading the database in chunks
+
+    Each chunk costs two queries (sheets with their user, then their status
+    changes), so memory use stays bounded by the chunk size. Archived sheets
+    in the selection are loaded back from the cold archive first.
+    """
+    rehydrate_log_sheets(queryset)
+    queryset = (
+        queryset.select_related('user')
+        .prefetch_related('status_changes')
+        .order_by('date', 'id')
+    )
+    for log_sheet in queryset.iterator(chunk_size=chunk_size):
+        yield log_sheet, log_sheet.status_changes.all()
+
+
+def stream_pdf(queryset):
+    """
+    Yield one multi-page PDF containing every sheet in `queryset`
+
+    reportlab writes the document trailer only once every page is known, so
+    pages are rendered into a spooled temporary file (kept in memory up to
+    PDF_SPOOL_LIMIT, on disk beyond it) and then streamed out in chunks.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_LIMIT) as spool:
+        renderer = ELDCanvasRenderer(spool)
+        for log_sheet, status_changes in iter_sheets(queryset):
+            renderer.draw_page(log_sheet, status_changes, driver_info_for(log_sheet.user))
+        if renderer.page_count:
+            renderer.save()
+        spool.seek(0)
+        while True:
+            chunk = spool.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, unseekable sink that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(queryset):
+    """
+    Yield a ZIP archive with one PDF per sheet, writing each entry as soon as it is rendered
+    """
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for log_sheet, status_changes in iter_sheets(queryset):
+            buffer = io.BytesIO()
+            renderer = ELDCanvasRenderer(buffer)
+            renderer.draw_page(log_sheet, status_changes, driver_info_for(log_sheet.user))
+            renderer.save()
+
+            info = zipfile.ZipInfo(
+                f"log_sheet_{log_sheet.date}_{log_sheet.id}.pdf",
+                date_time=log_sheet.updated_at.timetuple()[:6],
+            )
+            # PDFs are already compressed; storing them avoids wasted CPU
+            archive.writestr(info, buffer.getvalue(), compress_type=zipfile.ZIP_STORED)
+            data = sink.pop()
+            if data:
+                yield data
+    yield sink.pop()
@@ -0,0 +1,250 @@
+"""
+Bulk ingest of ELD duty status events (NDJSON or CSV)
+"""
+import csv
+import datetime
+import json
+import time
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import LogSheet, DutyStatusChange
+from .archive import rehydrate_log_sheets
+from .signals import log_sheets_changed
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
+
+# Rows validated and loaded per transaction
+INGEST_BATCH_SIZE = 5000
+# Per-row errors returned to the client (the rest are only counted)
+MAX_REPORTED_ERRORS = 100
+
+INGEST_COLUMNS = (
+    'event_id', 'log_sheet_id', 'status', 'start_time', 'end_time', 'duration',
+    'location', 'latitude', 'longitude', 'remarks',
+)
+
+_STATUSES = {status for status, _ in DutyStatusChange.STATUS_CHOICES}
+
+
+class IngestError(ValueError):
+    """A single event failed validation."""
+
+
+def read_ndjson(stream):
+    """Yield (line number, event dict) from a binary NDJSON stream, one line at a time."""
+    loads = orjson.loads if orjson is not None else json.loads
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, loads(line)
+        except ValueError as e:
+            yield line_no, IngestError(f"Invalid JSON: {e}")
+
+
+def read_csv(stream):
+    """Yield (line number, event dict) from a binary CSV stream with a header row."""
+    reader = csv.DictReader(line.decode('utf-8') for line in stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _float_or_none(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise IngestError(f"'{name}' must be a number")
+
+
+def _datetime(value, name, required=True):
+    if value in (None, ''):
+        if required:
+            raise IngestError(f"'{name}' is required")
+        return None
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise IngestError(f"'{name}' must be an ISO 8601 datetime")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment
+
+
+def validate_event(event):
+    """
+    Validate one event and return its row tuple (in INGEST_COLUMNS order)
+
+    Raises IngestError with a message when the event is invalid.
+    """
+    if isinstance(event, IngestError):
+        raise event
+    if not isinstance(event, dict):
+        raise IngestError('Event must be an object')
+
+    event_id = str(event.get('event_id') or '').strip()
+    if not event_id or len(event_id) > 64:
+        raise IngestError("'event_id' is required (at most 64 characters)")
+    try:
+        log_sheet_id = int(event.get('log_sheet_id'))
+    except (TypeError, ValueError):
+        raise IngestError("'log_sheet_id' must be an integer")
+    status = event.get('status')
+    if status not in _STATUSES:
+        raise IngestError(f"'status' must be one of {', '.join(sorted(_STATUSES))}")
+
+    start_time = _datetime(event.get('start_time'), 'start_time')
+    end_time = _datetime(event.get('end_time'), 'end_time', required=False)
+    duration = None
+    if end_time is not None:
+        if end_time < start_time:
+            raise IngestError("'end_time' must not be before 'start_time'")
+        duration = round((end_time - start_time).total_seconds() / 3600.0, 4)
+
+    location = str(event.get('location') or '')[:255]
+    return (
+        event_id, log_sheet_id, status, start_time, end_time, duration, location,
+        _float_or_none(event.get('latitude'), 'latitude'),
+        _float_or_none(event.get('longitude'), 'longitude'),
+        str(event.get('remarks') or ''),
+    )
+
+
+def _is_psycopg3():
+    try:
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    except ImportError:
+        return False
+    return is_psycopg3
+
+
+class EventIngestor:
+    """
+    Validate and load a stream of duty status events in batches
+
+    Events are validated as they are read, so a request body of any size is
+    processed in constant memory. Each batch is loaded in its own
+    transaction: with PostgreSQL (psycopg 3) through COPY into a temporary
+    table followed by INSERT ... ON CONFLICT (event_id) DO NOTHING, and with
+    other databases through bulk_create(ignore_conflicts=True). Events whose
+    event_id was already loaded are skipped, so clients can safely resend a
+    batch after a timeout.
+    """
+
+    def __init__(self, batch_size=INGEST_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.use_copy = connection.vendor == 'postgresql' and _is_psycopg3()
+        self.received = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors = []
+        self.log_sheet_ids = set()
+
+    def ingest(self, events):
+        """
+        Load (line number, event) pairs and return a summary dict
+        """
+        started = time.perf_counter()
+        batch = []
+        for line_no, event in events:
+            self.received += 1
+            try:
+                batch.append((line_no, validate_event(event)))
+            except IngestError as e:
+                self._reject(line_no, str(e))
+            if len(batch) >= self.batch_size:
+                self._load(batch)
+                batch = []
+        if batch:
+            self._load(batch)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'received': self.received,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'rows_per_second': round(self.received / elapsed) if elapsed else None,
+        }
+
+    def _reject(self, line_no, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_no, 'error': message})
+
+    def _load(self, batch):
+        # Drop events whose sheet does not exist, and repeats within the batch
+        sheets = dict(
+            LogSheet.objects.filter(id__in={row[1] for _, row in batch}).values_list('id', 'archived_at')
+        )
+        sheet_ids = set(sheets)
+        # Events for an archived sheet join its archived changes, so load those back first
+        rehydrate_log_sheets([sheet_id for sheet_id, archived_at in sheets.items() if archived_at])
+        rows = {}
+        for line_no, row in batch:
+            if row[1] not in sheet_ids:
+                self._reject(line_no, f"Log sheet {row[1]} not found")
+            elif row[0] in rows:
+                self.duplicates += 1
+            else:
+                rows[row[0]] = row
+
+        with transaction.atomic():
+            loaded = DutyStatusChange.objects.filter(event_id__in=list(rows)).values_list('event_id', flat=True)
+            for event_id in loaded:
+                del rows[event_id]
+                self.duplicates += 1
+            if rows:
+                inserted = self._copy(rows.values()) if self.use_copy else self._bulk_create(rows.values())
+                self.duplicates += len(rows) - inserted
+                self.inserted += inserted
+                # Bulk loads skip signals, so refresh the stored hour totals here
+                touched = {row[1] for row in rows.values()}
+                LogSheet.refresh_hour_totals(touched)
+                log_sheets_changed(touched)
+                self.log_sheet_ids |= touched
+
+    def _bulk_create(self, rows):
+        DutyStatusChange.objects.bulk_create(
+            [DutyStatusChange(**dict(zip(INGEST_COLUMNS, row))) for row in rows],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        # Rows lost to a concurrent insert of the same event_id are not counted
+        # separately here; the pre-check above catches all earlier loads
+        return len(rows)
+
+    def _copy(self, rows):
+        meta = DutyStatusChange._meta
+        table = connection.ops.quote_name(meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(meta.get_field(name).column)
+                            for name in INGEST_COLUMNS)
+        with connection.cursor() as cursor:
+            # Dropped at commit; IF NOT EXISTS covers callers already inside a transaction
+            cursor.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS ingest_status_changes "
+                "(event_id varchar(64), log_sheet_id bigint, status varchar(20), "
+                "start_time timestamptz, end_time timestamptz, duration double precision, "
+                "location varchar(255), latitude double precision, longitude double precision, "
+                "remarks text) ON COMMIT DROP"
+            )
+            with cursor.copy(f"COPY ingest_status_changes ({', '.join(INGEST_COLUMNS)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"SELECT {', '.join(INGEST_COLUMNS)} FROM ingest_status_changes "
+                f"ON CONFLICT (event_id) DO NOTHING"
+            )
+            inserted = cursor.rowcount
+            cursor.execute("TRUNCATE ingest_status_changes")
+            return inserted
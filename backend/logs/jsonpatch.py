@@ -0,0 +1,125 @@
+"""
+Minimal JSON Patch (RFC 6902) support for visual log data edits
+"""
+import copy
+
+
+class JsonPatchError(ValueError):
+    """Raised when a patch is malformed or cannot be applied to the document."""
+
+
+def _parse_pointer(pointer):
+    """Split a JSON Pointer (RFC 6901) into unescaped reference tokens."""
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith('/')):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    if pointer == '':
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _array_index(container, token, allow_end=False):
+    if token == '-' and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _resolve(document, tokens):
+    """Return the value the tokens point at."""
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_array_index(document, token)]
+        else:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+    return document
+
+
+def _add(document, tokens, value):
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, key, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add to a non-container at /{'/'.join(tokens)}")
+    return document
+
+
+def _remove(document, tokens):
+    if not tokens:
+        raise JsonPatchError('Cannot remove the whole document')
+    parent = _resolve(document, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, key))
+    raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def apply_patch(document, operations):
+    """
+    Apply a list of JSON Patch operations and return the patched document
+
+    The input document is left untouched; operations are applied to a deep
+    copy in order, and the whole patch fails if any operation fails.
+
+    Args:
+        document: JSON document (dict/list/scalars)
+        operations: List of {'op', 'path', ['value' | 'from']} dictionaries
+
+    Returns:
+        The patched document
+    """
+    if not isinstance(operations, list):
+        raise JsonPatchError('Patch must be a list of operations')
+    document = copy.deepcopy(document)
+
+    for operation in operations:
+        if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+            raise JsonPatchError(f"Invalid operation: {operation!r}")
+        op = operation['op']
+        tokens = _parse_pointer(operation['path'])
+
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise JsonPatchError(f"'{op}' operation requires a value")
+        if op in ('move', 'copy') and 'from' not in operation:
+            raise JsonPatchError(f"'{op}' operation requires 'from'")
+
+        if op == 'add':
+            document = _add(document, tokens, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            _remove(document, tokens)
+        elif op == 'replace':
+            if tokens:
+                _remove(document, tokens)
+            document = _add(document, tokens, copy.deepcopy(operation['value']))
+        elif op == 'move':
+            source = _parse_pointer(operation['from'])
+            if tokens[:len(source)] == source and tokens != source:
+                raise JsonPatchError('Cannot move a value into one of its children')
+            value = _remove(document, source) if source else document
+            document = _add(document, tokens, value)
+        elif op == 'copy':
+            value = copy.deepcopy(_resolve(document, _parse_pointer(operation['from'])))
+            document = _add(document, tokens, value)
+        elif op == 'test':
+            if _resolve(document, tokens) != operation['value']:
+                raise JsonPatchError(f"Test failed at {operation['path']}")
+        else:
+            raise JsonPatchError(f"Unknown operation: {op!r}")
+
+    return document
@@ -0,0 +1,49 @@
+"""
+Move old certified log sheets into the cold archive, leaving tombstones behind
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from logs.archive import ARCHIVE_BATCH_SIZE, archive_counts, archive_log_sheets, archive_root
+
+
+class Command(BaseCommand):
+    help = "Archive certified log sheets older than the retention window to compressed files under LOG_ARCHIVE_DIR"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            default=getattr(settings, 'LOG_ARCHIVE_AFTER_DAYS', 365),
+                            help='Archive sheets dated more than this many days ago (default: LOG_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help='Sheets written per archive file')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many sheets per month would be archived')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--older-than-days and --batch-size must be positive')
+        before = timezone.localdate() - datetime.timedelta(days=options['older_than_days'])
+
+        if options['dry_run']:
+            total = 0
+            for month, sheets in archive_counts(before):
+                self.stdout.write(f"{month:%Y-%m}: {sheets} log sheets")
+                total += sheets
+            self.stdout.write(f"{total} log sheets dated before {before} would be archived")
+            return
+
+        started = time.perf_counter()
+        files = sheets = 0
+        for path, count in archive_log_sheets(before, batch_size=options['batch_size']):
+            self.stdout.write(f"Archived {count} log sheets to {path}")
+            files += 1
+            sheets += count
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {sheets} log sheets dated before {before} into {files} files "
+            f"under {archive_root()} in {elapsed:.2f}s"
+        ))
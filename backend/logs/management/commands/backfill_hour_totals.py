@@ -0,0 +1,38 @@
+"""
+Recompute the stored per-status hour totals of existing log sheets
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from logs.models import LogSheet
+
+
+class Command(BaseCommand):
+    help = "Backfill LogSheet driving/on-duty/off-duty/sleeper hour totals from their status changes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Sheets updated per UPDATE statement')
+        parser.add_argument('--trip', type=int, nargs='*', dest='trip_ids',
+                            help='Only backfill sheets of these trip ids (default: all sheets)')
+
+    def handle(self, *args, **options):
+        log_sheets = LogSheet.objects.order_by('id')
+        if options['trip_ids']:
+            log_sheets = log_sheets.filter(trip_id__in=options['trip_ids'])
+
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        updated = 0
+        batch = []
+        for sheet_id in log_sheets.values_list('id', flat=True).iterator(chunk_size=batch_size):
+            batch.append(sheet_id)
+            if len(batch) >= batch_size:
+                updated += LogSheet.refresh_hour_totals(batch, touch=False)
+                batch = []
+        if batch:
+            updated += LogSheet.refresh_hour_totals(batch, touch=False)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Backfilled hour totals for {updated} log sheets in {elapsed:.2f}s"))
@@ -0,0 +1,381 @@
+"""
+Generate a deterministic synthetic fleet for benchmarks and load tests
+
+Each driver gets back-to-back trips between freight hubs (pickup, breaks,
+fuel and rest stops, dropoff, and route segments with long polylines) and a
+log sheet with duty status changes for every day of the history. The data
+depends only on --seed, --scale and --end-date, so two runs with the same
+arguments produce the same fleet; everything is written with bulk inserts.
+"""
+import collections
+import datetime
+import json
+import math
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from logs.models import DutyStatusChange, LogSheet
+from logs.utils import DutyGrid
+from trips.models import RouteSegment, Stop, Trip
+from trips.utils import round_coordinates
+
+# Drivers and days of history at --scale 1
+BASE_DRIVERS = 1000
+BASE_DAYS = 90
+
+HUBS = [
+    ('Atlanta, GA', 33.749, -84.388), ('Chicago, IL', 41.878, -87.630),
+    ('Dallas, TX', 32.777, -96.797), ('Denver, CO', 39.739, -104.990),
+    ('Los Angeles, CA', 34.052, -118.244), ('Memphis, TN', 35.150, -90.049),
+    ('Indianapolis, IN', 39.768, -86.158), ('Columbus, OH', 39.961, -82.999),
+    ('Kansas City, MO', 39.100, -94.579), ('Phoenix, AZ', 33.448, -112.074),
+    ('Salt Lake City, UT', 40.761, -111.891), ('Seattle, WA', 47.606, -122.332),
+    ('Portland, OR', 45.515, -122.679), ('Sacramento, CA', 38.582, -121.494),
+    ('Houston, TX', 29.760, -95.370), ('San Antonio, TX', 29.424, -98.494),
+    ('El Paso, TX', 31.762, -106.485), ('Oklahoma City, OK', 35.468, -97.516),
+    ('St. Louis, MO', 38.627, -90.199), ('Nashville, TN', 36.163, -86.781),
+    ('Charlotte, NC', 35.227, -80.843), ('Jacksonville, FL', 30.332, -81.656),
+    ('Miami, FL', 25.762, -80.192), ('Harrisburg, PA', 40.274, -76.884),
+    ('Newark, NJ', 40.736, -74.172), ('Boston, MA', 42.360, -71.059),
+    ('Detroit, MI', 42.331, -83.046), ('Minneapolis, MN', 44.978, -93.265),
+    ('Omaha, NE', 41.257, -95.935), ('Albuquerque, NM', 35.084, -106.650),
+    ('Reno, NV', 39.530, -119.814), ('Louisville, KY', 38.253, -85.759),
+]
+FIRST_NAMES = ['James', 'Maria', 'Robert', 'Linda', 'Michael', 'Carmen', 'David', 'Angela',
+               'Jose', 'Karen', 'Daniel', 'Tamika', 'Kevin', 'Rosa', 'Brian', 'Denise']
+LAST_NAMES = ['Smith', 'Johnson', 'Garcia', 'Williams', 'Brown', 'Martinez', 'Davis', 'Lopez',
+              'Miller', 'Wilson', 'Anderson', 'Thomas', 'Jackson', 'White', 'Harris', 'Clark']
+
+ROAD_FACTOR = 1.2  # Road miles per great-circle mile
+FUEL_EVERY_MILES = 1000
+CERTIFY_AFTER_DAYS = 2  # Sheets older than this are certified
+CYCLE_LIMIT = 70  # On-duty hours in 8 days; a driver near it takes days off instead
+LATEST_SHIFT_END = 18.0  # Shifts end by 18:00 so the next one (from 04:00) follows a 10-hour rest
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 3958.8 * 2 * math.asin(math.sqrt(a))
+
+
+class Leg:
+    """One trip in progress: a hub-to-hub run and how far along it the driver is."""
+
+    def __init__(self, rng, origin, current):
+        self.origin = origin
+        self.destination = rng.choice([hub for hub in HUBS if hub is not origin])
+        self.current = current
+        self.miles = round(haversine_miles(*origin[1:], *self.destination[1:]) * ROAD_FACTOR, 1)
+        self.driven = 0.0
+        self.stops = []  # [stop_type, miles from start, arrival, departure]
+        self.started = self.finished = None
+        self.cycle_hours = 0.0
+
+    def position(self, miles):
+        fraction = min(1.0, miles / self.miles) if self.miles else 1.0
+        return (self.origin[1] + (self.destination[1] - self.origin[1]) * fraction,
+                self.origin[2] + (self.destination[2] - self.origin[2]) * fraction)
+
+    def place(self, miles):
+        if miles <= 0:
+            return self.origin[0]
+        if miles >= self.miles:
+            return self.destination[0]
+        return f"En route to {self.destination[0]} (mile {miles:.0f})"
+
+
+class FleetGenerator:
+    """Builds one driver's trips and log history from a per-driver random stream."""
+
+    def __init__(self, seed, end_date, days, point_spacing):
+        self.seed = seed
+        self.end_date = end_date
+        self.days = days
+        self.point_spacing = point_spacing
+
+    def driver(self, index):
+        rng = random.Random(f"{self.seed}:{index}")
+        user = User(
+            username=f"fleet{self.seed}-{index:06d}",
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            email=f"fleet{self.seed}-{index:06d}@example.com",
+            password='!',  # Unusable: synthetic drivers never log in
+        )
+        vehicle = f"TRK-{rng.randrange(1000, 9999)}"
+        trailer = f"TRL-{rng.randrange(1000, 9999)}"
+        origin = rng.choice(HUBS)
+        leg = Leg(rng, origin, origin)
+        legs = [leg]
+        days = []  # (leg, date, [(status, start, end, miles at start, remarks)])
+        cycle = collections.deque(maxlen=7)  # On-duty hours of the previous 7 days
+        first_day = self.end_date - datetime.timedelta(days=self.days)
+        for offset in range(self.days):
+            date = first_day + datetime.timedelta(days=offset)
+            if leg.finished is not None:
+                leg = Leg(rng, leg.destination, leg.destination)
+                legs.append(leg)
+            if leg.started is None:
+                leg.cycle_hours = sum(cycle)
+            if sum(cycle) + 14 > CYCLE_LIMIT or rng.random() < 0.1:
+                periods = [('off_duty', 0.0, 24.0, leg.driven, 'Off duty')]
+            else:
+                periods = self._shift(rng, leg, date)
+            cycle.append(sum(end - begin for status, begin, end, *_ in periods
+                             if status in ('driving', 'on_duty')))
+            days.append((leg, date, periods))
+        return user, vehicle, trailer, legs, days
+
+    def _shift(self, rng, leg, date):
+        """Duty periods of one working day (hours since midnight), advancing the leg."""
+        midnight = datetime.datetime.combine(date, datetime.time(0, 0), tzinfo=datetime.timezone.utc)
+        at = lambda hours: midnight + datetime.timedelta(hours=hours)  # noqa: E731
+        start = rng.randrange(16, 36) / 4  # 04:00 - 08:45
+        if leg.stops and leg.stops[-1][3] is None:
+            leg.stops[-1][3] = at(start)  # The overnight rest ends
+        periods = [('off_duty', 0.0, start, leg.driven, '')]
+        clock = start
+        if leg.started is None:
+            leg.started = at(clock)
+            periods.append(('on_duty', clock, clock + 1.0, 0.0, 'Pickup'))
+            leg.stops.append(['pickup', 0.0, at(clock), at(clock + 1.0)])
+            clock += 1.0
+        else:
+            periods.append(('on_duty', clock, clock + 0.5, leg.driven, 'Pre-trip inspection'))
+            clock += 0.5
+
+        # Keep an hour for the dropoff or post-trip inspection inside the 14-hour window
+        end_by = min(start + 14.0, LATEST_SHIFT_END) - 1.0
+        driving_left = min(11.0, end_by - clock)
+        first_stint = True
+        while driving_left > 0 and leg.driven < leg.miles:
+            stint = min(driving_left, rng.randrange(12, 32) / 4)
+            speed = rng.uniform(50, 60)
+            miles = min(stint * speed, leg.miles - leg.driven)
+            stint = math.ceil(miles / speed * 4 - 1e-9) / 4  # Whole quarter hours
+            periods.append(('driving', clock, clock + stint, leg.driven, ''))
+            before = leg.driven
+            leg.driven = round(leg.driven + miles, 1)
+            clock += stint
+            driving_left -= stint
+            if leg.driven >= leg.miles:
+                break
+            if before // FUEL_EVERY_MILES != leg.driven // FUEL_EVERY_MILES:
+                periods.append(('on_duty', clock, clock + 0.5, leg.driven, 'Fuel'))
+                leg.stops.append(['fuel', leg.driven, at(clock), at(clock + 0.5)])
+            elif first_stint:
+                periods.append(('off_duty', clock, clock + 0.5, leg.driven, '30-minute break'))
+                leg.stops.append(['break', leg.driven, at(clock), at(clock + 0.5)])
+            else:
+                break
+            clock += 0.5
+            driving_left = min(driving_left, end_by - clock)
+            first_stint = False
+
+        if leg.driven >= leg.miles:
+            periods.append(('on_duty', clock, clock + 1.0, leg.driven, 'Dropoff'))
+            leg.stops.append(['dropoff', leg.miles, at(clock), at(clock + 1.0)])
+            clock += 1.0
+            leg.finished = at(clock)
+            periods.append(('off_duty', clock, 24.0, leg.driven, ''))
+        else:
+            periods.append(('on_duty', clock, clock + 0.25, leg.driven, 'Post-trip inspection'))
+            clock += 0.25
+            periods.append(('sleeper_berth', clock, 24.0, leg.driven, '10-hour rest'))
+            leg.stops.append(['rest', leg.driven, at(clock), None])  # Departs when the next shift starts
+        return periods
+
+    def polyline(self, rng, start, end, miles):
+        """A dense, slightly wandering line from start to end, one point every point_spacing miles."""
+        points = max(2, int(miles / self.point_spacing) + 1)
+        coords = []
+        for i in range(points):
+            fraction = i / (points - 1)
+            wobble = 0.0 if i in (0, points - 1) else rng.uniform(-0.002, 0.002)
+            coords.append((start[0] + (end[0] - start[0]) * fraction + wobble,
+                           start[1] + (end[1] - start[1]) * fraction - wobble))
+        return json.dumps(round_coordinates(coords))
+
+
+class Command(BaseCommand):
+    help = ("Generate a deterministic synthetic fleet: drivers, trips with stops and route polylines, "
+            "and daily log sheets with duty status changes")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Random seed; the same seed, scale and end date give the same fleet')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'Scale factor: {BASE_DRIVERS} drivers with {BASE_DAYS} days of history at 1.0')
+        parser.add_argument('--drivers', type=int,
+                            help='Number of drivers (overrides the scale factor)')
+        parser.add_argument('--days', type=int, default=BASE_DAYS,
+                            help='Days of log history per driver')
+        parser.add_argument('--end-date', dest='end_date', default='2026-01-01',
+                            help='YYYY-MM-DD day after the last day of history (fixed so runs are reproducible)')
+        parser.add_argument('--point-spacing', type=float, default=2.0,
+                            help='Miles between route polyline points')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Drivers generated and inserted per transaction')
+
+    def handle(self, *args, **options):
+        drivers = options['drivers']
+        if drivers is None:
+            drivers = max(1, round(BASE_DRIVERS * options['scale']))
+        if drivers < 1 or options['days'] < 1 or options['batch_size'] < 1 or options['point_spacing'] <= 0:
+            raise CommandError('--drivers/--scale, --days, --batch-size and --point-spacing must be positive')
+        prefix = f"fleet{options['seed']}-"
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"A fleet with seed {options['seed']} already exists (users {prefix}*); "
+                               "use another --seed or flush the database")
+
+        end_date = datetime.date.fromisoformat(options['end_date'])
+        generator = FleetGenerator(options['seed'], end_date, options['days'], options['point_spacing'])
+        started = time.perf_counter()
+        totals = dict.fromkeys(['drivers', 'trips', 'stops', 'segments', 'log_sheets', 'status_changes'], 0)
+        for first in range(0, drivers, options['batch_size']):
+            indexes = range(first, min(drivers, first + options['batch_size']))
+            with transaction.atomic():
+                counts = self._insert([generator.driver(index) for index in indexes], generator, end_date)
+            for key, value in counts.items():
+                totals[key] += value
+            self.stdout.write(f"Drivers {first + 1}-{indexes[-1] + 1} of {drivers}: "
+                              f"{counts['trips']} trips, {counts['log_sheets']} log sheets")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {totals['drivers']} drivers, {totals['trips']} trips, {totals['stops']} stops, "
+            f"{totals['segments']} route segments, {totals['log_sheets']} log sheets and "
+            f"{totals['status_changes']} status changes (seed {options['seed']}, "
+            f"history {end_date - datetime.timedelta(days=options['days'])} to {end_date}) in {elapsed:.2f}s"
+        ))
+
+    def _insert(self, fleet, generator, end_date):
+        users = User.objects.bulk_create([user for user, *_ in fleet])
+
+        trips = []
+        for user, (_, _, _, legs, _) in zip(users, fleet):
+            for number, leg in enumerate(legs):
+                if leg.finished is not None:
+                    status = 'completed'
+                elif leg.started is not None:
+                    status = 'in_progress'
+                else:
+                    status = 'planned'
+                total_hours = None
+                if leg.finished is not None:
+                    total_hours = round((leg.finished - leg.started).total_seconds() / 3600, 2)
+                leg.trip = Trip(
+                    user=user,
+                    name=f"{user.username} #{number + 1}: {leg.origin[0]} to {leg.destination[0]}",
+                    status=status,
+                    current_location=leg.current[0],
+                    current_location_lat=leg.current[1],
+                    current_location_lng=leg.current[2],
+                    pickup_location=leg.origin[0],
+                    pickup_location_lat=leg.origin[1],
+                    pickup_location_lng=leg.origin[2],
+                    dropoff_location=leg.destination[0],
+                    dropoff_location_lat=leg.destination[1],
+                    dropoff_location_lng=leg.destination[2],
+                    current_cycle_hours=leg.cycle_hours,
+                    total_distance=leg.miles,
+                    estimated_driving_time=round(leg.miles / 55, 2),
+                    total_trip_time=total_hours,
+                )
+                trips.append(leg.trip)
+        Trip.objects.bulk_create(trips)
+
+        stops = []
+        for *_, legs, _ in fleet:
+            for leg in legs:
+                leg.stop_objects = []
+                for sequence, (stop_type, miles, arrival, departure) in enumerate(leg.stops):
+                    lat, lng = leg.position(miles)
+                    duration = 10.0 if departure is None else (departure - arrival).total_seconds() / 3600
+                    leg.stop_objects.append(Stop(
+                        trip=leg.trip,
+                        stop_type=stop_type,
+                        location=leg.place(miles),
+                        latitude=round(lat, 5),
+                        longitude=round(lng, 5),
+                        arrival_time=arrival,
+                        departure_time=departure,
+                        duration=round(duration, 2),
+                        distance_from_start=miles,
+                        sequence=sequence,
+                    ))
+                stops.extend(leg.stop_objects)
+        Stop.objects.bulk_create(stops)
+
+        segments = []
+        for user, (_, _, _, legs, _) in zip(users, fleet):
+            rng = random.Random(f"{generator.seed}:{user.username}:routes")
+            for leg in legs:
+                for sequence, (start, end) in enumerate(zip(leg.stop_objects, leg.stop_objects[1:])):
+                    miles = round(end.distance_from_start - start.distance_from_start, 1)
+                    segments.append(RouteSegment(
+                        trip=leg.trip,
+                        start_stop=start,
+                        end_stop=end,
+                        distance=miles,
+                        estimated_time=round(miles / 55, 2),
+                        polyline=generator.polyline(
+                            rng, (start.latitude, start.longitude), (end.latitude, end.longitude), miles
+                        ),
+                        sequence=sequence,
+                    ))
+        RouteSegment.objects.bulk_create(segments, batch_size=500)
+
+        certify_before = end_date - datetime.timedelta(days=CERTIFY_AFTER_DAYS)
+        sheets, changes_by_sheet = [], []
+        for user, (_, vehicle, trailer, _, days) in zip(users, fleet):
+            for leg, date, periods in days:
+                midnight = datetime.datetime.combine(date, datetime.time(0, 0), tzinfo=datetime.timezone.utc)
+                changes = []
+                for status, begin, end, miles, remarks in periods:
+                    lat, lng = leg.position(miles)
+                    changes.append(DutyStatusChange(
+                        status=status,
+                        start_time=midnight + datetime.timedelta(hours=begin),
+                        end_time=midnight + datetime.timedelta(hours=end),
+                        duration=end - begin,
+                        location=leg.place(miles),
+                        latitude=round(lat, 5),
+                        longitude=round(lng, 5),
+                        remarks=remarks,
+                    ))
+                grid = DutyGrid.from_status_changes(date, changes)
+                hours = grid.hours_by_status()
+                certified = date < certify_before
+                sheets.append(LogSheet(
+                    trip=leg.trip,
+                    user=user,
+                    date=date,
+                    status='certified' if certified else 'generated',
+                    vehicle_number=vehicle,
+                    trailer_number=trailer,
+                    driving_hours=hours['driving'],
+                    on_duty_hours=hours['on_duty'],
+                    off_duty_hours=hours['off_duty'],
+                    sleeper_berth_hours=hours['sleeper_berth'],
+                    visual_log_data=grid.to_visual_log_data(),
+                    certified_by=user if certified else None,
+                    certified_at=midnight + datetime.timedelta(days=1, hours=9) if certified else None,
+                ))
+                changes_by_sheet.append(changes)
+        LogSheet.objects.bulk_create(sheets, batch_size=1000)
+
+        changes = []
+        for sheet, sheet_changes in zip(sheets, changes_by_sheet):
+            for change in sheet_changes:
+                change.log_sheet = sheet
+            changes.extend(sheet_changes)
+        DutyStatusChange.objects.bulk_create(changes, batch_size=5000)
+
+        return {'drivers': len(users), 'trips': len(trips), 'stops': len(stops), 'segments': len(segments),
+                'log_sheets': len(sheets), 'status_changes': len(changes)}
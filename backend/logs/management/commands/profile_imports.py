@@ -0,0 +1,103 @@
+"""
+Measure the cold-start import cost of the serverless entry point against a budget
+"""
+import collections
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: what a new container does before serving its first request
+COLD_START_SCRIPT = """
+import importlib, json, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+resolved = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'urlconf_ms': (resolved - imported) * 1000,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return {top-level package: self import time in ms} from `python -X importtime` output."""
+    packages = collections.Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Header line
+        packages[fields[2].strip().split('.')[0]] += int(fields[0]) / 1000
+    return packages
+
+
+class Command(BaseCommand):
+    help = "Profile cold-start imports of the Vercel entry point (api.py) and fail when over budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', default='api',
+                            help='Module imported on cold start (default: api)')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Fresh interpreters to time; the median is reported')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Packages listed by import time')
+        parser.add_argument('--budget-ms', type=float,
+                            default=getattr(settings, 'COLD_START_BUDGET_MS', 1000),
+                            help='Fail when the median cold start exceeds this (0 disables the check)')
+        parser.add_argument('--forbid', nargs='*',
+                            default=getattr(settings, 'COLD_START_FORBIDDEN_MODULES', []),
+                            help='Fail when any of these modules is imported on cold start')
+
+    def _run(self, entry):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', COLD_START_SCRIPT, entry],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Importing {entry} failed:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        runs = [self._run(options['entry']) for _ in range(max(1, options['runs']))]
+        totals = [timing['import_ms'] + timing['urlconf_ms'] for timing, _ in runs]
+        median = statistics.median(totals)
+        imports = statistics.median(timing['import_ms'] for timing, _ in runs)
+        urlconf = statistics.median(timing['urlconf_ms'] for timing, _ in runs)
+        self.stdout.write(
+            f"Cold start of {options['entry']} (median of {len(runs)}): {median:.0f} ms "
+            f"(import {imports:.0f} ms + URLconf {urlconf:.0f} ms; "
+            f"min {min(totals):.0f}, max {max(totals):.0f})"
+        )
+
+        packages = collections.Counter()
+        for _, run_packages in runs:
+            packages.update(run_packages)
+        self.stdout.write(f"Top {options['top']} packages by import time (mean of runs):")
+        for package, ms in packages.most_common(options['top']):
+            self.stdout.write(f"  {package:<28} {ms / len(runs):8.1f} ms")
+
+        modules = runs[0][0]['modules']
+        loaded = sorted(
+            name for name in options['forbid']
+            if any(module == name or module.startswith(f"{name}.") for module in modules)
+        )
+        problems = []
+        if loaded:
+            problems.append(f"modules that should load lazily were imported: {', '.join(loaded)}")
+        if options['budget_ms'] and median > options['budget_ms']:
+            problems.append(f"cold start {median:.0f} ms is over the {options['budget_ms']:.0f} ms budget")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS(
+            f"Within budget ({options['budget_ms']:.0f} ms); none of {', '.join(options['forbid']) or '-'} imported"
+        ))
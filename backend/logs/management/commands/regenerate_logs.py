@@ -0,0 +1,68 @@
+"""
+Recompile duty timelines and rewrite log sheets for many trips at once
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from logs.models import LogSheet
+from logs.timeline import TimelineCompiler, save_log_sheets
+from trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = "Recompile HOS duty timelines and bulk-save log sheets for a fleet of trips"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trip', type=int, nargs='*', dest='trip_ids',
+                            help='Only regenerate these trip ids (default: all trips)')
+        parser.add_argument('--start-date', dest='start_date',
+                            help="YYYY-MM-DD start date (default: the trip's first log sheet date, "
+                                 "or the day the trip was created)")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Trips compiled and saved per transaction')
+        parser.add_argument('--replace', action='store_true',
+                            help='Rewrite status changes of sheets that already exist')
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.order_by('id').prefetch_related('stops')
+        if options['trip_ids']:
+            trips = trips.filter(id__in=options['trip_ids'])
+
+        start_date = None
+        if options['start_date']:
+            start_date = datetime.date.fromisoformat(options['start_date'])
+
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        trip_count = sheet_count = 0
+        batch = []
+        for trip in trips.iterator(chunk_size=batch_size):
+            batch.append(trip)
+            if len(batch) >= batch_size:
+                sheet_count += self._save_batch(batch, start_date, options['replace'])
+                trip_count += len(batch)
+                batch = []
+        if batch:
+            sheet_count += self._save_batch(batch, start_date, options['replace'])
+            trip_count += len(batch)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Regenerated {sheet_count} log sheets for {trip_count} trips in {elapsed:.2f}s"
+        ))
+
+    def _save_batch(self, trips, start_date, replace):
+        first_dates = {}
+        if start_date is None:
+            first_dates = dict(
+                LogSheet.objects.filter(trip_id__in=[trip.id for trip in trips])
+                .values('trip_id').annotate(first=Min('date')).values_list('trip_id', 'first')
+            )
+        timelines = []
+        for trip in trips:
+            day = start_date or first_dates.get(trip.id) or trip.created_at.date()
+            timelines.append((trip, TimelineCompiler(trip).compile_days(day)))
+        return len(save_log_sheets(timelines, replace=replace))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-19 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0002_logsheet_visual_log_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logsheet',
+            name='visual_log_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
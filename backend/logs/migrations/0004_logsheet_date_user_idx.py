@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-19 05:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0003_logsheet_visual_log_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logsheet',
+            index=models.Index(fields=['date', 'user'], name='logsheet_date_user_idx'),
+        ),
+    ]
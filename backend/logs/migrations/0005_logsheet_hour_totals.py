@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-19 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0004_logsheet_date_user_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logsheet',
+            name='driving_hours',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='logsheet',
+            name='off_duty_hours',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='logsheet',
+            name='on_duty_hours',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='logsheet',
+            name='sleeper_berth_hours',
+            field=models.FloatField(default=0.0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-19 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0005_logsheet_hour_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dutystatuschange',
+            name='event_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0006_dutystatuschange_event_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logsheet',
+            name='archive_path',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='logsheet',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
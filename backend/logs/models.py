@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
 from trips.models import Trip
 
 
@@ -24,14 +27,27 @@ class LogSheet(models.Model):
     vehicle_number = models.CharField(max_length=50, blank=True)
     trailer_number = models.CharField(max_length=50, blank=True)
     
+    # Hours per duty status, kept in sync with status_changes on write
+    driving_hours = models.FloatField(default=0.0)
+    on_duty_hours = models.FloatField(default=0.0)
+    off_duty_hours = models.FloatField(default=0.0)
+    sleeper_berth_hours = models.FloatField(default=0.0)
+    
     # Visual log data (JSON field to store the drawn log data)
     visual_log_data = models.JSONField(default=dict, blank=True)
+    # Bumped on every visual log data write (optimistic concurrency for patches)
+    visual_log_version = models.PositiveIntegerField(default=0)
     
     # Certification
     certified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, 
                                     related_name='certified_logs')
     certified_at = models.DateTimeField(null=True, blank=True)
     
+    # Cold archive tombstone: status changes and visual log data live in the
+    # archive file (relative to settings.LOG_ARCHIVE_DIR) until rehydrated
+    archived_at = models.DateTimeField(null=True, blank=True)
+    archive_path = models.CharField(max_length=255, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -39,9 +55,45 @@ class LogSheet(models.Model):
     def __str__(self):
         return f"Log for {self.user.username} on {self.date}"
     
+    @property
+    def total_hours(self):
+        return self.driving_hours + self.on_duty_hours + self.off_duty_hours + self.sleeper_berth_hours
+    
+    @staticmethod
+    def refresh_hour_totals(log_sheet_ids, touch=True):
+        """
+        Recompute the stored per-status hour totals of the given sheets
+        
+        Runs as a single UPDATE with one correlated subquery per status.
+        
+        Args:
+            log_sheet_ids: Iterable of LogSheet ids
+            touch: Also bump updated_at (the sheet's content changed)
+        
+        Returns:
+            Number of sheets updated
+        """
+        log_sheet_ids = list(log_sheet_ids)
+        if not log_sheet_ids:
+            return 0
+        totals = {}
+        for status, _ in DutyStatusChange.STATUS_CHOICES:
+            hours = (
+                DutyStatusChange.objects.filter(log_sheet=OuterRef('pk'), status=status)
+                .values('log_sheet').annotate(total=Sum('duration')).values('total')
+            )
+            totals[f'{status}_hours'] = Coalesce(Subquery(hours), 0.0, output_field=models.FloatField())
+        if touch:
+            totals['updated_at'] = timezone.now()
+        return LogSheet.objects.filter(id__in=log_sheet_ids).update(**totals)
+    
     class Meta:
         unique_together = ['trip', 'user', 'date']
         ordering = ['-date']
+        indexes = [
+            # Date-range reports across the fleet
+            models.Index(fields=['date', 'user'], name='logsheet_date_user_idx'),
+        ]
 
 
 class DutyStatusChange(models.Model):
@@ -71,6 +123,9 @@ class DutyStatusChange(models.Model):
     # Remarks
     remarks = models.TextField(blank=True)
     
+    # Client-supplied id of an ingested ELD event (makes ingest idempotent)
+    event_id = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    
     def __str__(self):
         return f"{self.get_status_display()} at {self.start_time}"
     
@@ -0,0 +1,216 @@
+"""
+Fast canvas-based rendering of FMCSA-style daily log pages
+"""
+from reportlab.lib.pagesizes import letter
+
+from .utils import DutyGrid
+
+
+class ELDCanvasRenderer:
+    """
+    Draws daily log pages straight onto a reportlab canvas
+
+    Everything that is identical on every page (title, field labels, the
+    24-hour graph grid with its quarter-hour ticks, the remarks box and the
+    certification block) is drawn once into a form XObject. Each page then
+    places that form and draws only the day's duty line, totals and text,
+    so adding a page costs a handful of path operations.
+    """
+    PAGE_WIDTH, PAGE_HEIGHT = letter
+    MARGIN = 36
+
+    # Graph geometry (points)
+    LABEL_WIDTH = 92
+    HOUR_WIDTH = 18
+    ROW_HEIGHT = 22
+    GRID_TOP = 640
+    TOTALS_WIDTH = 36
+    TOTALS_GAP = 10
+
+    REMARKS_TOP = 520
+    REMARKS_BOTTOM = 170
+    REMARK_LEADING = 12
+
+    ROW_LABELS = ('1. Off Duty', '2. Sleeper Berth', '3. Driving', '4. On Duty (not driving)')
+    FORM_NAME = 'eld_daily_log'
+
+    def __init__(self, buffer):
+        # Imported here so importing exports/views does not load the PDF machinery
+        from reportlab.pdfgen import canvas
+
+        self.canvas = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+        self.grid_left = self.MARGIN + self.LABEL_WIDTH
+        self.grid_right = self.grid_left + 24 * self.HOUR_WIDTH
+        self.grid_bottom = self.GRID_TOP - 4 * self.ROW_HEIGHT
+        self.totals_left = self.grid_right + self.TOTALS_GAP
+        self._form_ready = False
+        self.page_count = 0
+
+    # Static template
+
+    def _draw_template(self):
+        c = self.canvas
+        c.beginForm(self.FORM_NAME)
+        left, right = self.MARGIN, self.PAGE_WIDTH - self.MARGIN
+
+        c.setFont('Helvetica-Bold', 16)
+        c.drawString(left, 748, "Driver's Daily Log")
+        c.setFont('Helvetica', 8)
+        c.drawString(left, 736, '(24 hours)  Original - file at home terminal')
+
+        # Header field labels
+        c.setFont('Helvetica-Bold', 9)
+        for x, y, label in self._header_fields():
+            c.drawString(x, y, label)
+            c.line(x + 52, y - 2, x + 250, y - 2)
+
+        # Hour labels across the top of the graph
+        c.setFont('Helvetica', 6.5)
+        for hour in range(25):
+            if hour in (0, 24):
+                text = 'Mid-night'
+            elif hour == 12:
+                text = 'Noon'
+            else:
+                text = str(hour % 12)
+            c.drawCentredString(self.grid_left + hour * self.HOUR_WIDTH, self.GRID_TOP + 4, text)
+        totals_center = self.totals_left + self.TOTALS_WIDTH / 2
+        c.drawCentredString(totals_center, self.GRID_TOP + 11, 'Total')
+        c.drawCentredString(totals_center, self.GRID_TOP + 4, 'Hours')
+
+        # Row labels and outer boxes
+        c.setLineWidth(0.8)
+        c.setFont('Helvetica', 7.5)
+        for row, label in enumerate(self.ROW_LABELS):
+            top = self.GRID_TOP - row * self.ROW_HEIGHT
+            c.drawString(left, top - self.ROW_HEIGHT / 2 - 3, label)
+            c.rect(self.grid_left, top - self.ROW_HEIGHT, 24 * self.HOUR_WIDTH, self.ROW_HEIGHT)
+            c.rect(self.totals_left, top - self.ROW_HEIGHT, self.TOTALS_WIDTH, self.ROW_HEIGHT)
+
+        # Hour lines and quarter-hour ticks
+        c.setLineWidth(0.4)
+        for hour in range(1, 24):
+            x = self.grid_left + hour * self.HOUR_WIDTH
+            c.line(x, self.grid_bottom, x, self.GRID_TOP)
+        c.setLineWidth(0.3)
+        for row in range(4):
+            top = self.GRID_TOP - row * self.ROW_HEIGHT
+            for hour in range(24):
+                base = self.grid_left + hour * self.HOUR_WIDTH
+                for quarter, length in ((1, 4), (2, 7), (3, 4)):
+                    x = base + quarter * self.HOUR_WIDTH / 4
+                    c.line(x, top, x, top - length)
+
+        # Remarks box
+        c.setLineWidth(0.8)
+        c.setFont('Helvetica-Bold', 9)
+        c.drawString(left, self.REMARKS_TOP + 6, 'Remarks')
+        c.rect(left, self.REMARKS_BOTTOM, right - left, self.REMARKS_TOP - self.REMARKS_BOTTOM)
+
+        # Certification block
+        c.setFont('Helvetica', 8)
+        c.drawString(left, 130, 'I hereby certify that my data entries and my record of duty status '
+                                'for this 24-hour period are true and correct.')
+        c.line(left, 96, left + 250, 96)
+        c.line(left + 300, 96, right, 96)
+        c.drawString(left, 86, "Driver's Signature")
+        c.drawString(left + 300, 86, 'Date')
+
+        c.endForm()
+        self._form_ready = True
+
+    def _header_fields(self):
+        left = self.MARGIN
+        return (
+            (left, 712, 'Date:'),
+            (left + 300, 712, 'Driver:'),
+            (left, 694, 'Vehicle #:'),
+            (left + 300, 694, 'Driver ID:'),
+            (left, 676, 'Trailer #:'),
+            (left + 300, 676, 'Trip #:'),
+        )
+
+    # Per-page content
+
+    def draw_page(self, log_sheet, status_changes, driver_info):
+        """
+        Draw one log sheet as a page
+
+        Args:
+            log_sheet: LogSheet object
+            status_changes: Iterable of the sheet's DutyStatusChange objects
+            driver_info: Dictionary with driver 'name' and 'id'
+        """
+        if not self._form_ready:
+            self._draw_template()
+        status_changes = list(status_changes)
+        duty_grid = DutyGrid.from_status_changes(log_sheet.date, status_changes)
+
+        c = self.canvas
+        c.doForm(self.FORM_NAME)
+
+        # Header values
+        values = (
+            log_sheet.date.strftime('%m/%d/%Y'),
+            driver_info.get('name', 'N/A'),
+            log_sheet.vehicle_number or 'N/A',
+            driver_info.get('id', 'N/A'),
+            log_sheet.trailer_number or 'N/A',
+            str(log_sheet.trip_id or ''),
+        )
+        c.setFont('Helvetica', 9)
+        for (x, y, _), value in zip(self._header_fields(), values):
+            c.drawString(x + 56, y, value)
+
+        # Duty status line
+        runs = duty_grid.runs()
+        c.setLineWidth(2)
+        path = c.beginPath()
+        for index, (status, start, end) in enumerate(runs):
+            y = self._row_center(DutyGrid.STATUS_CODES[status])
+            x0, x1 = self._minute_x(start), self._minute_x(end)
+            if index == 0:
+                path.moveTo(x0, y)
+            else:
+                path.lineTo(x0, y)
+            path.lineTo(x1, y)
+        if runs:
+            c.drawPath(path, stroke=1, fill=0)
+
+        # Totals column
+        minutes = duty_grid.minutes_by_status()
+        c.setFont('Helvetica', 8)
+        for code, status in enumerate(DutyGrid.STATUSES):
+            c.drawCentredString(self.totals_left + self.TOTALS_WIDTH / 2,
+                                self._row_center(code) - 3, _format_minutes(minutes[status]))
+        c.setFont('Helvetica-Bold', 8)
+        c.drawCentredString(self.totals_left + self.TOTALS_WIDTH / 2, self.grid_bottom - 12,
+                            _format_minutes(sum(minutes.values())))
+
+        # Remarks: one line per change, as many as fit in the box
+        c.setFont('Helvetica', 8)
+        y = self.REMARKS_TOP - self.REMARK_LEADING
+        for change in status_changes:
+            if y < self.REMARKS_BOTTOM + 4:
+                break
+            text = f"{change.start_time.strftime('%H:%M')}  {change.get_status_display()}  {change.location}"
+            if change.remarks:
+                text += f" - {change.remarks}"
+            c.drawString(self.MARGIN + 6, y, text[:120])
+            y -= self.REMARK_LEADING
+
+        c.showPage()
+        self.page_count += 1
+
+    def save(self):
+        self.canvas.save()
+
+    def _minute_x(self, minute):
+        return self.grid_left + minute * self.HOUR_WIDTH / 60.0
+
+    def _row_center(self, row):
+        return self.GRID_TOP - row * self.ROW_HEIGHT - self.ROW_HEIGHT / 2
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
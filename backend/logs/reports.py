@@ -0,0 +1,172 @@
+"""
+Fleet hours and compliance reports aggregated in the database
+"""
+import csv
+import datetime
+
+from django.db.models import F, FloatField, Func, IntegerField, Sum, ValueRange, Window
+
+from trips.utils import HOSCalculator
+from .models import LogSheet
+
+REPORT_GROUPS = ('driver', 'day', 'week')
+
+REPORT_COLUMNS = [
+    'user_id', 'username', 'period', 'days',
+    'driving_hours', 'on_duty_hours', 'off_duty_hours', 'sleeper_berth_hours',
+    'total_hours', 'violation_hours',
+]
+
+# Window of the 70-hour rule, in days (the report date plus the 7 before it)
+CYCLE_DAYS = 8
+
+
+class DayNumber(Func):
+    """Days since 1970-01-01 for a date column, so windows can use a RANGE frame in days."""
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template="(%(expressions)s - DATE '1970-01-01')",
+                              **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              template="CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)",
+                              **extra_context)
+
+
+class WindowSum(Func):
+    """
+    SUM() usable inside Window() over an aggregate annotation
+
+    Django refuses Sum() of an aggregate, but SUM(SUM(...)) OVER (...) is
+    valid SQL: the window runs over the grouped rows.
+    """
+    function = 'SUM'
+    window_compatible = True
+    output_field = FloatField()
+
+
+def daily_hours(start_date, end_date, user_ids=None):
+    """
+    Return a values queryset with one row per driver and log date
+
+    Each row has the hours per duty status for that day (summed from the
+    sheets' stored totals, so status changes are not read) and
+    'cycle_hours', the on-duty hours over the 8 days ending that day
+    (computed by a window function). Rows start 7 days before
+    `start_date` so the first days' cycle totals are complete; callers
+    skip those warm-up rows.
+    """
+    log_sheets = LogSheet.objects.filter(
+        date__gte=start_date - datetime.timedelta(days=CYCLE_DAYS - 1),
+        date__lte=end_date,
+    )
+    if user_ids:
+        log_sheets = log_sheets.filter(user_id__in=user_ids)
+
+    return (
+        log_sheets
+        .values('user_id', 'date', username=F('user__username'))
+        # A driver can have several sheets (trips) on one day
+        .annotate(
+            day_driving_hours=Sum('driving_hours'),
+            day_on_duty_hours=Sum('on_duty_hours'),
+            day_off_duty_hours=Sum('off_duty_hours'),
+            day_sleeper_berth_hours=Sum('sleeper_berth_hours'),
+        )
+        # Annotated separately so the window is not added to the GROUP BY
+        .annotate(
+            cycle_hours=Window(
+                WindowSum(F('day_driving_hours') + F('day_on_duty_hours')),
+                partition_by=[F('user_id')],
+                order_by=DayNumber('date').asc(),
+                frame=ValueRange(start=-(CYCLE_DAYS - 1), end=0),
+            ),
+        )
+        .order_by('user_id', 'date')
+    )
+
+
+def _violation_hours(row):
+    """
+    Hours over the limits on one log day: driving past 11 hours, plus
+    on-duty time worked after reaching 70 hours in 8 days
+    """
+    on_duty = row['day_driving_hours'] + row['day_on_duty_hours']
+    driving_excess = max(0.0, row['day_driving_hours'] - HOSCalculator.DAILY_DRIVING_LIMIT)
+    cycle_excess = min(on_duty, max(0.0, row['cycle_hours'] - HOSCalculator.WEEKLY_LIMIT))
+    return driving_excess + cycle_excess
+
+
+def _period(group_by, date):
+    if group_by == 'day':
+        return date.isoformat()
+    if group_by == 'week':
+        return (date - datetime.timedelta(days=date.weekday())).isoformat()
+    return ''
+
+
+def hours_report(start_date, end_date, group_by='driver', user_ids=None, chunk_size=2000):
+    """
+    Yield report rows (dicts with REPORT_COLUMNS) for a date range
+
+    The database reduces the sheets' stored totals to one row per driver and
+    day (with the rolling 8-day total); those rows arrive ordered by driver and date,
+    so rolling them up by driver or ISO week (starting Monday) is a single
+    streaming pass that holds one group at a time.
+
+    Args:
+        start_date: First log date in the report
+        end_date: Last log date in the report
+        group_by: 'driver', 'day' or 'week'
+        user_ids: Only report these drivers (default: all)
+        chunk_size: Rows fetched per database round trip
+    """
+    if group_by not in REPORT_GROUPS:
+        raise ValueError(f"group_by must be one of {', '.join(REPORT_GROUPS)}")
+
+    current = None
+    for row in daily_hours(start_date, end_date, user_ids).iterator(chunk_size=chunk_size):
+        if row['date'] < start_date:
+            continue  # warm-up day for the 8-day window
+        key = (row['user_id'], _period(group_by, row['date']))
+        if current is None or current['key'] != key:
+            if current is not None:
+                yield _finish(current)
+            current = {
+                'key': key, 'user_id': row['user_id'], 'username': row['username'], 'period': key[1],
+                'days': 0, 'driving_hours': 0.0, 'on_duty_hours': 0.0, 'off_duty_hours': 0.0,
+                'sleeper_berth_hours': 0.0, 'violation_hours': 0.0,
+            }
+        current['days'] += 1
+        for column in ('driving_hours', 'on_duty_hours', 'off_duty_hours', 'sleeper_berth_hours'):
+            current[column] += row[f'day_{column}']
+        current['violation_hours'] += _violation_hours(row)
+    if current is not None:
+        yield _finish(current)
+
+
+def _finish(group):
+    row = {column: group.get(column) for column in REPORT_COLUMNS}
+    row['total_hours'] = (group['driving_hours'] + group['on_duty_hours']
+                          + group['off_duty_hours'] + group['sleeper_berth_hours'])
+    for column in REPORT_COLUMNS:
+        if column.endswith('_hours'):
+            row[column] = round(row[column], 2)
+    return row
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, columns=REPORT_COLUMNS):
+    """Yield CSV lines (header first) for an iterable of dict rows."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row[column] for column in columns])
@@ -13,16 +13,22 @@ class DutyStatusChangeSerializer(serializers.ModelSerializer):
 
 class LogSheetSerializer(serializers.ModelSerializer):
     status_changes = DutyStatusChangeSerializer(many=True, read_only=True)
+    total_hours = serializers.FloatField(read_only=True)
     
     class Meta:
         model = LogSheet
         fields = [
             'id', 'trip', 'user', 'date', 'status',
-            'vehicle_number', 'trailer_number', 'visual_log_data',
-            'certified_by', 'certified_at',
+            'vehicle_number', 'trailer_number', 'visual_log_data', 'visual_log_version',
+            'driving_hours', 'on_duty_hours', 'off_duty_hours', 'sleeper_berth_hours', 'total_hours',
+            'certified_by', 'certified_at', 'archived_at',
             'created_at', 'updated_at', 'status_changes'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'visual_log_version',
+            'driving_hours', 'on_duty_hours', 'off_duty_hours', 'sleeper_berth_hours',
+            'archived_at', 'created_at', 'updated_at'
+        ]
 
 
 class LogSheetGenerationSerializer(serializers.Serializer):
@@ -40,4 +46,80 @@ class LogSheetCertificationSerializer(serializers.Serializer):
     Serializer for log sheet certification
     """
     log_sheet_id = serializers.IntegerField()
-    certification_remarks = serializers.CharField(required=False)
\ No newline at end of file
+    certification_remarks = serializers.CharField(required=False)
+
+
+class VisualLogPatchSerializer(serializers.Serializer):
+    """
+    Serializer for a JSON Patch against a log sheet's visual log data
+    """
+    version = serializers.IntegerField(min_value=0)
+    patch = serializers.ListField(child=serializers.DictField(), allow_empty=True)
+
+
+class ComplianceQuerySerializer(serializers.Serializer):
+    """
+    Serializer for HOS compliance check parameters
+    """
+    user_id = serializers.IntegerField()
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+
+class ELDOutputSerializer(serializers.Serializer):
+    """
+    Serializer for FMCSA ELD output file parameters
+    """
+    user_id = serializers.IntegerField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    comment = serializers.CharField(max_length=60, required=False, default='', allow_blank=True)
+    
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("'end_date' must not be before 'start_date'.")
+        return data
+
+
+class HoursReportSerializer(serializers.Serializer):
+    """
+    Serializer for fleet hours report parameters
+    """
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    group_by = serializers.ChoiceField(choices=['driver', 'day', 'week'], default='driver')
+    user_ids = serializers.CharField(required=False, help_text="Comma-separated user ids")
+    output = serializers.ChoiceField(choices=['json', 'csv'], default='json')
+    
+    def validate_user_ids(self, value):
+        try:
+            return [int(user_id) for user_id in value.split(',') if user_id.strip()]
+        except ValueError:
+            raise serializers.ValidationError('Must be a comma-separated list of integers.')
+    
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("'end_date' must not be before 'start_date'.")
+        return data
+
+
+class LogSheetExportSerializer(serializers.Serializer):
+    """
+    Serializer for multi-sheet export parameters
+    """
+    trip_id = serializers.IntegerField(required=False)
+    user_id = serializers.IntegerField(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    output = serializers.ChoiceField(choices=['pdf', 'zip'], default='pdf')
+    
+    def validate(self, data):
+        if not data.get('trip_id') and not (
+            data.get('user_id') and data.get('start_date') and data.get('end_date')
+        ):
+            raise serializers.ValidationError(
+                "Provide 'trip_id', or 'user_id' with 'start_date' and 'end_date'."
+            )
+        if data.get('start_date') and data.get('end_date') and data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("'end_date' must not be before 'start_date'.")
+        return data
@@ -0,0 +1,103 @@
+"""
+Keep LogSheet hour totals in sync with DutyStatusChange writes, and announce
+sheet changes to push subscribers
+"""
+import contextlib
+import contextvars
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from truck_driver_project.events import broker, publish_on_commit
+from .models import LogSheet, DutyStatusChange
+
+# Sheet fields sent with 'logsheet.updated' events; clients fetch the sheet for the rest
+SHEET_EVENT_FIELDS = (
+    'id', 'trip_id', 'user_id', 'date', 'status', 'visual_log_version',
+    'driving_hours', 'on_duty_hours', 'off_duty_hours', 'sleeper_berth_hours', 'updated_at',
+)
+
+# Sheet ids whose totals are refreshed when the enclosing defer_hour_totals() exits
+_deferred = contextvars.ContextVar('deferred_hour_totals', default=None)
+
+
+@contextlib.contextmanager
+def defer_hour_totals(refresh=True):
+    """
+    Collect sheets touched inside the block and refresh their totals once at the end
+
+    Use around bulk writes (many status changes saved or deleted one by one)
+    so each affected sheet is recomputed once instead of once per row.
+    Bulk operations that bypass signals (bulk_create, QuerySet.update)
+    must still call LogSheet.refresh_hour_totals() for their sheets.
+    With refresh=False the touched sheets keep their stored totals (the
+    caller manages them, e.g. archival removing the changes on purpose).
+    """
+    if _deferred.get() is not None:
+        # Nested: the outermost block does the refresh
+        yield
+        return
+    pending = set()
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    if refresh:
+        LogSheet.refresh_hour_totals(pending)
+        log_sheets_changed(pending)
+
+
+def log_sheets_changed(log_sheet_ids):
+    """
+    Publish a 'logsheet.updated' event per sheet once the transaction commits
+
+    Saves and status change writes announce themselves; call this after
+    writes that skip signals (bulk_create, QuerySet.update). The sheets are
+    read in one query at commit time, and only when a client is listening.
+    """
+    log_sheet_ids = list(log_sheet_ids)
+    if not log_sheet_ids or not broker.has_subscribers():
+        return
+
+    def publish():
+        for sheet in LogSheet.objects.filter(id__in=log_sheet_ids).values(*SHEET_EVENT_FIELDS):
+            sheet['log_sheet_id'] = sheet.pop('id')
+            broker.publish('logsheet.updated', sheet)
+
+    transaction.on_commit(publish)
+
+
+def _changed(log_sheet_id):
+    pending = _deferred.get()
+    if pending is not None:
+        pending.add(log_sheet_id)
+    else:
+        LogSheet.refresh_hour_totals([log_sheet_id])
+        log_sheets_changed([log_sheet_id])
+
+
+@receiver(post_save, sender=DutyStatusChange)
+def status_change_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _changed(instance.log_sheet_id)
+
+
+@receiver(post_delete, sender=DutyStatusChange)
+def status_change_deleted(sender, instance, **kwargs):
+    _changed(instance.log_sheet_id)
+
+
+@receiver(post_save, sender=LogSheet)
+def log_sheet_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        log_sheets_changed([instance.id])
+
+
+@receiver(post_delete, sender=LogSheet)
+def log_sheet_deleted(sender, instance, **kwargs):
+    publish_on_commit('logsheet.deleted', {
+        'log_sheet_id': instance.id, 'trip_id': instance.trip_id,
+        'user_id': instance.user_id, 'date': instance.date,
+    })
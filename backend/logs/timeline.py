@@ -0,0 +1,323 @@
+"""
+Duty status timeline compilation and bulk persistence for ELD log sheets
+"""
+import collections
+import datetime
+
+from django.db import transaction
+from django.db.models import Q
+
+from trips.utils import HOSCalculator
+from .models import LogSheet, DutyStatusChange
+from .archive import rehydrate_log_sheets
+from .signals import defer_hour_totals, log_sheets_changed
+
+
+DutyInterval = collections.namedtuple(
+    'DutyInterval',
+    ['status', 'start', 'end', 'location', 'latitude', 'longitude', 'remarks'],
+)
+
+# Stop types that end a leg (the driver does on-duty work there)
+SERVICE_STOP_TYPES = ('pickup', 'dropoff', 'stop')
+
+_EPSILON = 1e-6
+
+
+def _hours(delta):
+    return delta.total_seconds() / 3600.0
+
+
+class TimelineCompiler:
+    """
+    Compile a trip's HOS plan and stops into duty status intervals
+
+    The compiler walks the trip's legs once, inserting 30-minute breaks,
+    fuel stops, 10-hour rests and 34-hour restarts exactly where the
+    HOSCalculator limits require them, and returns the resulting sequence
+    of DutyInterval tuples.
+    """
+    # Time of day the driver comes on duty on the first day
+    SHIFT_START = datetime.time(8, 0)
+
+    def __init__(self, trip, stops=None):
+        self.trip = trip
+        self.stops = list(stops) if stops is not None else list(trip.stops.all())
+
+    def legs(self):
+        """
+        Split the trip into driving legs ending at a service stop
+
+        Returns a list of dicts with 'hours', 'miles' and 'stop' (the Stop, or
+        None for the dropoff when the trip has no stops saved).
+        """
+        trip = self.trip
+        total_miles = trip.total_distance or 0.0
+        total_hours = trip.estimated_driving_time
+        if total_hours is None:
+            total_hours = HOSCalculator.calculate_driving_time(total_miles)
+
+        service_stops = sorted(
+            (s for s in self.stops if s.stop_type in SERVICE_STOP_TYPES),
+            key=lambda s: s.sequence,
+        )
+        if not service_stops:
+            return [{'hours': total_hours, 'miles': total_miles, 'stop': None}]
+
+        legs = []
+        previous_miles = 0.0
+        for stop in service_stops:
+            miles = max(0.0, min(stop.distance_from_start, total_miles) - previous_miles)
+            legs.append({'hours': 0.0, 'miles': miles, 'stop': stop})
+            previous_miles += miles
+        # Anything left after the last service stop is driven on the way to it
+        legs[-1]['miles'] += max(0.0, total_miles - previous_miles)
+
+        # Apportion the routed driving time by distance
+        for leg in legs:
+            leg['hours'] = total_hours * leg['miles'] / total_miles if total_miles else 0.0
+        if not total_miles:
+            legs[-1]['hours'] = total_hours
+        return legs
+
+    def compile(self, start):
+        """
+        Return the list of DutyInterval for a trip starting at `start` (aware datetime)
+        """
+        trip = self.trip
+        intervals = []
+        hos_stops = sorted(self.stops, key=lambda s: s.sequence)
+        rests = collections.deque(s for s in hos_stops if s.stop_type == 'rest')
+        breaks = collections.deque(s for s in hos_stops if s.stop_type == 'break')
+        fuels = collections.deque(s for s in hos_stops if s.stop_type == 'fuel')
+
+        t = start
+        shift_start = None
+        driven_in_shift = 0.0
+        driven_since_break = 0.0
+        miles_since_fuel = 0.0
+        cycle_used = trip.current_cycle_hours or 0.0
+        location = (trip.current_location, trip.current_location_lat, trip.current_location_lng)
+
+        def emit(status, hours, place, remarks):
+            nonlocal t
+            end = t + datetime.timedelta(hours=hours)
+            intervals.append(DutyInterval(status, t, end, place[0], place[1], place[2], remarks))
+            t = end
+
+        def stop_place(queue, fallback):
+            if queue:
+                stop = queue.popleft()
+                return (stop.location, stop.latitude, stop.longitude)
+            return (fallback, None, None)
+
+        for leg in self.legs():
+            remaining = leg['hours']
+            speed = leg['miles'] / leg['hours'] if leg['hours'] else 0.0
+
+            while remaining > _EPSILON:
+                if shift_start is None:
+                    shift_start = t
+                limits = [
+                    remaining,
+                    HOSCalculator.DAILY_DRIVING_LIMIT - driven_in_shift,
+                    HOSCalculator.DAILY_DUTY_WINDOW - _hours(t - shift_start),
+                    HOSCalculator.BREAK_AFTER_DRIVING - driven_since_break,
+                    HOSCalculator.WEEKLY_LIMIT - cycle_used,
+                ]
+                if speed:
+                    limits.append((HOSCalculator.FUEL_STOP_INTERVAL - miles_since_fuel) / speed)
+                drive = min(limits)
+
+                if drive > _EPSILON:
+                    emit('driving', drive, location, 'Driving')
+                    location = ('En Route', None, None)
+                    remaining -= drive
+                    driven_in_shift += drive
+                    driven_since_break += drive
+                    miles_since_fuel += drive * speed
+                    cycle_used += drive
+                    continue
+
+                # A limit was reached: insert whatever the regulations require next
+                if HOSCalculator.WEEKLY_LIMIT - cycle_used <= _EPSILON:
+                    location = stop_place(rests, 'Rest Stop')
+                    emit('off_duty', HOSCalculator.RESTART_HOURS, location, '34-hour restart')
+                    cycle_used = 0.0
+                    shift_start, driven_in_shift, driven_since_break = None, 0.0, 0.0
+                elif (HOSCalculator.DAILY_DRIVING_LIMIT - driven_in_shift <= _EPSILON
+                      or HOSCalculator.DAILY_DUTY_WINDOW - _hours(t - shift_start) <= _EPSILON):
+                    location = stop_place(rests, 'Rest Stop')
+                    emit('off_duty', HOSCalculator.REQUIRED_REST_PERIOD, location, '10-hour rest')
+                    shift_start, driven_in_shift, driven_since_break = None, 0.0, 0.0
+                elif HOSCalculator.BREAK_AFTER_DRIVING - driven_since_break <= _EPSILON:
+                    location = stop_place(breaks, 'Rest Area')
+                    emit('off_duty', HOSCalculator.BREAK_DURATION, location, '30-minute break')
+                    driven_since_break = 0.0
+                else:
+                    location = stop_place(fuels, 'Fuel Stop')
+                    emit('on_duty', HOSCalculator.FUEL_STOP_DURATION, location, 'Fueling')
+                    cycle_used += HOSCalculator.FUEL_STOP_DURATION
+                    miles_since_fuel = 0.0
+
+            stop = leg['stop']
+            if stop is None:
+                place = (trip.dropoff_location, trip.dropoff_location_lat, trip.dropoff_location_lng)
+                duration, remarks = HOSCalculator.DROPOFF_DURATION, 'Dropoff operations'
+            else:
+                place = (stop.location, stop.latitude, stop.longitude)
+                duration = stop.duration
+                remarks = f"{stop.get_stop_type_display()} operations"
+            if shift_start is None:
+                shift_start = t
+            emit('on_duty', duration, place, remarks)
+            cycle_used += duration
+            if duration >= HOSCalculator.BREAK_DURATION:
+                driven_since_break = 0.0
+            location = place
+
+        return intervals
+
+    def compile_days(self, start_date):
+        """
+        Compile the trip starting on `start_date` and split it into per-day intervals
+        """
+        start = datetime.datetime.combine(start_date, self.SHIFT_START, tzinfo=datetime.timezone.utc)
+        return split_by_day(self.compile(start))
+
+
+def split_by_day(intervals):
+    """
+    Split intervals at midnight into a list of (date, [DutyInterval]) in date order
+
+    Each day is padded with off-duty time so that it covers a full 24 hours.
+    """
+    days = []
+    if not intervals:
+        return days
+
+    def midnight(date, tzinfo):
+        return datetime.datetime.combine(date, datetime.time(0, 0), tzinfo=tzinfo)
+
+    first = intervals[0]
+    day_date = first.start.date()
+    day = []
+    day_start = midnight(day_date, first.start.tzinfo)
+    if first.start > day_start:
+        day.append(DutyInterval('off_duty', day_start, first.start,
+                                first.location, first.latitude, first.longitude, 'Off duty'))
+
+    for interval in intervals:
+        start = interval.start
+        while True:
+            next_midnight = midnight(day_date + datetime.timedelta(days=1), start.tzinfo)
+            if interval.end <= next_midnight:
+                if interval.end > start:
+                    day.append(interval._replace(start=start))
+                break
+            if next_midnight > start:
+                day.append(interval._replace(start=start, end=next_midnight))
+            days.append((day_date, day))
+            day_date += datetime.timedelta(days=1)
+            day = []
+            start = next_midnight
+
+    last = intervals[-1]
+    day_end = midnight(day_date + datetime.timedelta(days=1), last.end.tzinfo)
+    if last.end < day_end:
+        day.append(DutyInterval('off_duty', last.end, day_end,
+                                last.location, last.latitude, last.longitude, 'Off duty'))
+    if day:
+        days.append((day_date, day))
+    return days
+
+
+def save_log_sheets(timelines, vehicle_number='', trailer_number='', replace=False):
+    """
+    Persist compiled timelines as LogSheet and DutyStatusChange rows
+
+    Args:
+        timelines: Iterable of (trip, [(date, [DutyInterval]), ...]) pairs
+        vehicle_number: Vehicle number for new sheets (and existing ones, if given)
+        trailer_number: Trailer number for new sheets (and existing ones, if given)
+        replace: Rewrite the status changes of sheets that already exist
+            instead of leaving them untouched
+
+    Returns:
+        List of the affected LogSheet ids, in trip and date order
+    """
+    timelines = [(trip, days) for trip, days in timelines if days]
+    if not timelines:
+        return []
+
+    # Only overwrite vehicle/trailer numbers on existing sheets when provided
+    update_fields = ['updated_at']
+    if vehicle_number:
+        update_fields.append('vehicle_number')
+    if trailer_number:
+        update_fields.append('trailer_number')
+
+    sheet_filter = Q()
+    for trip, days in timelines:
+        sheet_filter |= Q(trip_id=trip.id, user_id=trip.user_id, date__in=[date for date, _ in days])
+
+    with transaction.atomic():
+        # Regenerated sheets must not stay tombstones over their new status changes
+        rehydrate_log_sheets(LogSheet.objects.filter(sheet_filter))
+        existing = set(LogSheet.objects.filter(sheet_filter).values_list('trip_id', 'date'))
+
+        # Upsert every sheet in one statement on the unique (trip, user, date) key
+        LogSheet.objects.bulk_create(
+            [
+                LogSheet(
+                    trip_id=trip.id,
+                    user_id=trip.user_id,
+                    date=date,
+                    vehicle_number=vehicle_number,
+                    trailer_number=trailer_number,
+                )
+                for trip, days in timelines
+                for date, _ in days
+            ],
+            update_conflicts=True,
+            unique_fields=['trip', 'user', 'date'],
+            update_fields=update_fields,
+        )
+        sheet_ids = {
+            (trip_id, date): sheet_id
+            for sheet_id, trip_id, date in LogSheet.objects.filter(sheet_filter)
+            .values_list('id', 'trip_id', 'date')
+        }
+
+        if replace and existing:
+            with defer_hour_totals():
+                DutyStatusChange.objects.filter(
+                    log_sheet_id__in=[sheet_ids[key] for key in existing]
+                ).delete()
+
+        DutyStatusChange.objects.bulk_create(
+            [
+                DutyStatusChange(
+                    log_sheet_id=sheet_ids[(trip.id, date)],
+                    status=interval.status,
+                    start_time=interval.start,
+                    end_time=interval.end,
+                    duration=round(_hours(interval.end - interval.start), 4),
+                    location=interval.location or '',
+                    latitude=interval.latitude,
+                    longitude=interval.longitude,
+                    remarks=interval.remarks,
+                )
+                for trip, days in timelines
+                for date, day in days
+                if replace or (trip.id, date) not in existing
+                for interval in day
+            ],
+            batch_size=5000,
+        )
+
+        # bulk_create skips signals, so refresh the stored hour totals here
+        LogSheet.refresh_hour_totals(sheet_ids.values(), touch=False)
+        log_sheets_changed(sheet_ids.values())
+
+    return [sheet_ids[(trip.id, date)] for trip, days in timelines for date, _ in days]
@@ -1,13 +1,129 @@
 """
 Utility functions for ELD log generation
+
+reportlab is imported inside the PDF functions: it is the heaviest import in
+the app and most requests (and every cold start) never render a PDF.
 """
 import io
+import re
 import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+from django.conf import settings
+from django.core.cache import cache
+
+
+class DutyGrid:
+    """
+    Minute-resolution duty status grid for a single day
+
+    Backed by a 1440-byte array (one uint8 status code per minute), so a
+    day costs ~1.5 KB, per-status totals are C-level byte counts and runs
+    of equal status are found with a single regex scan.
+    """
+    MINUTES_IN_DAY = 1440
+    EMPTY = 255
+
+    # Status code per row of the paper log grid, top to bottom
+    STATUSES = ('off_duty', 'sleeper_berth', 'driving', 'on_duty')
+    STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+    # One alternative per code: much faster than a backreference like (.)\1*
+    _RUN_RE = re.compile(rb'\x00+|\x01+|\x02+|\x03+|\xff+')
+
+    __slots__ = ('date', 'slots', 'notes')
+
+    def __init__(self, date):
+        self.date = date
+        self.slots = bytearray(bytes([self.EMPTY]) * self.MINUTES_IN_DAY)
+        # start minute -> (location, remarks) of the change that begins there
+        self.notes = {}
+
+    def fill(self, status, start_minute, end_minute, location='', remarks=''):
+        """Mark minutes [start_minute, end_minute) with `status`."""
+        code = self.STATUS_CODES.get(status)
+        start_minute = max(0, start_minute)
+        end_minute = min(self.MINUTES_IN_DAY, end_minute)
+        if code is None or end_minute <= start_minute:
+            return
+        self.slots[start_minute:end_minute] = bytes([code]) * (end_minute - start_minute)
+        self.notes[start_minute] = (location, remarks)
+
+    def _minute_of_day(self, moment, round_up=False):
+        """Minute index of `moment` within this grid's day, clamped to [0, 1440]."""
+        if moment is None:
+            return self.MINUTES_IN_DAY
+        day = moment.date()
+        if day < self.date:
+            return 0
+        if day > self.date:
+            return self.MINUTES_IN_DAY
+        minute = moment.hour * 60 + moment.minute
+        if round_up and (moment.second or moment.microsecond):
+            minute += 1
+        return minute
+
+    def add_change(self, change):
+        """Mark the part of a DutyStatusChange that falls on this grid's day."""
+        self.fill(
+            change.status,
+            self._minute_of_day(change.start_time),
+            self._minute_of_day(change.end_time, round_up=True),
+            change.location,
+            change.remarks,
+        )
+
+    @classmethod
+    def from_status_changes(cls, date, status_changes):
+        """Build the grid for `date` from DutyStatusChange-like objects."""
+        grid = cls(date)
+        for change in status_changes:
+            grid.add_change(change)
+        return grid
+
+    def minutes_by_status(self):
+        return {name: self.slots.count(code) for code, name in enumerate(self.STATUSES)}
+
+    def hours_by_status(self):
+        return {name: minutes / 60.0 for name, minutes in self.minutes_by_status().items()}
+
+    def runs(self):
+        """Run-length encoding of the day as a list of (status, start_minute, end_minute)."""
+        runs = []
+        for match in self._RUN_RE.finditer(self.slots):
+            code = self.slots[match.start()]
+            if code != self.EMPTY:
+                runs.append((self.STATUSES[code], match.start(), match.end()))
+        return runs
+
+    def rows(self, resolution=15):
+        """
+        Grid rows at `resolution` minutes per cell: one list per status with 1
+        where the status occurs anywhere in the cell and None elsewhere.
+        """
+        cells = self.MINUTES_IN_DAY // resolution
+        rows = [[None] * cells for _ in self.STATUSES]
+        for status, start, end in self.runs():
+            row = rows[self.STATUS_CODES[status]]
+            for cell in range(start // resolution, (end - 1) // resolution + 1):
+                row[cell] = 1
+        return rows
+
+    def to_visual_log_data(self):
+        """
+        Convert to the `visual_log_data` shape drawn by the frontend:
+        {day: {hour: {status, location, remarks, startTime, endTime}}}
+        """
+        midnight = datetime.datetime.combine(self.date, datetime.time(0, 0), tzinfo=datetime.timezone.utc)
+        day = {}
+        for status, start, end in self.runs():
+            location, remarks = self.notes.get(start, ('', ''))
+            day[str(start // 60)] = {
+                'status': status,
+                'location': location,
+                'remarks': remarks,
+                'startTime': (midnight + datetime.timedelta(minutes=start)).isoformat(),
+                'endTime': (midnight + datetime.timedelta(minutes=end)).isoformat(),
+            }
+        return {self.date.strftime('%a %b %d %Y'): day}
 
 
 class LogGenerator:
@@ -25,7 +141,7 @@ class LogGenerator:
     ON_DUTY = 3
     
     @staticmethod
-    def generate_log_sheet_data(trip, date, status_changes):
+    def generate_log_sheet_data(trip, date, status_changes, resolution=15):
         """
         Generate log sheet data for a specific date
         
@@ -33,57 +149,16 @@ class LogGenerator:
             trip: Trip object
             date: Date for the log sheet
             status_changes: List of duty status changes for the date
+            resolution: Minutes per grid cell (1, 15 or 60)
             
         Returns:
             Dictionary with log sheet data
         """
-        # Initialize grid with all cells empty
-        grid = [[None for _ in range(LogGenerator.HOURS_IN_DAY)] for _ in range(LogGenerator.GRID_HEIGHT)]
-        
-        # Fill grid based on status changes
-        for change in status_changes:
-            if change.start_time.date() != date:
-                continue
-                
-            start_hour = change.start_time.hour
-            
-            # Calculate end hour
-            if change.end_time and change.end_time.date() == date:
-                end_hour = change.end_time.hour
-                # Add partial hour if minutes > 0
-                if change.end_time.minute > 0:
-                    end_hour += 1
-            else:
-                # If no end time or end time is on next day, use end of day
-                end_hour = LogGenerator.HOURS_IN_DAY
-            
-            # Map status to grid row
-            if change.status == 'off_duty':
-                row = LogGenerator.OFF_DUTY
-            elif change.status == 'sleeper_berth':
-                row = LogGenerator.SLEEPER_BERTH
-            elif change.status == 'driving':
-                row = LogGenerator.DRIVING
-            elif change.status == 'on_duty':
-                row = LogGenerator.ON_DUTY
-            else:
-                continue
-            
-            # Fill grid cells
-            for hour in range(start_hour, end_hour):
-                grid[row][hour] = 1
-        
-        # Calculate hours by duty status
-        hours_by_status = {
-            'off_duty': sum(1 for cell in grid[LogGenerator.OFF_DUTY] if cell),
-            'sleeper_berth': sum(1 for cell in grid[LogGenerator.SLEEPER_BERTH] if cell),
-            'driving': sum(1 for cell in grid[LogGenerator.DRIVING] if cell),
-            'on_duty': sum(1 for cell in grid[LogGenerator.ON_DUTY] if cell),
-        }
-        
-        # Get location remarks
+        # Fill the grid and collect location remarks in a single pass
+        duty_grid = DutyGrid(date)
         location_remarks = []
         for change in status_changes:
+            duty_grid.add_change(change)
             if change.start_time.date() == date:
                 location_remarks.append({
                     'time': change.start_time.strftime('%H:%M'),
@@ -91,18 +166,59 @@ class LogGenerator:
                     'status': change.get_status_display()
                 })
         
+        hours_by_status = duty_grid.hours_by_status()
+        
         return {
             'date': date,
-            'grid': grid,
+            'resolution': resolution,
+            'grid': duty_grid.rows(resolution),
+            'runs': duty_grid.runs(),
             'hours_by_status': hours_by_status,
             'total_hours': sum(hours_by_status.values()),
-            'location_remarks': location_remarks
+            'location_remarks': location_remarks,
+            'visual_log_data': duty_grid.to_visual_log_data(),
         }
     
+    @staticmethod
+    def get_pdf(log_sheet, driver_info):
+        """
+        Return the PDF for a log sheet, rendering it only on a cache miss
+        
+        The cache key includes the sheet's `updated_at`, so any change to the
+        sheet produces a new entry and stale PDFs simply expire.
+        """
+        updated = log_sheet.updated_at.isoformat() if log_sheet.updated_at else ''
+        key = f"logsheet-pdf:{log_sheet.id}:{updated}:{driver_info.get('id', '')}"
+        pdf = cache.get(key)
+        if pdf is None:
+            pdf = LogGenerator.generate_pdf(log_sheet, driver_info)
+            cache.set(key, pdf, getattr(settings, 'PDF_CACHE_TIMEOUT', 24 * 60 * 60))
+        return pdf
+    
     @staticmethod
     def generate_pdf(log_sheet, driver_info):
         """
-        Generate PDF for a log sheet
+        Generate an FMCSA-style graph PDF for a log sheet
+        
+        Args:
+            log_sheet: LogSheet object with status_changes
+            driver_info: Dictionary with driver information
+            
+        Returns:
+            PDF file as bytes
+        """
+        from .rendering import ELDCanvasRenderer
+        
+        buffer = io.BytesIO()
+        renderer = ELDCanvasRenderer(buffer)
+        renderer.draw_page(log_sheet, log_sheet.status_changes.all(), driver_info)
+        renderer.save()
+        return buffer.getvalue()
+    
+    @staticmethod
+    def generate_table_pdf(log_sheet, driver_info):
+        """
+        Generate a tabular (Platypus) PDF for a log sheet
         
         Args:
             log_sheet: LogSheet object with status_changes
@@ -111,6 +227,17 @@ class LogGenerator:
         Returns:
             PDF file as bytes
         """
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib import colors
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        
+        # Fetch the status changes once; grid, totals and remarks all derive from it
+        status_changes = list(log_sheet.status_changes.all())
+        duty_grid = DutyGrid.from_status_changes(log_sheet.date, status_changes)
+        hours = duty_grid.hours_by_status()
+        
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter)
         styles = getSampleStyleSheet()
@@ -137,12 +264,10 @@ class LogGenerator:
         # Create grid header (hours)
         grid_header = ['Status'] + [f"{h:02d}" for h in range(24)]
         
-        # Create grid data
+        # Create grid data (one cell per hour)
         grid_data = [
-            ['Off Duty'] + ['X' if cell else '' for cell in log_sheet.status_changes.filter(status='off_duty')],
-            ['Sleeper'] + ['X' if cell else '' for cell in log_sheet.status_changes.filter(status='sleeper_berth')],
-            ['Driving'] + ['X' if cell else '' for cell in log_sheet.status_changes.filter(status='driving')],
-            ['On Duty'] + ['X' if cell else '' for cell in log_sheet.status_changes.filter(status='on_duty')],
+            [label] + ['X' if cell else '' for cell in row]
+            for label, row in zip(['Off Duty', 'Sleeper', 'Driving', 'On Duty'], duty_grid.rows(60))
         ]
         
         # Create grid table
@@ -160,11 +285,11 @@ class LogGenerator:
         # Hours summary
         hours_summary = [
             ['Hours Summary', ''],
-            ['Off Duty', sum(1 for change in log_sheet.status_changes.filter(status='off_duty'))],
-            ['Sleeper Berth', sum(1 for change in log_sheet.status_changes.filter(status='sleeper_berth'))],
-            ['Driving', sum(1 for change in log_sheet.status_changes.filter(status='driving'))],
-            ['On Duty (Not Driving)', sum(1 for change in log_sheet.status_changes.filter(status='on_duty'))],
-            ['Total Hours', sum(1 for change in log_sheet.status_changes.all())],
+            ['Off Duty', f"{hours['off_duty']:.2f}"],
+            ['Sleeper Berth', f"{hours['sleeper_berth']:.2f}"],
+            ['Driving', f"{hours['driving']:.2f}"],
+            ['On Duty (Not Driving)', f"{hours['on_duty']:.2f}"],
+            ['Total Hours', f"{sum(hours.values()):.2f}"],
         ]
         
         hours_table = Table(hours_summary, colWidths=[2*inch, 1*inch])
@@ -182,7 +307,7 @@ class LogGenerator:
         remarks_header = ['Time', 'Location', 'Status']
         remarks_data = []
         
-        for change in log_sheet.status_changes.all():
+        for change in status_changes:
             remarks_data.append([
                 change.start_time.strftime('%H:%M'),
                 change.location,
@@ -1,4 +1,5 @@
-from django.http import HttpResponse
+from django.contrib.auth.models import User
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -8,11 +9,27 @@ from rest_framework.permissions import AllowAny
 from .models import LogSheet, DutyStatusChange
 from .serializers import (
     LogSheetSerializer, DutyStatusChangeSerializer,
-    LogSheetGenerationSerializer, LogSheetCertificationSerializer
+    LogSheetGenerationSerializer, LogSheetCertificationSerializer,
+    LogSheetExportSerializer, VisualLogPatchSerializer, ComplianceQuerySerializer,
+    HoursReportSerializer, ELDOutputSerializer
 )
 from .utils import LogGenerator
+from .timeline import TimelineCompiler, save_log_sheets
+from .compliance import driver_violations
+from .eld_output import eld_output_filename, stream_eld_output
+from .ingest import EventIngestor, read_csv, read_ndjson
+from .reports import hours_report, iter_csv
+from .jsonpatch import apply_patch, JsonPatchError
+from .signals import log_sheets_changed
+from .archive import rehydrate_log_sheets
+from .export import driver_info_for, export_filename, export_queryset, stream_pdf, stream_zip
 from trips.models import Trip, Stop
+from jobs.serializers import export_params
+from jobs.utils import JobQueue
+from jobs.views import job_accepted
+import csv
 import datetime
+import gzip
 
 
 class LogSheetViewSet(viewsets.ModelViewSet):
@@ -27,16 +44,27 @@ class LogSheetViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Return all log sheets (public visibility for demo)."""
         queryset = self.queryset
-        count = queryset.count()
-        print(f"Retrieving {count} log sheets")
-        
-        # Print recent logs for debugging
-        recent_logs = queryset.order_by('-created_at')[:5]
-        for log in recent_logs:
-            print(f"  - Log {log.id}: Trip {log.trip.id} on {log.date} (Status: {log.status})")
+        if self.action == 'pdf':
+            return queryset.select_related('user')
+        if self.action == 'list':
+            count = queryset.count()
+            print(f"Retrieving {count} log sheets")
+            
+            # Print recent logs for debugging
+            recent_logs = queryset.order_by('-created_at')[:5]
+            for log in recent_logs:
+                print(f"  - Log {log.id}: Trip {log.trip_id} on {log.date} (Status: {log.status})")
         
         return queryset
     
+    def get_object(self):
+        """Fetch the sheet, loading it back from the cold archive if it was archived."""
+        log_sheet = super().get_object()
+        if log_sheet.archived_at:
+            rehydrate_log_sheets([log_sheet.id])
+            log_sheet.refresh_from_db()
+        return log_sheet
+    
     def perform_create(self, serializer):
         """Set the user when creating a log sheet (fallback to anonymous/public)."""
         serializer.save()
@@ -64,192 +92,22 @@ class LogSheetViewSet(viewsets.ModelViewSet):
         trailer_number = serializer.validated_data.get('trailer_number', '')
         print(f"Vehicle: {vehicle_number}, Trailer: {trailer_number}")
         
-        # Calculate trip duration in days
-        trip_days = int(trip.total_trip_time / 24) + 1
+        # Compile the trip's HOS-compliant duty timeline into per-day sheets
+        days = TimelineCompiler(trip).compile_days(start_date)
+        print(f"Generating {len(days)} log sheets for trip {trip.id} starting {start_date}")
         
-        # Generate log sheets for each day
-        log_sheets = []
-        current_date = start_date
+        sheet_ids = save_log_sheets([(trip, days)], vehicle_number, trailer_number)
         
-        print(f"Generating {trip_days} log sheets for trip {trip.id}")
-        print(f"Start date: {start_date}, User: {trip.user}")
-        
-        for day in range(trip_days):
-            # Create log sheet for this day (assign to trip.user)
-            print(f"Creating log sheet for day {day}, date: {current_date}")
-            try:
-                # Check if log sheet already exists
-                existing_log = LogSheet.objects.filter(
-                    trip=trip,
-                    user=trip.user,
-                    date=current_date
-                ).first()
-                
-                if existing_log:
-                    print(f"Log sheet already exists for date {current_date}, using existing one: {existing_log.id}")
-                    log_sheet = existing_log
-                    # Update vehicle and trailer numbers if provided
-                    if vehicle_number:
-                        log_sheet.vehicle_number = vehicle_number
-                    if trailer_number:
-                        log_sheet.trailer_number = trailer_number
-                    log_sheet.save()
-                else:
-                    log_sheet = LogSheet.objects.create(
-                        trip=trip,
-                        user=trip.user,
-                        date=current_date,
-                        vehicle_number=vehicle_number,
-                        trailer_number=trailer_number
-                    )
-                    print(f"Successfully created new log sheet {log_sheet.id}")
-            except Exception as e:
-                print(f"Error creating log sheet for date {current_date}: {e}")
-                raise e
-            
-            # Only create duty status changes for new log sheets
-            if not existing_log:
-                # Simplified duty status timeline
-                if day == 0:
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='off_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(0, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(8, 0)),
-                        duration=8.0,
-                        location=trip.current_location,
-                        latitude=trip.current_location_lat,
-                        longitude=trip.current_location_lng,
-                        remarks='Start of day'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='on_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(8, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(9, 0)),
-                        duration=1.0,
-                        location=trip.pickup_location,
-                        latitude=trip.pickup_location_lat,
-                        longitude=trip.pickup_location_lng,
-                        remarks='Pickup operations'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='driving',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(9, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(17, 0)),
-                        duration=8.0,
-                        location=trip.pickup_location,
-                        latitude=trip.pickup_location_lat,
-                        longitude=trip.pickup_location_lng,
-                        remarks='Driving'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='off_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(17, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(23, 59)),
-                        duration=7.0,
-                        location='Rest Stop',
-                        remarks='End of day rest'
-                    )
-                elif day == trip_days - 1:
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='off_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(0, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(8, 0)),
-                        duration=8.0,
-                        location='Rest Stop',
-                        remarks='Start of day'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='driving',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(8, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(12, 0)),
-                        duration=4.0,
-                        location='En Route',
-                        remarks='Driving to destination'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='on_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(12, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(13, 0)),
-                        duration=1.0,
-                        location=trip.dropoff_location,
-                        latitude=trip.dropoff_location_lat,
-                        longitude=trip.dropoff_location_lng,
-                        remarks='Dropoff operations'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='off_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(13, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(23, 59)),
-                        duration=11.0,
-                        location=trip.dropoff_location,
-                        latitude=trip.dropoff_location_lat,
-                        longitude=trip.dropoff_location_lng,
-                        remarks='End of trip'
-                    )
-                else:
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='off_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(0, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(6, 0)),
-                        duration=6.0,
-                        location='Rest Stop',
-                        remarks='Start of day'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='driving',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(6, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(14, 0)),
-                        duration=8.0,
-                        location='En Route',
-                        remarks='Morning driving'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='on_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(14, 0)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(14, 30)),
-                        duration=0.5,
-                        location='Rest Area',
-                        remarks='30-minute break'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='driving',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(14, 30)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(17, 30)),
-                        duration=3.0,
-                        location='En Route',
-                        remarks='Afternoon driving'
-                    )
-                    DutyStatusChange.objects.create(
-                        log_sheet=log_sheet,
-                        status='off_duty',
-                        start_time=datetime.datetime.combine(current_date, datetime.time(17, 30)),
-                        end_time=datetime.datetime.combine(current_date, datetime.time(23, 59)),
-                        duration=6.5,
-                        location='Rest Stop',
-                        remarks='End of day rest'
-                    )
-            
-            log_sheets.append(log_sheet)
-            print(f"Created log sheet {log_sheet.id} for date {current_date}")
-            print(f"Log sheet details: Trip={log_sheet.trip.id}, User={log_sheet.user.username}, Date={log_sheet.date}, Status={log_sheet.status}")
-            current_date += datetime.timedelta(days=1)
-        
-        print(f"Successfully generated {len(log_sheets)} log sheets")
+        log_sheets = (
+            LogSheet.objects.filter(id__in=sheet_ids)
+            .prefetch_related('status_changes')
+            .order_by('date')
+        )
+        log_sheet_data = LogSheetSerializer(log_sheets, many=True).data
+        print(f"Successfully generated {len(log_sheet_data)} log sheets")
         return Response({
             'success': True,
-            'log_sheets': LogSheetSerializer(log_sheets, many=True).data
+            'log_sheets': log_sheet_data
         })
     
     @action(detail=True, methods=['post'], permission_classes=[AllowAny], authentication_classes=[])
@@ -279,18 +137,78 @@ class LogSheetViewSet(viewsets.ModelViewSet):
     def update_visual_data(self, request, pk=None):
         """
         Update visual log data for a log sheet
+        
+        Replaces the whole document; prefer PATCH visual_data/ for incremental
+        edits. If 'visual_log_version' is sent, a stale version is rejected with 409.
         """
         log_sheet = self.get_object()
         
+        version = request.data.get('visual_log_version')
+        if version is not None:
+            try:
+                version = int(version)
+            except (TypeError, ValueError):
+                return Response({'error': 'visual_log_version must be an integer'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if version != log_sheet.visual_log_version:
+                return _version_conflict(log_sheet.visual_log_version)
+        
         # Update visual log data
         log_sheet.visual_log_data = request.data.get('visual_log_data', {})
-        log_sheet.save()
+        log_sheet.visual_log_version += 1
+        log_sheet.save(update_fields=['visual_log_data', 'visual_log_version', 'updated_at'])
         
         return Response({
             'success': True,
             'log_sheet': LogSheetSerializer(log_sheet).data
         })
     
+    @action(detail=True, methods=['patch'], permission_classes=[AllowAny], authentication_classes=[])
+    def visual_data(self, request, pk=None):
+        """
+        Apply a JSON Patch (RFC 6902) to a log sheet's visual log data
+        
+        Body: {"version": <visual_log_version the patch was made against>,
+               "patch": [{"op": "replace", "path": "/...", "value": ...}, ...]}
+        A stale version returns 409 with the current version; the client should
+        reload the sheet and re-apply its edits.
+        """
+        serializer = VisualLogPatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        version = serializer.validated_data['version']
+        
+        rehydrate_log_sheets([pk])
+        current = LogSheet.objects.filter(pk=pk).values('visual_log_data', 'visual_log_version').first()
+        if current is None:
+            return Response({'error': 'Log sheet not found'}, status=status.HTTP_404_NOT_FOUND)
+        if current['visual_log_version'] != version:
+            return _version_conflict(current['visual_log_version'])
+        
+        try:
+            visual_log_data = apply_patch(current['visual_log_data'], serializer.validated_data['patch'])
+        except JsonPatchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        
+        # Compare-and-swap on the version so concurrent editors cannot overwrite each other
+        updated_at = timezone.now()
+        updated = LogSheet.objects.filter(pk=pk, visual_log_version=version).update(
+            visual_log_data=visual_log_data,
+            visual_log_version=version + 1,
+            updated_at=updated_at,
+        )
+        if not updated:
+            return _version_conflict(
+                LogSheet.objects.filter(pk=pk).values_list('visual_log_version', flat=True).first()
+            )
+        log_sheets_changed([pk])
+        
+        return Response({
+            'success': True,
+            'visual_log_version': version + 1,
+            'updated_at': updated_at,
+        })
+    
     @action(detail=True, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
     def pdf(self, request, pk=None):
         """
@@ -298,17 +216,160 @@ class LogSheetViewSet(viewsets.ModelViewSet):
         """
         log_sheet = self.get_object()
         
+        # Render in a background job (?background=1) instead of in the request
+        if _wants_background(request):
+            return job_accepted(JobQueue.enqueue('log_pdf', {'log_sheet_id': log_sheet.id}), request)
+        
         # Get driver information (fallback to trip.user username)
-        driver_info = {
-            'name': getattr(log_sheet.user, 'get_full_name', lambda: '')() or log_sheet.user.username,
-            'id': log_sheet.user.username,
-        }
+        driver_info = driver_info_for(log_sheet.user)
         
-        # Generate PDF
-        pdf = LogGenerator.generate_pdf(log_sheet, driver_info)
+        # Generate PDF (served from the cache when the sheet is unchanged)
+        pdf = LogGenerator.get_pdf(log_sheet, driver_info)
         
         # Create response
         response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="log_sheet_{log_sheet.date}.pdf"'
         
-        return response
\ No newline at end of file
+        return response
+    
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny], authentication_classes=[])
+    def ingest(self, request):
+        """
+        Bulk-load duty status events from ELD devices (public)
+        
+        Body: NDJSON (Content-Type application/x-ndjson) or CSV with a header
+        row (text/csv), optionally gzip-compressed (Content-Encoding: gzip).
+        Each event has event_id, log_sheet_id, status, start_time and optionally
+        end_time, location, latitude, longitude and remarks. Events are read
+        and validated as they stream in; already-loaded event_ids are skipped.
+        """
+        content_type = request.content_type.split(';')[0].strip().lower()
+        if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            parse = read_ndjson
+        elif content_type == 'text/csv':
+            parse = read_csv
+        else:
+            return Response({'error': 'Send application/x-ndjson or text/csv'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        
+        stream = request.stream
+        if stream is None:
+            return Response({'error': 'Request body is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+            stream = gzip.GzipFile(fileobj=stream)
+        
+        try:
+            summary = EventIngestor().ingest(parse(stream))
+        except (OSError, EOFError, UnicodeDecodeError, csv.Error) as e:
+            return Response({'error': f'Could not read request body: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        print(f"Ingested {summary['inserted']} of {summary['received']} events "
+              f"({summary['rows_per_second']} rows/s)")
+        return Response(summary)
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def compliance(self, request):
+        """
+        Check a driver's logged duty statuses against the 11-hour, 14-hour,
+        30-minute break and 70-hour/8-day rules (public)
+        """
+        serializer = ComplianceQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        
+        violations = driver_violations(params['user_id'], params.get('start_date'), params.get('end_date'))
+        return Response({
+            'user_id': params['user_id'],
+            'compliant': not violations,
+            'violation_count': len(violations),
+            'violations': [violation._asdict() for violation in violations],
+        })
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], authentication_classes=[],
+            url_path='eld-output')
+    def eld_output(self, request):
+        """
+        Stream a driver's FMCSA ELD output file for a date range (public)
+        """
+        serializer = ELDOutputSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        user = User.objects.filter(pk=params['user_id']).first()
+        if user is None:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        response = StreamingHttpResponse(
+            stream_eld_output(user, params['start_date'], params['end_date'], params['comment']),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{eld_output_filename(user)}"'
+        return response
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def report(self, request):
+        """
+        Fleet hours report: driving, on-duty, off-duty, sleeper and violation
+        hours per driver, per driver-day or per driver-week (?group_by=)
+        over a date range, as JSON or streamed CSV (?output=csv)
+        """
+        serializer = HoursReportSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        
+        rows = hours_report(params['start_date'], params['end_date'],
+                            params['group_by'], params.get('user_ids'))
+        if params['output'] == 'csv':
+            response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv')
+            response['Content-Disposition'] = (
+                f'attachment; filename="hours_{params["group_by"]}_'
+                f'{params["start_date"]}_{params["end_date"]}.csv"'
+            )
+            return response
+        return Response({
+            'start_date': params['start_date'],
+            'end_date': params['end_date'],
+            'group_by': params['group_by'],
+            'rows': list(rows),
+        })
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def export(self, request):
+        """
+        Stream every log sheet of a trip, or of a driver's date range, as one
+        multi-page PDF (?output=pdf) or a ZIP of PDFs (?output=zip).
+        With ?background=1 the file is rendered by a background job instead.
+        """
+        serializer = LogSheetExportSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = serializer.validated_data
+        
+        log_sheets = export_queryset(params)
+        name = export_filename(params)
+        
+        if not log_sheets.exists():
+            return Response({'error': 'No log sheets found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if _wants_background(request):
+            return job_accepted(JobQueue.enqueue('log_export', export_params(params)), request)
+        
+        if params['output'] == 'zip':
+            response = StreamingHttpResponse(stream_zip(log_sheets), content_type='application/zip')
+            response['Content-Disposition'] = f'attachment; filename="{name}.zip"'
+        else:
+            response = StreamingHttpResponse(stream_pdf(log_sheets), content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{name}.pdf"'
+        return response
+
+
+def _wants_background(request):
+    return request.query_params.get('background', '').lower() in ('1', 'true', 'yes')
+
+
+def _version_conflict(current_version):
+    return Response({
+        'error': 'Log sheet was modified by another save; reload and retry',
+        'visual_log_version': current_version,
+    }, status=status.HTTP_409_CONFLICT)
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class TripsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'trips'
\ No newline at end of file
+    name = 'trips'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - connects the change event receivers
@@ -0,0 +1,296 @@
+"""
+Dense GPS breadcrumb storage (monthly partitions) and downsampling for map display
+"""
+import datetime
+import heapq
+import math
+import re
+
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Func, BigIntegerField, Max, Min
+from django.utils.dateparse import parse_datetime
+
+from .models import Breadcrumb
+from .utils import douglas_peucker_ranks, round_coordinates
+
+E6 = 1_000_000
+# Rows per INSERT statement
+BREADCRUMB_BATCH_SIZE = 5000
+# Points per upload request
+MAX_BATCH_POINTS = 50000
+DEFAULT_MAX_POINTS = 2000
+# Douglas-Peucker runs over time buckets this many times finer than max_points
+# (but never more than SIMPLIFY_INPUT_LIMIT of them), so its input stays small
+# however long the requested range is
+SIMPLIFY_OVERSAMPLE = 8
+SIMPLIFY_INPUT_LIMIT = 40000
+
+# Months known to have a partition, so inserts skip the DDL round trip
+_partitions = set()
+
+
+def _month(moment):
+    return datetime.date(moment.year, moment.month, 1)
+
+
+def _next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month):
+    return f"{Breadcrumb._meta.db_table}_p{month:%Y_%m}"
+
+
+def ensure_partitions(start, end=None):
+    """
+    Create the monthly partitions covering start..end if they are missing
+
+    Does nothing on databases other than PostgreSQL, where the table is not
+    partitioned.
+
+    Returns:
+        Names of the partitions created
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    quote = connection.ops.quote_name
+    created = []
+    month, last = _month(start), _month(end or start)
+    with connection.cursor() as cursor:
+        while month <= last:
+            if month not in _partitions:
+                name = partition_name(month)
+                cursor.execute("SELECT to_regclass(%s)", [name])
+                if cursor.fetchone()[0] is None:
+                    # Bounds are dates we formatted ourselves; DDL cannot take parameters
+                    cursor.execute(
+                        f"CREATE TABLE IF NOT EXISTS {quote(name)} PARTITION OF "
+                        f"{quote(Breadcrumb._meta.db_table)} FOR VALUES "
+                        f"FROM ('{month.isoformat()} 00:00:00+00') TO ('{_next_month(month).isoformat()} 00:00:00+00')"
+                    )
+                    created.append(name)
+                # Only trust the cache once the partition is committed
+                transaction.on_commit(lambda month=month: _partitions.add(month))
+            month = _next_month(month)
+    return created
+
+
+def list_partitions():
+    """Return [(month, partition name)] of the existing partitions, oldest first."""
+    if connection.vendor != 'postgresql':
+        return []
+    pattern = re.compile(rf"^{re.escape(Breadcrumb._meta.db_table)}_p(\d{{4}})_(\d{{2}})$")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [Breadcrumb._meta.db_table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((datetime.date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def drop_partitions_before(month):
+    """
+    Drop whole partitions older than `month` (retention is a cheap DROP TABLE, not a DELETE)
+
+    Returns:
+        Names of the partitions dropped
+    """
+    quote = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cursor:
+        for partition_month, name in list_partitions():
+            if partition_month < _month(month):
+                cursor.execute(f"DROP TABLE {quote(name)}")
+                _partitions.discard(partition_month)
+                dropped.append(name)
+    return dropped
+
+
+def _parse_time(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise ValueError('time must be epoch seconds or an ISO 8601 datetime')
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment
+
+
+def _small_int_or_none(value, name, low, high):
+    if value is None:
+        return None
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not low <= value <= high:
+        raise ValueError(f"{name} must be a number between {low} and {high}")
+    return int(round(value))
+
+
+def parse_point(point):
+    """
+    Validate one ping and return (recorded_at, lat_e6, lng_e6, speed, heading)
+
+    Accepts the compact form [time, lat, lng, speed?, heading?] or an object
+    with the keys t, lat, lng, speed and heading, where time is epoch seconds
+    or an ISO 8601 string. Raises ValueError when the ping is invalid.
+    """
+    if isinstance(point, dict):
+        point = [point.get('t'), point.get('lat'), point.get('lng'), point.get('speed'), point.get('heading')]
+    if not isinstance(point, (list, tuple)) or not 3 <= len(point) <= 5:
+        raise ValueError('point must be [time, lat, lng, speed?, heading?]')
+    point = list(point) + [None] * (5 - len(point))
+    recorded_at = _parse_time(point[0])
+    lat, lng = point[1], point[2]
+    if not isinstance(lat, (int, float)) or not -90 <= lat <= 90:
+        raise ValueError('lat must be a number between -90 and 90')
+    if not isinstance(lng, (int, float)) or not -180 <= lng <= 180:
+        raise ValueError('lng must be a number between -180 and 180')
+    heading = _small_int_or_none(point[4], 'heading', 0, 360)
+    return (
+        recorded_at, int(round(lat * E6)), int(round(lng * E6)),
+        _small_int_or_none(point[3], 'speed', 0, 200),
+        heading % 360 if heading is not None else None,
+    )
+
+
+def record_breadcrumbs(user_id, points, trip_id=None):
+    """
+    Store a batch of parsed pings (see parse_point) for one driver
+
+    Pings already stored for the same driver and time are skipped, so a
+    device can safely resend a batch.
+
+    Returns:
+        Number of pings submitted
+    """
+    if not points:
+        return 0
+    times = [point[0] for point in points]
+    ensure_partitions(min(times), max(times))
+    Breadcrumb.objects.bulk_create(
+        [
+            Breadcrumb(user_id=user_id, trip_id=trip_id, recorded_at=recorded_at,
+                       lat_e6=lat_e6, lng_e6=lng_e6, speed=speed, heading=heading)
+            for recorded_at, lat_e6, lng_e6, speed, heading in points
+        ],
+        batch_size=BREADCRUMB_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return len(points)
+
+
+class EpochBucket(Func):
+    """Number of the `seconds`-long time bucket (since the Unix epoch) a datetime falls in."""
+    output_field = BigIntegerField()
+
+    def __init__(self, expression, seconds, **extra):
+        super().__init__(expression, seconds=int(seconds), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              template="CAST(FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / %(seconds)s) AS BIGINT)",
+                              **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              template="(CAST(ROUND((julianday(%(expressions)s) - 2440587.5) * 86400) AS INTEGER)"
+                                       " / %(seconds)s)",
+                              **extra_context)
+
+
+def breadcrumb_queryset(start, end, user_id=None, trip_id=None):
+    breadcrumbs = Breadcrumb.objects.filter(recorded_at__gte=start, recorded_at__lt=end)
+    if user_id is not None:
+        breadcrumbs = breadcrumbs.filter(user_id=user_id)
+    if trip_id is not None:
+        breadcrumbs = breadcrumbs.filter(trip_id=trip_id)
+    return breadcrumbs
+
+
+def _bucketed(breadcrumbs, first, last, buckets):
+    """
+    Return ([(recorded_at, lat_e6, lng_e6, speed)], bucket seconds) with at most ~`buckets` rows
+
+    Pings are averaged per time bucket in the database, so only the reduced
+    rows cross the wire.
+    """
+    # Buckets are aligned to the epoch, so the range can straddle one more than span / seconds
+    seconds = max(1, math.ceil((last - first).total_seconds() / max(1, buckets - 1)))
+    rows = (
+        breadcrumbs
+        .annotate(bucket=EpochBucket('recorded_at', seconds))
+        .values('bucket')
+        .annotate(at=Min('recorded_at'), lat=Avg('lat_e6'), lng=Avg('lng_e6'), top_speed=Max('speed'))
+        .order_by('bucket')
+        .values_list('at', 'lat', 'lng', 'top_speed')
+    )
+    return list(rows), seconds
+
+
+def breadcrumb_track(start, end, user_id=None, trip_id=None, mode='bucket',
+                     max_points=DEFAULT_MAX_POINTS, tolerance=None):
+    """
+    Return a downsampled track as a GeoJSON LineString Feature
+
+    Args:
+        start: First moment (inclusive)
+        end: Last moment (exclusive)
+        user_id: Driver whose pings to read
+        trip_id: Only pings recorded on this trip
+        mode: 'bucket' averages pings over equal time buckets; 'simplify'
+            applies Douglas-Peucker (to `tolerance` degrees, or to at most
+            `max_points` points) over a finer bucketing
+        max_points: Upper bound on the points returned
+        tolerance: Douglas-Peucker tolerance in degrees ('simplify' only)
+    """
+    breadcrumbs = breadcrumb_queryset(start, end, user_id, trip_id)
+    extent = breadcrumbs.aggregate(first=Min('recorded_at'), last=Max('recorded_at'), count=Count('id'))
+    properties = {
+        'user_id': user_id, 'trip_id': trip_id, 'mode': mode,
+        'source_points': extent['count'], 'bucket_seconds': None,
+    }
+
+    if mode == 'bucket':
+        limit = max_points
+    else:
+        limit = max(max_points, min(max_points * SIMPLIFY_OVERSAMPLE, SIMPLIFY_INPUT_LIMIT))
+    if not extent['count']:
+        rows = []
+    elif extent['count'] <= limit:
+        rows = list(breadcrumbs.order_by('recorded_at').values_list('recorded_at', 'lat_e6', 'lng_e6', 'speed'))
+    else:
+        rows, properties['bucket_seconds'] = _bucketed(breadcrumbs, extent['first'], extent['last'], limit)
+
+    coords = [(lat / E6, lng / E6) for _, lat, lng, _ in rows]
+    if mode == 'simplify' and len(rows) > 2:
+        ranks = douglas_peucker_ranks(coords)
+        keep = None
+        if tolerance is not None:
+            keep = [i for i, rank in enumerate(ranks) if rank > tolerance]
+        if keep is None or len(keep) > max_points:
+            keep = sorted(heapq.nlargest(max_points, range(len(ranks)), key=ranks.__getitem__))
+        rows = [rows[i] for i in keep]
+        coords = [coords[i] for i in keep]
+        properties['tolerance'] = tolerance
+
+    properties.update({
+        'points': len(rows),
+        'times': [int(at.timestamp()) for at, _, _, _ in rows],
+        'speeds': [speed for _, _, _, speed in rows],
+    })
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [[lng, lat] for lat, lng in round_coordinates(coords)],
+        },
+        'properties': properties,
+    }
@@ -0,0 +1,45 @@
+"""
+Create upcoming monthly breadcrumb partitions and drop expired ones (PostgreSQL)
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from trips.breadcrumbs import drop_partitions_before, ensure_partitions, list_partitions
+
+
+class Command(BaseCommand):
+    help = "Pre-create GPS breadcrumb partitions for the coming months and optionally drop old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=2,
+                            help='Create partitions for this many months after the current one')
+        parser.add_argument('--retain-months', type=int,
+                            help='Drop partitions that ended more than this many months ago (default: keep all)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write("Breadcrumbs are only partitioned on PostgreSQL; nothing to do")
+            return
+
+        today = timezone.now().date().replace(day=1)
+        last = today
+        for _ in range(options['months_ahead']):
+            last = (last + datetime.timedelta(days=32)).replace(day=1)
+        for name in ensure_partitions(today, last):
+            self.stdout.write(f"Created {name}")
+
+        if options['retain_months'] is not None:
+            cutoff = today
+            for _ in range(options['retain_months']):
+                cutoff = (cutoff - datetime.timedelta(days=1)).replace(day=1)
+            for name in drop_partitions_before(cutoff):
+                self.stdout.write(f"Dropped {name}")
+
+        partitions = list_partitions()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(partitions)} breadcrumb partitions"
+            + (f" ({partitions[0][0]:%Y-%m} to {partitions[-1][0]:%Y-%m})" if partitions else "")
+        ))
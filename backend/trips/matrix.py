@@ -0,0 +1,231 @@
+"""
+Many-to-many travel distance/duration matrices with a persistent cell cache
+
+MatrixService.matrix() snaps every point to a grid of 1e-4 degrees and
+fills the matrix from, in order:
+
+1. memory: whole matrices already built in this process (NumPy arrays,
+   read-only, LRU by the snapped source and destination lists)
+2. MatrixCell rows younger than MATRIX_CELL_MAX_AGE_DAYS
+3. the Mapbox Matrix API, in blocks of at most MAPBOX_MATRIX_MAX_COORDINATES
+   points; each block costs one call from the budget, and the cells it
+   returns are saved
+4. the local router: great-circle distance times a road factor at
+   HOSCalculator.AVERAGE_SPEED (cells the budget, the API key or Mapbox
+   could not provide; these are never saved, so they are upgraded later)
+
+NumPy is imported with this module; import it where it is used so it stays
+off the cold-start path of other requests.
+"""
+import collections
+import datetime
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import MatrixCell
+from .utils import DirectionsService, HOSCalculator
+
+SNAP = 1e4  # Grid cells per degree
+MAPBOX_MATRIX_MAX_COORDINATES = 25  # Per request (mapbox/driving profile)
+MEMORY_ENTRIES = 256
+METERS_PER_MILE = 1609.344
+
+_memory = collections.OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def snap(point):
+    """(lat, lng) -> integer grid coordinates."""
+    return round(point[0] * SNAP), round(point[1] * SNAP)
+
+
+def estimate_matrix(sources, destinations):
+    """
+    Local router: estimated road distance (miles) and driving time (hours)
+    from every source to every destination, as NumPy arrays
+    """
+    sources = np.radians(np.asarray(sources, dtype=float).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+    lat1, lng1 = sources[:, :1], sources[:, 1:]
+    lat2, lng2 = destinations[:, 0], destinations[:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    miles = 3958.8 * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * DirectionsService.ROAD_FACTOR
+    return miles, miles / HOSCalculator.AVERAGE_SPEED
+
+
+class TravelMatrix:
+    """Distances (miles) and durations (hours), sources by destinations, and where they came from."""
+    __slots__ = ('distances', 'durations', 'estimated', 'upstream_calls', 'from_memory')
+
+    def __init__(self, distances, durations, estimated, upstream_calls=0, from_memory=False):
+        self.distances = distances
+        self.durations = durations
+        self.estimated = estimated  # True where the local router filled the cell
+        self.upstream_calls = upstream_calls
+        self.from_memory = from_memory
+
+    def summary(self):
+        return {
+            'cells': int(self.distances.size),
+            'estimated_cells': int(self.estimated.sum()),
+            'upstream_calls': self.upstream_calls,
+            'from_memory': self.from_memory,
+        }
+
+
+class MatrixService:
+    """
+    Build travel matrices from the caches, batched Mapbox Matrix calls and
+    the local router (see the module docstring)
+
+    With a budget (trips.throttling.MapboxBudget) each Mapbox call is paid
+    for from it; cells it cannot pay for are estimated.
+    """
+
+    def __init__(self, budget=None):
+        self.token = getattr(settings, 'MAP_API_KEY', '')
+        self.budget = budget
+
+    def matrix(self, sources, destinations=None):
+        """
+        Args:
+            sources: [(lat, lng), ...]
+            destinations: [(lat, lng), ...] (default: the sources)
+
+        Returns:
+            TravelMatrix with len(sources) x len(destinations) arrays
+        """
+        sources = [snap(point) for point in sources]
+        destinations = sources if destinations is None else [snap(point) for point in destinations]
+        key = (tuple(sources), tuple(destinations))
+        with _memory_lock:
+            cached = _memory.get(key)
+            if cached is not None:
+                _memory.move_to_end(key)
+                return TravelMatrix(*cached, from_memory=True)
+
+        origins, targets = sorted(set(sources)), sorted(set(destinations))
+        cells = self._load_cells(origins, targets)
+        missing = [(o, d) for o in origins for d in targets if o != d and (o, d) not in cells]
+        calls = 0
+        if missing and self.token:
+            fetched, calls = self._fetch(missing)
+            cells.update(fetched)
+
+        rows = [(lat / SNAP, lng / SNAP) for lat, lng in sources]
+        columns = [(lat / SNAP, lng / SNAP) for lat, lng in destinations]
+        distances, durations = estimate_matrix(rows, columns)
+        estimated = np.ones(distances.shape, dtype=bool)
+        for i, origin in enumerate(sources):
+            for j, destination in enumerate(destinations):
+                if origin == destination:
+                    distances[i, j] = durations[i, j] = 0.0
+                    estimated[i, j] = False
+                    continue
+                cell = cells.get((origin, destination))
+                if cell is not None:
+                    distances[i, j], durations[i, j] = cell
+                    estimated[i, j] = False
+
+        for array in (distances, durations, estimated):
+            array.setflags(write=False)
+        if not estimated.any():
+            with _memory_lock:
+                _memory[key] = (distances, durations, estimated)
+                while len(_memory) > getattr(settings, 'MATRIX_MEMORY_ENTRIES', MEMORY_ENTRIES):
+                    _memory.popitem(last=False)
+        return TravelMatrix(distances, durations, estimated, upstream_calls=calls)
+
+    @staticmethod
+    def _load_cells(origins, targets):
+        """{(origin, destination): (miles, hours)} of fresh cached cells between the snapped points."""
+        max_age = getattr(settings, 'MATRIX_CELL_MAX_AGE_DAYS', 30)
+        rows = MatrixCell.objects.filter(
+            origin_lat_e4__in={lat for lat, _ in origins},
+            origin_lng_e4__in={lng for _, lng in origins},
+            destination_lat_e4__in={lat for lat, _ in targets},
+            destination_lng_e4__in={lng for _, lng in targets},
+            updated_at__gte=timezone.now() - datetime.timedelta(days=max_age),
+        ).values_list('origin_lat_e4', 'origin_lng_e4', 'destination_lat_e4', 'destination_lng_e4',
+                      'distance', 'duration')
+        wanted_origins, wanted_targets = set(origins), set(targets)
+        cells = {}
+        for origin_lat, origin_lng, destination_lat, destination_lng, miles, hours in rows:
+            origin, destination = (origin_lat, origin_lng), (destination_lat, destination_lng)
+            if origin in wanted_origins and destination in wanted_targets:
+                cells[origin, destination] = (miles, hours)
+        return cells
+
+    def _fetch(self, missing):
+        """
+        Fetch missing cells from the Mapbox Matrix API in blocks that fit one
+        request, saving what comes back
+
+        Returns:
+            ({(origin, destination): (miles, hours)}, number of calls made)
+        """
+        by_origin = collections.defaultdict(set)
+        for origin, destination in missing:
+            by_origin[origin].add(destination)
+        origins = sorted(by_origin)
+        source_block = MAPBOX_MATRIX_MAX_COORDINATES // 2
+        target_block = MAPBOX_MATRIX_MAX_COORDINATES - source_block
+
+        fetched, calls = {}, 0
+        for i in range(0, len(origins), source_block):
+            block_origins = origins[i:i + source_block]
+            block_targets = sorted({d for o in block_origins for d in by_origin[o]})
+            for j in range(0, len(block_targets), target_block):
+                if self.budget is not None and not self.budget.allow():
+                    return self._save(fetched), calls
+                calls += 1
+                fetched.update(self._request(block_origins, block_targets[j:j + target_block]))
+        return self._save(fetched), calls
+
+    def _request(self, origins, targets):
+        """One Mapbox Matrix call; returns the cells it could route (none on failure)."""
+        import requests
+
+        points = origins + targets
+        coordinates = ';'.join(f"{lng / SNAP},{lat / SNAP}" for lat, lng in points)
+        url = f"https://api.mapbox.com/directions-matrix/v1/mapbox/driving/{coordinates}"
+        params = {
+            'sources': ';'.join(str(i) for i in range(len(origins))),
+            'destinations': ';'.join(str(len(origins) + j) for j in range(len(targets))),
+            'annotations': 'distance,duration',
+            'access_token': self.token,
+        }
+        try:
+            r = requests.get(url, params=params, timeout=15)
+            r.raise_for_status()
+            js = r.json()
+        except Exception:
+            return {}
+        cells = {}
+        for origin, distances, durations in zip(origins, js.get('distances') or [], js.get('durations') or []):
+            for destination, meters, seconds in zip(targets, distances, durations):
+                if meters is not None and seconds is not None and origin != destination:
+                    cells[origin, destination] = (meters / METERS_PER_MILE, seconds / 3600.0)
+        return cells
+
+    @staticmethod
+    def _save(cells):
+        if cells:
+            MatrixCell.objects.bulk_create(
+                [
+                    MatrixCell(
+                        origin_lat_e4=origin[0], origin_lng_e4=origin[1],
+                        destination_lat_e4=destination[0], destination_lng_e4=destination[1],
+                        distance=miles, duration=hours,
+                    )
+                    for (origin, destination), (miles, hours) in cells.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['origin_lat_e4', 'origin_lng_e4', 'destination_lat_e4', 'destination_lng_e4'],
+                update_fields=['distance', 'duration', 'updated_at'],
+                batch_size=500,
+            )
+        return cells
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.10 on 2026-10-19 05:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# PostgreSQL: range-partitioned by month, keyed by (user_id, recorded_at).
+# A partitioned table's primary key must include the partition column, so
+# the id column is a plain bigserial without an index of its own.
+CREATE_PARTITIONED_TABLE = """
+CREATE TABLE trips_breadcrumb (
+    id bigserial NOT NULL,
+    recorded_at timestamp with time zone NOT NULL,
+    user_id integer NOT NULL,
+    trip_id bigint NULL,
+    lat_e6 integer NOT NULL,
+    lng_e6 integer NOT NULL,
+    speed smallint NULL,
+    heading smallint NULL,
+    CONSTRAINT breadcrumb_user_time_uniq PRIMARY KEY (user_id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+CREATE INDEX breadcrumb_trip_time_idx ON trips_breadcrumb (trip_id, recorded_at) WHERE trip_id IS NOT NULL;
+"""
+
+
+def create_breadcrumb_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_PARTITIONED_TABLE)
+    else:
+        schema_editor.create_model(apps.get_model('trips', 'Breadcrumb'))
+
+
+def drop_breadcrumb_table(apps, schema_editor):
+    # Dropping the parent drops every partition with it
+    schema_editor.delete_model(apps.get_model('trips', 'Breadcrumb'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('trips', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Breadcrumb',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('recorded_at', models.DateTimeField()),
+                        ('lat_e6', models.IntegerField(help_text='Latitude in microdegrees')),
+                        ('lng_e6', models.IntegerField(help_text='Longitude in microdegrees')),
+                        ('speed', models.SmallIntegerField(blank=True, help_text='Speed in mph', null=True)),
+                        ('heading', models.SmallIntegerField(blank=True, help_text='Heading in degrees (0-359)', null=True)),
+                        ('trip', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='breadcrumbs', to='trips.trip')),
+                        ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='breadcrumbs', to=settings.AUTH_USER_MODEL)),
+                    ],
+                ),
+                migrations.AddConstraint(
+                    model_name='breadcrumb',
+                    constraint=models.UniqueConstraint(fields=('user', 'recorded_at'), name='breadcrumb_user_time_uniq'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_breadcrumb_table, drop_breadcrumb_table),
+    ]
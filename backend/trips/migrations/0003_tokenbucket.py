@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-19 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_breadcrumb'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=150, unique=True)),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.FloatField(help_text='Unix time the balance was last brought up to date')),
+            ],
+        ),
+    ]
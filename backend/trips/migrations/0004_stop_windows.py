@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-19 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0003_tokenbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stop',
+            name='pinned',
+            field=models.BooleanField(default=False, help_text='Position fixed by the request, not by the optimizer'),
+        ),
+        migrations.AddField(
+            model_name='stop',
+            name='window_end',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stop',
+            name='window_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.10 on 2026-10-19 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_stop_windows'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatrixCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin_lat_e4', models.IntegerField()),
+                ('origin_lng_e4', models.IntegerField()),
+                ('destination_lat_e4', models.IntegerField()),
+                ('destination_lng_e4', models.IntegerField()),
+                ('distance', models.FloatField(help_text='Distance in miles')),
+                ('duration', models.FloatField(help_text='Driving time in hours')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='matrixcell',
+            constraint=models.UniqueConstraint(fields=('origin_lat_e4', 'origin_lng_e4', 'destination_lat_e4', 'destination_lng_e4'), name='matrix_cell_pair_uniq'),
+        ),
+    ]
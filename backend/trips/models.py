@@ -69,6 +69,11 @@ class Stop(models.Model):
     departure_time = models.DateTimeField(null=True, blank=True)
     duration = models.FloatField(help_text="Duration in hours")
     
+    # Requested time window and position of a pickup or dropoff (multi-stop trips)
+    window_start = models.DateTimeField(null=True, blank=True)
+    window_end = models.DateTimeField(null=True, blank=True)
+    pinned = models.BooleanField(default=False, help_text="Position fixed by the request, not by the optimizer")
+    
     # Distance information
     distance_from_start = models.FloatField(help_text="Distance from trip start in miles")
     
@@ -104,4 +109,87 @@ class RouteSegment(models.Model):
         return f"Route from {self.start_stop.location} to {self.end_stop.location}"
     
     class Meta:
-        ordering = ['sequence']
\ No newline at end of file
+        ordering = ['sequence']
+
+class Breadcrumb(models.Model):
+    """
+    Model to store dense GPS pings (one every few seconds per truck)
+
+    Positions are stored as integer microdegrees and speed/heading as small
+    integers to keep rows narrow. On PostgreSQL the table is range-partitioned
+    by month on recorded_at with (user_id, recorded_at) as its primary key, and
+    is created by hand in migration 0002 (see trips/breadcrumbs.py for the
+    partition helpers); other databases get a plain table.
+    """
+    id = models.BigAutoField(primary_key=True)
+    recorded_at = models.DateTimeField()
+    # No database-level foreign keys: they slow the hot insert path and
+    # would have to be kept in step on every partition
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='breadcrumbs', db_constraint=False)
+    trip = models.ForeignKey(Trip, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='breadcrumbs', db_constraint=False)
+    lat_e6 = models.IntegerField(help_text="Latitude in microdegrees")
+    lng_e6 = models.IntegerField(help_text="Longitude in microdegrees")
+    speed = models.SmallIntegerField(null=True, blank=True, help_text="Speed in mph")
+    heading = models.SmallIntegerField(null=True, blank=True, help_text="Heading in degrees (0-359)")
+
+    @property
+    def latitude(self):
+        return self.lat_e6 / 1e6
+
+    @property
+    def longitude(self):
+        return self.lng_e6 / 1e6
+
+    def __str__(self):
+        return f"{self.user_id} at {self.recorded_at}: {self.latitude}, {self.longitude}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recorded_at'], name='breadcrumb_user_time_uniq'),
+        ]
+
+
+class TokenBucket(models.Model):
+    """
+    Model to store a rate-limit token bucket shared by every worker
+
+    `tokens` is the balance as of `refilled_at` (Unix time); trips/throttling.py
+    refills and spends it in a single UPDATE, so concurrent workers never
+    spend the same token twice.
+    """
+    key = models.CharField(max_length=150, unique=True)
+    tokens = models.FloatField()
+    refilled_at = models.FloatField(help_text="Unix time the balance was last brought up to date")
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f} tokens"
+
+
+class MatrixCell(models.Model):
+    """
+    Model to cache one travel distance/duration between two snapped points
+
+    Coordinates are snapped to a grid of 1e-4 degrees (about 11 m) and stored
+    as integers, so nearby requests for the same place share cells; see
+    trips/matrix.py.
+    """
+    origin_lat_e4 = models.IntegerField()
+    origin_lng_e4 = models.IntegerField()
+    destination_lat_e4 = models.IntegerField()
+    destination_lng_e4 = models.IntegerField()
+    distance = models.FloatField(help_text="Distance in miles")
+    duration = models.FloatField(help_text="Driving time in hours")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return (f"({self.origin_lat_e4 / 1e4}, {self.origin_lng_e4 / 1e4}) -> "
+                f"({self.destination_lat_e4 / 1e4}, {self.destination_lng_e4 / 1e4}): {self.distance:.1f} mi")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['origin_lat_e4', 'origin_lng_e4', 'destination_lat_e4', 'destination_lng_e4'],
+                name='matrix_cell_pair_uniq',
+            ),
+        ]
@@ -0,0 +1,218 @@
+"""
+Stop-sequence optimization for multi-stop (LTL) trips
+
+solve() orders the stops of a trip that starts at the driver's current
+location: a nearest-neighbour tour, then 2-opt (reverse a run of stops) and
+Or-opt (move a run of up to OR_OPT_RUN stops elsewhere) until no move helps
+or the time limit runs out. Stops may be pinned to a position and may carry
+a time window. Tours are scored in hours on a simplified HOS clock (11 hours
+driving and a 14-hour window per day, then a 10-hour rest), so waiting for
+a window and the rests a long tour needs both count, and every hour a stop
+is reached after its window costs LATE_PENALTY hours.
+
+Durations come from a travel matrix (trips/matrix.py), passed in as plain
+lists: indexing Python lists is much faster than indexing NumPy arrays in
+the search's inner loop.
+"""
+import math
+import time
+
+from .utils import HOSCalculator
+
+MAX_STOPS = 50
+OR_OPT_RUN = 3
+LATE_PENALTY = 100.0  # Cost per hour late, in hours of trip time
+DEFAULT_TIME_LIMIT = 1.0  # Seconds of local search
+
+
+class Solution:
+    """A stop order and how it was found."""
+    __slots__ = ('order', 'cost', 'initial_cost', 'moves', 'solve_ms', 'late_stops')
+
+    def __init__(self, order, cost, initial_cost, moves, solve_ms, late_stops):
+        self.order = order
+        self.cost = cost
+        self.initial_cost = initial_cost
+        self.moves = moves
+        self.solve_ms = solve_ms
+        self.late_stops = late_stops
+
+    def as_dict(self):
+        return {
+            'order': self.order,
+            'cost_hours': round(self.cost, 3),
+            'initial_cost_hours': round(self.initial_cost, 3),
+            'improvement_moves': self.moves,
+            'solve_ms': round(self.solve_ms, 2),
+            'late_stops': self.late_stops,
+        }
+
+
+class StopSequencer:
+    """
+    Local search over the order of a trip's stops
+
+    Matrix index 0 is the start; stop i is matrix index i + 1. Only the
+    free (unpinned) stops move: a tour is the list of free stops, merged
+    into the positions the pinned stops leave open.
+    """
+
+    def __init__(self, durations, service_hours, windows=None, fixed=None):
+        self.durations = durations
+        self.service = service_hours
+        self.count = len(service_hours)
+        self.windows = windows or [(None, None)] * self.count
+        self.slots = [None] * self.count
+        for stop, position in (fixed or {}).items():
+            self.slots[position] = stop
+        self.free_positions = [position for position, stop in enumerate(self.slots) if stop is None]
+
+    def merge(self, free):
+        """Full stop order for a tour of the free stops."""
+        order = list(self.slots)
+        for position, stop in zip(self.free_positions, free):
+            order[position] = stop
+        return order
+
+    def step(self, state, stop):
+        """Clock state (hours, day driving, day duty, late hours, matrix index) after driving to and serving `stop`."""
+        hours, day_driving, day_duty, late, at = state
+        node = stop + 1
+        drive = self.durations[at][node]
+        while drive > 1e-9:
+            room = min(HOSCalculator.DAILY_DRIVING_LIMIT - day_driving, HOSCalculator.DAILY_DUTY_WINDOW - day_duty)
+            if room <= 1e-9:
+                hours += HOSCalculator.REQUIRED_REST_PERIOD
+                day_driving = day_duty = 0.0
+                continue
+            leg = drive if drive < room else room
+            hours += leg
+            day_driving += leg
+            day_duty += leg
+            drive -= leg
+        opens, closes = self.windows[stop]
+        if opens is not None and hours < opens:
+            wait = opens - hours
+            hours = opens
+            if wait >= HOSCalculator.REQUIRED_REST_PERIOD:
+                day_driving = day_duty = 0.0
+            else:
+                day_duty += wait
+        if closes is not None and hours > closes:
+            late += hours - closes
+        service = self.service[stop]
+        if day_duty + service > HOSCalculator.DAILY_DUTY_WINDOW:
+            hours += HOSCalculator.REQUIRED_REST_PERIOD
+            day_driving = day_duty = 0.0
+        return hours + service, day_driving, day_duty + service, late, node
+
+    def prefix_states(self, order):
+        """Clock state before each position of `order` (and after the last)."""
+        states = [(0.0, 0.0, 0.0, 0.0, 0)]
+        for stop in order:
+            states.append(self.step(states[-1], stop))
+        return states
+
+    def cost_from(self, order, position, state):
+        """Cost of `order`, resuming at `position` from the clock state there."""
+        step = self.step
+        for stop in order[position:]:
+            state = step(state, stop)
+        return state[0] + LATE_PENALTY * state[3]
+
+    def nearest_neighbour(self):
+        """Free stops in greedy order: always the one that can be finished soonest from here."""
+        remaining = set(range(self.count)).difference(self.slots)
+        state = (0.0, 0.0, 0.0, 0.0, 0)
+        free = []
+        for pinned in self.slots:
+            if pinned is not None:
+                state = self.step(state, pinned)
+                continue
+            best = best_state = None
+            best_cost = math.inf
+            for stop in sorted(remaining):
+                candidate = self.step(state, stop)
+                cost = candidate[0] + LATE_PENALTY * candidate[3]
+                if cost < best_cost:
+                    best, best_state, best_cost = stop, candidate, cost
+            remaining.discard(best)
+            free.append(best)
+            state = best_state
+        return free
+
+    def improve(self, free, deadline):
+        """Apply improving 2-opt and Or-opt moves to `free` until none is left or time runs out."""
+        order = self.merge(free)
+        states = self.prefix_states(order)
+        best = [free, states[-1][0] + LATE_PENALTY * states[-1][3], states]
+        moves = 0
+
+        def accept(tour, first):
+            """Keep `tour` if it beats the best; `first` is the first free index it changes."""
+            position = self.free_positions[first]
+            new_order = self.merge(tour)
+            cost = self.cost_from(new_order, position, best[2][position])
+            if cost < best[1] - 1e-9:
+                best[:] = [tour, cost, self.prefix_states(new_order)]
+                return True
+            return False
+
+        size = len(free)
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            # 2-opt: reverse free[i:j]
+            for i in range(size - 1):
+                for j in range(i + 2, size + 1):
+                    free = best[0]
+                    if accept(free[:i] + free[i:j][::-1] + free[j:], i):
+                        moves += 1
+                        improved = True
+                if time.perf_counter() >= deadline:
+                    return best[0], best[1], moves
+            # Or-opt: move a run of up to OR_OPT_RUN stops elsewhere
+            for run in range(1, min(OR_OPT_RUN, size - 1) + 1):
+                for i in range(size - run + 1):
+                    for j in range(size - run + 1):
+                        if j == i:
+                            continue
+                        free = best[0]
+                        chain, rest = free[i:i + run], free[:i] + free[i + run:]
+                        if accept(rest[:j] + chain + rest[j:], min(i, j)):
+                            moves += 1
+                            improved = True
+                    if time.perf_counter() >= deadline:
+                        return best[0], best[1], moves
+        return best[0], best[1], moves
+
+
+def solve(durations, service_hours, windows=None, fixed=None, time_limit=DEFAULT_TIME_LIMIT):
+    """
+    Order the stops of a trip to finish it as early as possible
+
+    Args:
+        durations: (n + 1) x (n + 1) driving hours; index 0 is the start
+        service_hours: Hours spent at each of the n stops
+        windows: Per stop (opens, closes) in hours after departure, either may be None
+        fixed: {stop index: position} for stops that must keep a position
+        time_limit: Seconds allowed for local search
+
+    Returns:
+        Solution, whose `order` lists stop indexes in visiting order
+    """
+    started = time.perf_counter()
+    sequencer = StopSequencer(durations, service_hours, windows, fixed)
+    free = sequencer.nearest_neighbour()
+    initial = sequencer.prefix_states(sequencer.merge(free))[-1]
+    free, cost, moves = sequencer.improve(free, started + time_limit)
+    order = sequencer.merge(free)
+
+    late_stops, state = [], (0.0, 0.0, 0.0, 0.0, 0)
+    for stop in order:
+        late = state[3]
+        state = sequencer.step(state, stop)
+        if state[3] > late:
+            late_stops.append(stop)
+    return Solution(order, cost, initial[0] + LATE_PENALTY * initial[3], moves,
+                    (time.perf_counter() - started) * 1000, late_stops)
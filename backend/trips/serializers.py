@@ -1,5 +1,10 @@
 from rest_framework import serializers
 from .models import Trip, Stop, RouteSegment
+from .breadcrumbs import DEFAULT_MAX_POINTS, MAX_BATCH_POINTS, parse_point
+from .routing import MAX_STOPS
+from .utils import HOSCalculator
+
+MAX_MATRIX_POINTS = 100  # Sources (and destinations) per matrix request
 
 
 class StopSerializer(serializers.ModelSerializer):
@@ -8,6 +13,7 @@ class StopSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'stop_type', 'location', 'latitude', 'longitude',
             'arrival_time', 'departure_time', 'duration',
+            'window_start', 'window_end', 'pinned',
             'distance_from_start', 'sequence'
         ]
 
@@ -39,15 +45,58 @@ class TripSerializer(serializers.ModelSerializer):
                            'estimated_driving_time', 'total_trip_time']
 
 
+class StopInputSerializer(serializers.Serializer):
+    """
+    Serializer for one pickup or dropoff of a multi-stop trip
+    """
+    location = serializers.CharField(max_length=255)
+    stop_type = serializers.ChoiceField(choices=['pickup', 'dropoff'], default='dropoff')
+    duration = serializers.FloatField(min_value=0, max_value=24, default=1.0, help_text="Hours on site")
+    position = serializers.IntegerField(min_value=0, required=False,
+                                        help_text="Fixed 0-based position in the route (default: optimized)")
+    window_start = serializers.DateTimeField(required=False)
+    window_end = serializers.DateTimeField(required=False)
+    
+    def validate(self, data):
+        if data.get('window_start') and data.get('window_end') and data['window_end'] <= data['window_start']:
+            raise serializers.ValidationError("'window_end' must be after 'window_start'.")
+        return data
+
+
 class TripInputSerializer(serializers.Serializer):
     """
     Serializer for trip calculation input
+
+    Either `pickup_location` and `dropoff_location`, or a list of `stops`
+    that is put in the best order (stops with a `position` keep it).
     """
     current_location = serializers.CharField(max_length=255)
-    pickup_location = serializers.CharField(max_length=255)
-    dropoff_location = serializers.CharField(max_length=255)
+    pickup_location = serializers.CharField(max_length=255, required=False)
+    dropoff_location = serializers.CharField(max_length=255, required=False)
+    stops = StopInputSerializer(many=True, required=False)
+    departure_time = serializers.DateTimeField(required=False, help_text="Default: now")
     current_cycle_hours = serializers.FloatField(min_value=0, max_value=70)
     trip_name = serializers.CharField(max_length=255, required=False)
+    
+    def validate(self, data):
+        stops = data.get('stops')
+        if not stops:
+            if not data.get('pickup_location') or not data.get('dropoff_location'):
+                raise serializers.ValidationError(
+                    "Provide 'pickup_location' and 'dropoff_location', or a list of 'stops'."
+                )
+            stops = data['stops'] = [
+                {'location': data['pickup_location'], 'stop_type': 'pickup',
+                 'duration': HOSCalculator.PICKUP_DURATION, 'position': 0},
+                {'location': data['dropoff_location'], 'stop_type': 'dropoff',
+                 'duration': HOSCalculator.DROPOFF_DURATION, 'position': 1},
+            ]
+        if len(stops) > MAX_STOPS:
+            raise serializers.ValidationError({'stops': f"At most {MAX_STOPS} stops."})
+        positions = [stop['position'] for stop in stops if stop.get('position') is not None]
+        if len(set(positions)) != len(positions) or any(position >= len(stops) for position in positions):
+            raise serializers.ValidationError({'stops': "Positions must be distinct and less than the number of stops."})
+        return data
 
 
 class GeocodingSerializer(serializers.Serializer):
@@ -63,4 +112,66 @@ class GeocodingSerializer(serializers.Serializer):
         # Accept either address, or lat/lng for reverse, or query for search
         if not data.get('address') and not (data.get('lat') and data.get('lng')) and not data.get('query'):
             raise serializers.ValidationError("Provide 'address' or 'lat'+'lng' or 'query'.")
-        return data
\ No newline at end of file
+        return data
+
+
+class MatrixSerializer(serializers.Serializer):
+    """
+    Serializer for travel matrix requests: [lat, lng] points
+    """
+    sources = serializers.ListField(
+        child=serializers.ListField(child=serializers.FloatField(), min_length=2, max_length=2),
+        allow_empty=False, max_length=MAX_MATRIX_POINTS,
+    )
+    destinations = serializers.ListField(
+        child=serializers.ListField(child=serializers.FloatField(), min_length=2, max_length=2),
+        allow_empty=False, max_length=MAX_MATRIX_POINTS, required=False,
+        help_text="Default: the sources",
+    )
+    
+    def validate(self, data):
+        for field in ('sources', 'destinations'):
+            for index, (lat, lng) in enumerate(data.get(field) or []):
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                    raise serializers.ValidationError({field: f"Point {index} is not a valid [lat, lng]."})
+        return data
+
+
+class BreadcrumbBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of GPS pings from one driver
+    """
+    user_id = serializers.IntegerField()
+    trip_id = serializers.IntegerField(required=False, allow_null=True)
+    points = serializers.ListField(allow_empty=False, max_length=MAX_BATCH_POINTS,
+                                   help_text="[time, lat, lng, speed?, heading?] per ping")
+    
+    def validate_points(self, value):
+        # Checked by hand: a nested serializer per ping is far too slow for large batches
+        parsed = []
+        for index, point in enumerate(value):
+            try:
+                parsed.append(parse_point(point))
+            except ValueError as e:
+                raise serializers.ValidationError(f"Point {index}: {e}")
+        return parsed
+
+
+class BreadcrumbQuerySerializer(serializers.Serializer):
+    """
+    Serializer for breadcrumb track query parameters
+    """
+    user_id = serializers.IntegerField(required=False)
+    trip_id = serializers.IntegerField(required=False)
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    mode = serializers.ChoiceField(choices=['bucket', 'simplify'], default='bucket')
+    max_points = serializers.IntegerField(min_value=2, max_value=20000, default=DEFAULT_MAX_POINTS)
+    tolerance = serializers.FloatField(min_value=0, required=False, help_text="Degrees (simplify mode)")
+    
+    def validate(self, data):
+        if data.get('user_id') is None and data.get('trip_id') is None:
+            raise serializers.ValidationError("Provide 'user_id' or 'trip_id'.")
+        if data['end'] <= data['start']:
+            raise serializers.ValidationError("'end' must be after 'start'.")
+        return data
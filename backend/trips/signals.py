@@ -0,0 +1,27 @@
+"""
+Announce trip changes to push subscribers
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from truck_driver_project.events import publish_on_commit
+from .models import Trip
+
+
+def _trip_event(trip):
+    return {
+        'trip_id': trip.id, 'user_id': trip.user_id, 'name': trip.name, 'status': trip.status,
+        'total_distance': trip.total_distance, 'total_trip_time': trip.total_trip_time,
+        'updated_at': trip.updated_at,
+    }
+
+
+@receiver(post_save, sender=Trip)
+def trip_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        publish_on_commit('trip.updated', _trip_event(instance))
+
+
+@receiver(post_delete, sender=Trip)
+def trip_deleted(sender, instance, **kwargs):
+    publish_on_commit('trip.deleted', {'trip_id': instance.id, 'user_id': instance.user_id})
@@ -0,0 +1,113 @@
+"""
+Token-bucket budgets for calls to Mapbox, shared by every worker through the database
+
+Each client (user, or IP address for anonymous requests) has its own bucket
+and all clients together draw on a global one sized to the Mapbox quota. A
+call needs a token from both; when either is empty the geocoding and
+directions services answer from their cache or from local data instead
+(see GeocodingService and DirectionsService in trips/utils.py).
+"""
+import time
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+from rest_framework.throttling import BaseThrottle
+
+from .models import TokenBucket
+
+GLOBAL_KEY = 'mapbox:global'
+
+
+def _refilled(rate, capacity, now):
+    """SQL expression for a bucket's balance at `now`."""
+    elapsed = Greatest(Value(now) - F('refilled_at'), Value(0.0))
+    return Least(Value(float(capacity)), F('tokens') + elapsed * Value(float(rate)))
+
+
+def take_tokens(key, rate, capacity, cost=1.0):
+    """
+    Spend `cost` tokens from bucket `key`, which holds at most `capacity`
+    tokens and refills at `rate` tokens per second
+
+    Returns:
+        True when the tokens were available (and are now spent)
+    """
+    now = time.time()
+    refilled = _refilled(rate, capacity, now)
+    for _ in range(2):
+        spent = TokenBucket.objects.filter(key=key).filter(GreaterThanOrEqual(refilled, cost)).update(
+            tokens=refilled - cost, refilled_at=Greatest(F('refilled_at'), Value(now)),
+        )
+        if spent:
+            return True
+        _, created = TokenBucket.objects.get_or_create(
+            key=key, defaults={'tokens': float(capacity), 'refilled_at': now},
+        )
+        if not created:
+            return False
+    return False
+
+
+def return_tokens(key, capacity, cost=1.0):
+    """Give back tokens taken for a call that was not made."""
+    TokenBucket.objects.filter(key=key).update(tokens=Least(Value(float(capacity)), F('tokens') + cost))
+
+
+def seconds_until(key, rate, capacity, cost=1.0):
+    """Seconds until bucket `key` holds `cost` tokens again."""
+    bucket = TokenBucket.objects.filter(key=key).values('tokens', 'refilled_at').first()
+    if bucket is None or rate <= 0:
+        return 0.0
+    balance = min(capacity, bucket['tokens'] + max(0.0, time.time() - bucket['refilled_at']) * rate)
+    return max(0.0, (cost - balance) / rate)
+
+
+class MapboxBudget:
+    """
+    The Mapbox call budget of one client
+
+    allow() takes a token from the client's bucket and from the global one;
+    a budget whose per-minute setting is 0 is not enforced.
+    """
+
+    def __init__(self, client):
+        self.buckets = [
+            (f"mapbox:client:{client}"[:150],
+             getattr(settings, 'MAPBOX_CLIENT_PER_MINUTE', 20) / 60.0,
+             getattr(settings, 'MAPBOX_CLIENT_BURST', 40)),
+            (GLOBAL_KEY,
+             getattr(settings, 'MAPBOX_GLOBAL_PER_MINUTE', 300) / 60.0,
+             getattr(settings, 'MAPBOX_GLOBAL_BURST', 300)),
+        ]
+        self.exhausted = None  # Key of the bucket that last refused a call
+
+    @classmethod
+    def for_request(cls, request):
+        """Budget of the client making `request`: its user, or its IP address when anonymous."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return cls(f"user:{user.pk}")
+        return cls(f"ip:{BaseThrottle().get_ident(request)}")
+
+    def allow(self, cost=1.0):
+        taken = []
+        for key, rate, capacity in self.buckets:
+            if rate <= 0:
+                continue
+            if not take_tokens(key, rate, capacity, cost):
+                for taken_key, taken_capacity in taken:
+                    return_tokens(taken_key, taken_capacity, cost)
+                self.exhausted = key
+                return False
+            taken.append((key, capacity))
+        self.exhausted = None
+        return True
+
+    def retry_after(self):
+        """Seconds until the bucket that refused the last call can pay for one again."""
+        for key, rate, capacity in self.buckets:
+            if key == self.exhausted:
+                return seconds_until(key, rate, capacity)
+        return 0.0
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TripViewSet, GeocodingView, MapboxTokenView
+from .views import TripViewSet, GeocodingView, MatrixView, MapboxTokenView, BreadcrumbView
 
 router = DefaultRouter()
 router.register(r'trips', TripViewSet)
@@ -8,5 +8,7 @@ router.register(r'trips', TripViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('geocoding/', GeocodingView.as_view(), name='geocoding'),
+    path('matrix/', MatrixView.as_view(), name='matrix'),
+    path('breadcrumbs/', BreadcrumbView.as_view(), name='breadcrumbs'),
     path('mapbox-token/', MapboxTokenView.as_view(), name='mapbox-token'),
 ]
\ No newline at end of file
@@ -1,13 +1,18 @@
 """
 Utility functions for trip planning, HOS compliance, and Mapbox-powered geocoding/directions
+
+requests and geopy are imported inside the functions that use them, which
+keeps them off the import path of every (cold-started) request.
 """
+import collections
+import hashlib
 import math
 import datetime
 from typing import List, Tuple
 
-import requests
 from django.conf import settings
-from geopy.distance import geodesic
+from django.core.cache import cache
+from django.db.models import Q
 
 
 class HOSCalculator:
@@ -130,16 +135,276 @@ class HOSCalculator:
             'cycle_hours_remaining': available_cycle_hours - driving_time,
         }
 
+    @staticmethod
+    def plan_legs(legs, current_cycle_hours):
+        """
+        Plan a multi-stop trip with HOS compliance, leg by leg
+
+        Drives each leg on a DutyClock, so breaks, fuel stops and 10-hour rests
+        fall where the hours actually run out rather than being spread evenly.
+
+        Args:
+            legs: One dict per leg, in driving order, with 'distance_miles',
+                'duration_hours' (driving), and for the stop it ends at
+                'stop_type', 'service_hours' and optional 'window_start' /
+                'window_end' (hours after departure)
+            current_cycle_hours: Hours already used in current 8-day cycle
+
+        Returns:
+            Dictionary with the plan_trip() keys plus 'arrivals' (hours after
+            departure, per leg), 'late_stops' (indexes of legs whose stop is
+            reached after its window) and 'events': (type, leg index, fraction
+            of the leg driven, hours after departure) per break, fuel stop and rest
+        """
+        distance_miles = sum(leg['distance_miles'] for leg in legs)
+        driving_time = sum(leg['duration_hours'] for leg in legs)
+        available_cycle_hours = HOSCalculator.WEEKLY_LIMIT - current_cycle_hours
+        if driving_time > available_cycle_hours:
+            return {
+                'feasible': False,
+                'reason': 'Trip exceeds available cycle hours',
+                'available_hours': available_cycle_hours,
+                'required_hours': driving_time,
+            }
+
+        clock = DutyClock(events=[])
+        arrivals, late_stops = [], []
+        service = {'pickup': 0.0, 'dropoff': 0.0}
+        for index, leg in enumerate(legs):
+            clock.leg = index
+            clock.drive(leg['duration_hours'], leg['distance_miles'])
+            if leg.get('window_start') is not None:
+                clock.wait_until(leg['window_start'])
+            arrivals.append(clock.hours)
+            if leg.get('window_end') is not None and clock.hours > leg['window_end']:
+                late_stops.append(index)
+            stop_type, service_hours = leg.get('stop_type', 'dropoff'), leg.get('service_hours', 0.0)
+            clock.work(service_hours)
+            service[stop_type] = service.get(stop_type, 0.0) + service_hours
+
+        counts = collections.Counter(event[0] for event in clock.events)
+        break_time = counts['break'] * HOSCalculator.BREAK_DURATION
+        fuel_stop_time = counts['fuel'] * HOSCalculator.FUEL_STOP_DURATION
+        rest_time = counts['rest'] * HOSCalculator.REQUIRED_REST_PERIOD
+        return {
+            'feasible': True,
+            'distance_miles': distance_miles,
+            'driving_time': driving_time,
+            'break_count': counts['break'],
+            'break_time': break_time,
+            'fuel_stops': counts['fuel'],
+            'fuel_stop_time': fuel_stop_time,
+            'rest_periods': counts['rest'],
+            'rest_time': rest_time,
+            'pickup_time': service['pickup'],
+            'dropoff_time': service['dropoff'],
+            'wait_time': clock.waited,
+            'total_trip_time': clock.hours,
+            'driving_days': counts['rest'] + 1,
+            'cycle_hours_used': driving_time,
+            'cycle_hours_remaining': available_cycle_hours - driving_time,
+            'stop_count': len(legs),
+            'arrivals': arrivals,
+            'late_stops': late_stops,
+            'events': clock.events,
+        }
+
+
+class DutyClock:
+    """
+    Hours-of-service clock for one driver, from departure (hour 0)
+
+    drive() takes a 30-minute break after 8 hours of driving, a fuel stop
+    every FUEL_STOP_INTERVAL miles, and a 10-hour rest whenever the 11-hour
+    driving limit or the 14-hour duty window runs out. With an `events` list
+    each of those is recorded as (type, leg, fraction of the leg, hours).
+    """
+    __slots__ = ('hours', 'day_driving', 'day_duty', 'since_break', 'miles', 'waited', 'leg', 'events')
+
+    def __init__(self, events=None):
+        self.hours = 0.0
+        self.day_driving = self.day_duty = self.since_break = 0.0
+        self.miles = 0.0  # Since the last fuel stop
+        self.waited = 0.0
+        self.leg = 0
+        self.events = events
+
+    def _record(self, kind, fraction):
+        if self.events is not None:
+            self.events.append((kind, self.leg, fraction, self.hours))
+
+    def rest(self, fraction=1.0):
+        self._record('rest', fraction)
+        self.hours += HOSCalculator.REQUIRED_REST_PERIOD
+        self.day_driving = self.day_duty = self.since_break = 0.0
+
+    def drive(self, hours, miles=0.0):
+        total, speed = hours, (miles / hours if hours else 0.0)
+        while hours > 1e-9:
+            room = min(HOSCalculator.DAILY_DRIVING_LIMIT - self.day_driving,
+                       HOSCalculator.DAILY_DUTY_WINDOW - self.day_duty)
+            if room <= 1e-9:
+                self.rest(1.0 - hours / total)
+                continue
+            if HOSCalculator.BREAK_AFTER_DRIVING - self.since_break <= 1e-9:
+                self._record('break', 1.0 - hours / total)
+                self.hours += HOSCalculator.BREAK_DURATION
+                self.day_duty += HOSCalculator.BREAK_DURATION
+                self.since_break = 0.0
+                continue
+            step = min(hours, room, HOSCalculator.BREAK_AFTER_DRIVING - self.since_break)
+            if speed and self.miles + step * speed >= HOSCalculator.FUEL_STOP_INTERVAL:
+                step = (HOSCalculator.FUEL_STOP_INTERVAL - self.miles) / speed
+                self._advance(step)
+                hours -= step
+                self._record('fuel', 1.0 - hours / total)
+                self.miles = 0.0
+                self.work(HOSCalculator.FUEL_STOP_DURATION, 1.0 - hours / total)
+                continue
+            self._advance(step)
+            self.miles += step * speed
+            hours -= step
+
+    def _advance(self, hours):
+        self.hours += hours
+        self.day_driving += hours
+        self.day_duty += hours
+        self.since_break += hours
+
+    def work(self, hours, fraction=1.0):
+        """On duty, not driving (pickups, deliveries, fueling)."""
+        if hours <= 0:
+            return
+        if self.day_duty + hours > HOSCalculator.DAILY_DUTY_WINDOW:
+            self.rest(fraction)
+        self.hours += hours
+        self.day_duty += hours
+        if hours >= HOSCalculator.BREAK_DURATION:
+            self.since_break = 0.0
+
+    def wait_until(self, hours):
+        """Off duty until `hours` after departure (early for a time window)."""
+        wait = hours - self.hours
+        if wait <= 0:
+            return
+        self.waited += wait
+        self.hours = hours
+        if wait >= HOSCalculator.REQUIRED_REST_PERIOD:
+            self.day_driving = self.day_duty = self.since_break = 0.0
+        else:
+            self.day_duty += wait
+            if wait >= HOSCalculator.BREAK_DURATION:
+                self.since_break = 0.0
+
+
+def _cache_key(kind, *parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f"mapbox:{kind}:{digest}"
+
+
+def _budgeted_call(token, budget, key, call, fallback):
+    """
+    Return a Mapbox result from the cache, or from `call` when the budget
+    allows one more upstream request, or else from `fallback`
+
+    Successful upstream results are cached for MAPBOX_CACHE_TIMEOUT seconds.
+    """
+    if not token:
+        return call()  # Reports the missing key
+    result = cache.get(key)
+    if result is not None:
+        return result
+    if budget is not None and not budget.allow():
+        result = fallback()
+        result.setdefault('degraded', True)
+        if not result['success']:
+            result['error'] = 'Map lookups are rate limited right now; try again shortly'
+            result['retry_after'] = math.ceil(budget.retry_after())
+        return result
+    result = call()
+    if result['success']:
+        cache.set(key, result, getattr(settings, 'MAPBOX_CACHE_TIMEOUT', 24 * 60 * 60))
+    return result
+
+
+def _known_locations(q, limit):
+    """
+    Up to `limit` distinct (name, lat, lng) locations saved on trips whose
+    name matches `q`, a function of the location field returning a Q object
+    """
+    from .models import Trip
+
+    found = {}
+    for field in ('pickup_location', 'dropoff_location', 'current_location'):
+        rows = Trip.objects.filter(q(field)).order_by('-id').values_list(
+            field, f"{field}_lat", f"{field}_lng"
+        )[:limit]
+        for name, lat, lng in rows:
+            found.setdefault(name, (name, lat, lng))
+    return list(found.values())[:limit]
+
 
 class GeocodingService:
     """
     Mapbox-based geocoding/search service with graceful fallback messages
+
+    With a budget (trips.throttling.MapboxBudget), lookups the budget cannot
+    pay for are answered from locations already saved on trips.
     """
 
-    def __init__(self):
+    def __init__(self, budget=None):
         self.token = getattr(settings, 'MAP_API_KEY', '')
+        self.budget = budget
 
     def geocode(self, address):
+        return _budgeted_call(
+            self.token, self.budget, _cache_key('geocode', address.strip().lower()),
+            lambda: self._geocode(address), lambda: self.local_geocode(address),
+        )
+
+    def reverse(self, latitude, longitude):
+        return _budgeted_call(
+            self.token, self.budget, _cache_key('reverse', round(latitude, 5), round(longitude, 5)),
+            lambda: self._reverse(latitude, longitude),
+            lambda: {'success': True, 'latitude': latitude, 'longitude': longitude,
+                     'address': f"{latitude},{longitude}"},
+        )
+
+    def search(self, query, limit=5):
+        return _budgeted_call(
+            self.token, self.budget, _cache_key('search', query.strip().lower(), int(limit)),
+            lambda: self._search(query, limit), lambda: self.local_search(query, limit),
+        )
+
+    @staticmethod
+    def local_geocode(address):
+        """Geocode `address` from a location saved on a trip, or from a literal "lat,lng"."""
+        try:
+            lat, lng = (float(part) for part in address.split(','))
+            if -90 <= lat <= 90 and -180 <= lng <= 180:
+                return {'success': True, 'latitude': lat, 'longitude': lng, 'address': address}
+        except ValueError:
+            pass
+        wanted = address.strip()
+        for name, lat, lng in _known_locations(
+            lambda field: Q(**{f"{field}__iexact": wanted}) | Q(**{f"{field}__istartswith": f"{wanted},"}), 1
+        ):
+            return {'success': True, 'latitude': lat, 'longitude': lng, 'address': name}
+        return {'success': False, 'error': 'Location not found'}
+
+    @staticmethod
+    def local_search(query, limit=5):
+        """Search locations saved on trips whose name contains `query`."""
+        wanted = query.strip()
+        items = [
+            {'address': name, 'latitude': lat, 'longitude': lng}
+            for name, lat, lng in _known_locations(lambda field: Q(**{f"{field}__icontains": wanted}), int(limit))
+        ]
+        return {'success': True, 'results': items}
+
+    def _geocode(self, address):
+        import requests
+
         try:
             if not self.token:
                 return {'success': False, 'error': 'Map API key missing'}
@@ -163,7 +428,9 @@ class GeocodingService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def reverse(self, latitude, longitude):
+    def _reverse(self, latitude, longitude):
+        import requests
+
         try:
             if not self.token:
                 return {'success': False, 'error': 'Map API key missing'}
@@ -186,7 +453,9 @@ class GeocodingService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def search(self, query, limit=5):
+    def _search(self, query, limit=5):
+        import requests
+
         try:
             if not self.token:
                 return {'success': False, 'error': 'Map API key missing', 'results': []}
@@ -212,14 +481,23 @@ class GeocodingService:
     @staticmethod
     def calculate_distance(origin: Tuple[float, float], destination: Tuple[float, float]):
         """Great-circle distance (miles) as a fallback utility"""
+        from geopy.distance import geodesic
+
         return geodesic(origin, destination).miles
 
 
 class DirectionsService:
-    """Mapbox Directions wrapper returning geojson coordinates and summary."""
+    """
+    Mapbox Directions wrapper returning geojson coordinates and summary.
 
-    def __init__(self):
+    With a budget (trips.throttling.MapboxBudget), routes the budget cannot
+    pay for are estimated locally as a straight line (see straight_line_route).
+    """
+    ROAD_FACTOR = 1.2  # Road miles per great-circle mile, for estimated routes
+
+    def __init__(self, budget=None):
         self.token = getattr(settings, 'MAP_API_KEY', '')
+        self.budget = budget
 
     def route(self, origin: Tuple[float, float], destination: Tuple[float, float]):
         """
@@ -228,7 +506,30 @@ class DirectionsService:
         - distance_miles: float
         - duration_hours: float
         - coordinates: List[[lat, lng], ...]  (geojson order is [lng, lat], we'll convert)
+        - degraded: True when the route is a local estimate, not from Mapbox
         """
+        return _budgeted_call(
+            self.token, self.budget,
+            _cache_key('route', *(round(value, 5) for value in (*origin, *destination))),
+            lambda: self._route(origin, destination), lambda: self.straight_line_route(origin, destination),
+        )
+
+    @classmethod
+    def straight_line_route(cls, origin: Tuple[float, float], destination: Tuple[float, float]):
+        """Estimate a route from the great-circle distance at HOSCalculator.AVERAGE_SPEED."""
+        lat1, lng1, lat2, lng2 = map(math.radians, (*origin, *destination))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        miles = 3958.8 * 2 * math.asin(math.sqrt(a)) * cls.ROAD_FACTOR
+        return {
+            'success': True,
+            'distance_miles': miles,
+            'duration_hours': miles / HOSCalculator.AVERAGE_SPEED,
+            'coordinates': [list(origin), list(destination)],
+        }
+
+    def _route(self, origin: Tuple[float, float], destination: Tuple[float, float]):
+        import requests
+
         try:
             if not self.token:
                 return {'success': False, 'error': 'Map API key missing'}
@@ -260,7 +561,21 @@ class DirectionsService:
             return {'success': False, 'error': str(e)}
 
 
+def round_coordinates(coords, precision=None):
+    """
+    Round a list of [lat, lng] pairs to a fixed number of decimal places.
+
+    Shorter float literals shrink large route payloads considerably; the
+    default precision comes from settings.ROUTE_COORDINATE_PRECISION.
+    """
+    if precision is None:
+        precision = getattr(settings, 'ROUTE_COORDINATE_PRECISION', 5)
+    return [[round(lat, precision), round(lng, precision)] for lat, lng in coords]
+
+
 def _total_length_miles(coords: List[Tuple[float, float]]) -> float:
+    from geopy.distance import geodesic
+
     total = 0.0
     for i in range(1, len(coords)):
         total += geodesic(coords[i - 1], coords[i]).miles
@@ -271,6 +586,8 @@ def interpolate_along_linestring(coords: List[Tuple[float, float]], fraction: fl
     """
     Return a coordinate at the given fraction [0,1] along a linestring, by distance.
     """
+    from geopy.distance import geodesic
+
     if not coords:
         return None
     fraction = max(0.0, min(1.0, fraction))
@@ -286,4 +603,157 @@ def interpolate_along_linestring(coords: List[Tuple[float, float]], fraction: fl
             lng = coords[i - 1][1] + (coords[i][1] - coords[i - 1][1]) * t
             return (lat, lng)
         acc += seg_len
-    return coords[-1]
\ No newline at end of file
+    return coords[-1]
+
+
+def simplify_linestring(coords: List[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    """
+    Douglas-Peucker simplification of a [lat, lng] linestring.
+
+    `tolerance` is in degrees; points closer than that to the simplified line
+    are dropped. Uses an explicit stack so very long routes do not hit the
+    recursion limit.
+    """
+    n = len(coords)
+    if n < 3 or tolerance <= 0:
+        return list(coords)
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    tol_sq = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = coords[first]
+        bx, by = coords[last]
+        dx, dy = bx - ax, by - ay
+        seg_len_sq = dx * dx + dy * dy
+        max_dist_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = coords[i]
+            if seg_len_sq == 0:
+                dist_sq = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = ((px - ax) * dx + (py - ay) * dy) / seg_len_sq
+                t = max(0.0, min(1.0, t))
+                qx, qy = ax + t * dx - px, ay + t * dy - py
+                dist_sq = qx * qx + qy * qy
+            if dist_sq > max_dist_sq:
+                max_dist_sq, index = dist_sq, i
+        if max_dist_sq > tol_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [c for c, k in zip(coords, keep) if k]
+
+
+def douglas_peucker_ranks(coords: List[Tuple[float, float]]) -> List[float]:
+    """
+    Rank the points of a [lat, lng] linestring by Douglas-Peucker significance.
+
+    Returns, for each point, the largest tolerance (degrees) at which
+    simplify_linestring would still keep it (endpoints rank infinite). A
+    single pass therefore answers both "simplify to tolerance t" (keep ranks
+    above t) and "simplify to at most n points" (keep the n highest ranks).
+    """
+    n = len(coords)
+    ranks = [0.0] * n
+    if n:
+        ranks[0] = ranks[-1] = math.inf
+    stack = [(0, n - 1, math.inf)] if n > 2 else []
+    while stack:
+        first, last, cap = stack.pop()
+        ax, ay = coords[first]
+        bx, by = coords[last]
+        dx, dy = bx - ax, by - ay
+        seg_len_sq = dx * dx + dy * dy
+        max_dist_sq = 0.0
+        index = None
+        for i in range(first + 1, last):
+            px, py = coords[i]
+            if seg_len_sq == 0:
+                dist_sq = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = ((px - ax) * dx + (py - ay) * dy) / seg_len_sq
+                t = max(0.0, min(1.0, t))
+                qx, qy = ax + t * dx - px, ay + t * dy - py
+                dist_sq = qx * qx + qy * qy
+            if dist_sq > max_dist_sq:
+                max_dist_sq, index = dist_sq, i
+        if index is not None:
+            # A point is only kept if the split that exposed it was kept
+            rank = min(math.sqrt(max_dist_sq), cap)
+            ranks[index] = rank
+            if index - first > 1:
+                stack.append((first, index, rank))
+            if last - index > 1:
+                stack.append((index, last, rank))
+    return ranks
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Return (min_lat, min_lng, max_lat, max_lng) of a Web Mercator z/x/y tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def tile_tolerance(z: int, pixels: float = 1.0) -> float:
+    """Simplification tolerance (degrees) matching `pixels` on a 256px tile at zoom z."""
+    return pixels * 360.0 / (256 * 2 ** z)
+
+
+def clip_linestring(coords: List[Tuple[float, float]], bounds) -> List[List[Tuple[float, float]]]:
+    """
+    Clip a [lat, lng] linestring to a (min_lat, min_lng, max_lat, max_lng) box.
+
+    Returns the list of pieces that fall inside the box (Liang-Barsky per
+    segment, with contiguous pieces joined back together).
+    """
+    min_lat, min_lng, max_lat, max_lng = bounds
+    pieces = []
+    current = []
+    for i in range(1, len(coords)):
+        (y0, x0), (y1, x1) = coords[i - 1], coords[i]
+        dx, dy = x1 - x0, y1 - y0
+        t0, t1 = 0.0, 1.0
+        inside = True
+        for p, q in ((-dx, x0 - min_lng), (dx, max_lng - x0), (-dy, y0 - min_lat), (dy, max_lat - y0)):
+            if p == 0:
+                if q < 0:
+                    inside = False
+                    break
+                continue
+            r = q / p
+            if p < 0:
+                if r > t1:
+                    inside = False
+                    break
+                t0 = max(t0, r)
+            else:
+                if r < t0:
+                    inside = False
+                    break
+                t1 = min(t1, r)
+        if not inside:
+            if len(current) > 1:
+                pieces.append(current)
+            current = []
+            continue
+        start = (y0 + t0 * dy, x0 + t0 * dx)
+        end = (y0 + t1 * dy, x0 + t1 * dx)
+        if not current or current[-1] != start:
+            if len(current) > 1:
+                pieces.append(current)
+            current = [start]
+        current.append(end)
+        if t1 < 1.0:
+            pieces.append(current)
+            current = []
+    if len(current) > 1:
+        pieces.append(current)
+    return pieces
@@ -4,13 +4,24 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from .models import Trip, Stop, RouteSegment
 from .serializers import (
     TripSerializer, TripInputSerializer, 
     StopSerializer, RouteSegmentSerializer,
-    GeocodingSerializer
+    GeocodingSerializer, MatrixSerializer, BreadcrumbBatchSerializer, BreadcrumbQuerySerializer
+)
+from .breadcrumbs import breadcrumb_track, record_breadcrumbs
+from .routing import solve
+from .throttling import MapboxBudget
+from .utils import (
+    HOSCalculator, GeocodingService, DirectionsService,
+    interpolate_along_linestring, round_coordinates,
+    simplify_linestring, clip_linestring, tile_bounds, tile_tolerance
 )
-from .utils import HOSCalculator, GeocodingService, DirectionsService, interpolate_along_linestring
 import datetime
 import json
 
@@ -34,53 +45,89 @@ class TripViewSet(viewsets.ModelViewSet):
     def calculate(self, request):
         """
         Calculate a trip with HOS compliance
+
+        Accepts pickup_location and dropoff_location, or a list of stops that
+        is put in the order finishing the trip soonest (trips/routing.py);
+        stops with a position keep it, and time windows are respected where
+        possible. The HOS plan then drives the chosen legs one by one.
         """
         serializer = TripInputSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        requested = data['stops']
+        if serializer.initial_data.get('stops'):
+            fields = [f"stops[{index}]" for index in range(len(requested))]
+        else:
+            fields = ['pickup_location', 'dropoff_location']
         
-        # Get geocoding service
-        geocoding_service = GeocodingService()
+        # Get geocoding service; Mapbox calls are paid for from the client's budget
+        budget = MapboxBudget.for_request(request)
+        geocoding_service = GeocodingService(budget)
         
         # Geocode locations
-        current_location = geocoding_service.geocode(serializer.validated_data['current_location'])
-        pickup_location = geocoding_service.geocode(serializer.validated_data['pickup_location'])
-        dropoff_location = geocoding_service.geocode(serializer.validated_data['dropoff_location'])
+        current_location = geocoding_service.geocode(data['current_location'])
+        stop_locations = [geocoding_service.geocode(stop['location']) for stop in requested]
         
         # Check if geocoding was successful
-        if not all([current_location['success'], pickup_location['success'], dropoff_location['success']]):
-            errors = {}
-            if not current_location['success']:
-                errors['current_location'] = current_location['error']
-            if not pickup_location['success']:
-                errors['pickup_location'] = pickup_location['error']
-            if not dropoff_location['success']:
-                errors['dropoff_location'] = dropoff_location['error']
+        errors = {}
+        if not current_location['success']:
+            errors['current_location'] = current_location['error']
+        for field, location in zip(fields, stop_locations):
+            if not location['success']:
+                errors[field] = location['error']
+        if errors:
+            retry_after = max(location.get('retry_after', 0) for location in [current_location, *stop_locations])
+            if retry_after:
+                return Response({'errors': errors}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                                headers={'Retry-After': str(retry_after)})
             return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Directions via Mapbox for precise routing
-        directions = DirectionsService()
-        leg1 = directions.route(
-            (current_location['latitude'], current_location['longitude']),
-            (pickup_location['latitude'], pickup_location['longitude'])
-        )
-        leg2 = directions.route(
-            (pickup_location['latitude'], pickup_location['longitude']),
-            (dropoff_location['latitude'], dropoff_location['longitude'])
-        )
-        if not leg1.get('success') or not leg2.get('success'):
-            err = leg1.get('error') or leg2.get('error') or 'Routing failed'
-            return Response({'errors': {'routing': err}}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_distance = (leg1['distance_miles'] + leg2['distance_miles'])
-        total_driving_hours = (leg1['duration_hours'] + leg2['duration_hours'])
-
-        # Calculate HOS plan using actual driving time
-        hos_plan = HOSCalculator.plan_trip(
-            total_distance,
-            serializer.validated_data['current_cycle_hours'],
-            driving_time_override=total_driving_hours,
+        # Order the stops over the travel matrix (imported here: NumPy stays off the cold-start path)
+        from .matrix import MatrixService
+        
+        departure = data.get('departure_time') or timezone.now()
+        
+        def hours_after_departure(moment):
+            return None if moment is None else (moment - departure).total_seconds() / 3600
+        
+        points = [(location['latitude'], location['longitude']) for location in [current_location, *stop_locations]]
+        matrix = MatrixService(budget).matrix(points)
+        windows = [
+            (hours_after_departure(stop.get('window_start')), hours_after_departure(stop.get('window_end')))
+            for stop in requested
+        ]
+        solution = solve(
+            matrix.durations.tolist(),
+            [stop['duration'] for stop in requested],
+            windows,
+            {index: stop['position'] for index, stop in enumerate(requested) if stop.get('position') is not None},
         )
+        
+        # Directions via Mapbox for precise routing of each leg (a straight-line estimate when over budget)
+        directions = DirectionsService(budget)
+        legs = []
+        previous = points[0]
+        for index in solution.order:
+            leg = directions.route(previous, points[index + 1])
+            if not leg.get('success'):
+                err = leg.get('error') or 'Routing failed'
+                return Response({'errors': {'routing': err}}, status=status.HTTP_400_BAD_REQUEST)
+            legs.append(leg)
+            previous = points[index + 1]
+
+        # Calculate HOS plan across all legs using actual driving times
+        hos_plan = HOSCalculator.plan_legs([
+            {
+                'distance_miles': leg['distance_miles'],
+                'duration_hours': leg['duration_hours'],
+                'stop_type': requested[index]['stop_type'],
+                'service_hours': requested[index]['duration'],
+                'window_start': windows[index][0],
+                'window_end': windows[index][1],
+            }
+            for index, leg in zip(solution.order, legs)
+        ], data['current_cycle_hours'])
 
         if not hos_plan['feasible']:
             return Response({
@@ -90,148 +137,233 @@ class TripViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         # If authenticated, persist the trip. Otherwise, return a non-persistent plan
+        first_location = stop_locations[solution.order[0]]
+        last_location = stop_locations[solution.order[-1]]
         trip_data = {
-            'name': serializer.validated_data.get('trip_name', f"Trip to {dropoff_location['address']}") or f"Trip to {dropoff_location['address']}",
+            'name': data.get('trip_name') or f"Trip to {last_location['address']}",
             'status': 'planned',
             'current_location': current_location['address'],
             'current_location_lat': current_location['latitude'],
             'current_location_lng': current_location['longitude'],
-            'pickup_location': pickup_location['address'],
-            'pickup_location_lat': pickup_location['latitude'],
-            'pickup_location_lng': pickup_location['longitude'],
-            'dropoff_location': dropoff_location['address'],
-            'dropoff_location_lat': dropoff_location['latitude'],
-            'dropoff_location_lng': dropoff_location['longitude'],
-            'current_cycle_hours': serializer.validated_data['current_cycle_hours'],
-            'total_distance': total_distance,
-            'estimated_driving_time': total_driving_hours,
+            'pickup_location': first_location['address'],
+            'pickup_location_lat': first_location['latitude'],
+            'pickup_location_lng': first_location['longitude'],
+            'dropoff_location': last_location['address'],
+            'dropoff_location_lat': last_location['latitude'],
+            'dropoff_location_lng': last_location['longitude'],
+            'current_cycle_hours': data['current_cycle_hours'],
+            'total_distance': hos_plan['distance_miles'],
+            'estimated_driving_time': hos_plan['driving_time'],
             'total_trip_time': hos_plan['total_trip_time'],
         }
 
-        if request.user and request.user.is_authenticated:
-            trip = Trip.objects.create(user=request.user, **trip_data)
-        else:
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            public_user, _ = User.objects.get_or_create(username='public')
-            trip = Trip.objects.create(user=public_user, **trip_data)
-
-        # Build precise stops (pickup, dropoff + HOS breaks/rests interpolated on leg2)
-        stops = []
-        seq = 1
-        # Pickup stop at exact pickup point
-        pick_stop = Stop.objects.create(
-            trip=trip,
-            stop_type='pickup',
-            location=pickup_location['address'],
-            latitude=pickup_location['latitude'],
-            longitude=pickup_location['longitude'],
-            arrival_time=datetime.datetime.utcnow(),
-            departure_time=None,
-            duration=HOSCalculator.PICKUP_DURATION,
-            distance_from_start=geocoding_service.calculate_distance(
-                (current_location['latitude'], current_location['longitude']),
-                (pickup_location['latitude'], pickup_location['longitude'])
-            ),
-            sequence=seq,
-        )
-        stops.append(pick_stop)
-        seq += 1
-
-        # Interpolate markers for breaks and rest periods along pickup->dropoff route
-        leg2_coords = [(lat, lng) for lat, lng in leg2['coordinates']]
-        total_leg2_miles = geocoding_service.calculate_distance(
-            (pickup_location['latitude'], pickup_location['longitude']),
-            (dropoff_location['latitude'], dropoff_location['longitude'])
-        )
+        with transaction.atomic():
+            if request.user and request.user.is_authenticated:
+                trip = Trip.objects.create(user=request.user, **trip_data)
+            else:
+                from django.contrib.auth import get_user_model
+                User = get_user_model()
+                public_user, _ = User.objects.get_or_create(username='public')
+                trip = Trip.objects.create(user=public_user, **trip_data)
+            trip_stops = self._plan_stops(trip, solution.order, requested, stop_locations, legs, hos_plan, departure)
+            Stop.objects.bulk_create(trip_stops)
 
-        # Breaks
-        breaks = max(0, hos_plan.get('break_count') or 0)
-        for i in range(1, breaks + 1):
-            frac = i / (breaks + 1)
-            lat, lng = interpolate_along_linestring(leg2_coords, frac)
-            s = Stop.objects.create(
-                trip=trip,
-                stop_type='break',
-                location=f"Break at {lat:.5f},{lng:.5f}",
-                latitude=lat,
-                longitude=lng,
-                arrival_time=datetime.datetime.utcnow(),
-                departure_time=None,
-                duration=HOSCalculator.BREAK_DURATION,
-                distance_from_start=pick_stop.distance_from_start + (total_leg2_miles * frac),
-                sequence=seq,
-            )
-            stops.append(s)
-            seq += 1
-
-        # Rests
-        rests = max(0, hos_plan.get('rest_periods') or 0)
-        for i in range(1, rests + 1):
-            frac = i / (rests + 1)
-            lat, lng = interpolate_along_linestring(leg2_coords, frac)
-            s = Stop.objects.create(
-                trip=trip,
-                stop_type='rest',
-                location=f"Rest at {lat:.5f},{lng:.5f}",
-                latitude=lat,
-                longitude=lng,
-                arrival_time=datetime.datetime.utcnow(),
-                departure_time=None,
-                duration=HOSCalculator.REQUIRED_REST_PERIOD,
-                distance_from_start=pick_stop.distance_from_start + (total_leg2_miles * frac),
-                sequence=seq,
-            )
-            stops.append(s)
-            seq += 1
-
-        # Dropoff
-        drop_stop = Stop.objects.create(
-            trip=trip,
-            stop_type='dropoff',
-            location=dropoff_location['address'],
-            latitude=dropoff_location['latitude'],
-            longitude=dropoff_location['longitude'],
-            arrival_time=datetime.datetime.utcnow(),
-            departure_time=None,
-            duration=HOSCalculator.DROPOFF_DURATION,
-            distance_from_start=trip.total_distance,
-            sequence=seq,
-        )
-        stops.append(drop_stop)
-
-        # Create route segments with polylines (as raw coordinates JSON for simplicity)
-        RouteSegment.objects.create(
-            trip=trip,
-            start_stop=pick_stop,
-            end_stop=drop_stop,
-            distance=leg2['distance_miles'],
-            estimated_time=leg2['duration_hours'],
-            polyline=json.dumps(leg2['coordinates']),
-            sequence=1,
-        )
+            # Create route segments with polylines (as raw coordinates JSON for simplicity)
+            # between consecutive pickups/dropoffs
+            ends = [stop for stop in trip_stops if stop.stop_type in ('pickup', 'dropoff')]
+            RouteSegment.objects.bulk_create([
+                RouteSegment(
+                    trip=trip,
+                    start_stop=start,
+                    end_stop=end,
+                    distance=leg['distance_miles'],
+                    estimated_time=leg['duration_hours'],
+                    polyline=json.dumps(round_coordinates(leg['coordinates'])),
+                    sequence=sequence,
+                )
+                for sequence, (start, end, leg) in enumerate(zip(ends, ends[1:], legs[1:]), start=1)
+            ])
 
         response_trip = TripSerializer(trip).data
 
+        route_legs = []
+        previous = current_location
+        for index, leg in zip(solution.order, legs):
+            route_legs.append({
+                'from': previous['address'],
+                'to': stop_locations[index]['address'],
+                'stop_index': index,
+                'distance_miles': leg['distance_miles'],
+                'duration_hours': leg['duration_hours'],
+                'coordinates': round_coordinates(leg['coordinates']),
+            })
+            previous = stop_locations[index]
+
         return Response({
             'success': True,
             'trip_id': trip.id,
             'trip': response_trip,
             'hos_plan': hos_plan,
+            'optimization': {**solution.as_dict(), 'matrix': matrix.summary()},
+            'degraded': any(result.get('degraded', False) for result in [current_location, *stop_locations, *legs]),
             'route': {
                 'current_to_pickup': {
-                    'distance_miles': leg1['distance_miles'],
-                    'duration_hours': leg1['duration_hours'],
-                    'coordinates': leg1['coordinates'],
+                    'distance_miles': route_legs[0]['distance_miles'],
+                    'duration_hours': route_legs[0]['duration_hours'],
+                    'coordinates': route_legs[0]['coordinates'],
                 },
+                # Every leg after the first pickup, joined (just pickup -> dropoff for two stops)
                 'pickup_to_dropoff': {
-                    'distance_miles': leg2['distance_miles'],
-                    'duration_hours': leg2['duration_hours'],
-                    'coordinates': leg2['coordinates'],
+                    'distance_miles': sum(leg['distance_miles'] for leg in route_legs[1:]),
+                    'duration_hours': sum(leg['duration_hours'] for leg in route_legs[1:]),
+                    'coordinates': [point for leg in route_legs[1:] for point in leg['coordinates']],
                 },
+                'legs': route_legs,
             },
         })
 
+    @staticmethod
+    def _plan_stops(trip, order, requested, stop_locations, legs, hos_plan, departure):
+        """
+        Unsaved Stops for a calculated trip: each pickup/dropoff in route order,
+        preceded by the breaks, fuel stops and rests the HOS plan puts on the
+        leg leading to it (placed at their fraction of the leg's geometry)
+        """
+        labels = {'break': 'Break', 'fuel': 'Fuel', 'rest': 'Rest'}
+        durations = {
+            'break': HOSCalculator.BREAK_DURATION,
+            'fuel': HOSCalculator.FUEL_STOP_DURATION,
+            'rest': HOSCalculator.REQUIRED_REST_PERIOD,
+        }
+        events_by_leg = {}
+        for kind, leg_index, fraction, hours in hos_plan['events']:
+            events_by_leg.setdefault(leg_index, []).append((kind, fraction, hours))
+
+        def at(hours):
+            return departure + datetime.timedelta(hours=hours)
+
+        stops = []
+        miles_before = 0.0
+        for leg_index, (index, leg) in enumerate(zip(order, legs)):
+            for kind, fraction, hours in events_by_leg.get(leg_index, []):
+                lat, lng = interpolate_along_linestring(leg['coordinates'], fraction)
+                stops.append(Stop(
+                    trip=trip,
+                    stop_type=kind,
+                    location=f"{labels[kind]} at {lat:.5f},{lng:.5f}",
+                    latitude=lat,
+                    longitude=lng,
+                    arrival_time=at(hours),
+                    departure_time=at(hours + durations[kind]),
+                    duration=durations[kind],
+                    distance_from_start=miles_before + leg['distance_miles'] * fraction,
+                    sequence=len(stops) + 1,
+                ))
+            miles_before += leg['distance_miles']
+            stop, location = requested[index], stop_locations[index]
+            arrival = hos_plan['arrivals'][leg_index]
+            stops.append(Stop(
+                trip=trip,
+                stop_type=stop['stop_type'],
+                location=location['address'],
+                latitude=location['latitude'],
+                longitude=location['longitude'],
+                arrival_time=at(arrival),
+                departure_time=at(arrival + stop['duration']),
+                duration=stop['duration'],
+                window_start=stop.get('window_start'),
+                window_end=stop.get('window_end'),
+                pinned=stop.get('position') is not None,
+                distance_from_start=miles_before,
+                sequence=len(stops) + 1,
+            ))
+        return stops
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def geometry(self, request, pk=None):
+        """
+        Stream the trip's route geometry and stops as a GeoJSON FeatureCollection
+        """
+        if not Trip.objects.filter(pk=pk).exists():
+            return Response({'error': 'Trip not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(_stream_trip_geojson(pk), content_type='application/geo+json')
+        response['Content-Disposition'] = f'inline; filename="trip_{pk}.geojson"'
+        return response
+
+    @action(
+        detail=True, methods=['get'], permission_classes=[AllowAny], authentication_classes=[],
+        url_path=r'tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)',
+    )
+    def tiles(self, request, pk=None, z=None, x=None, y=None):
+        """
+        Return route geometry clipped to a z/x/y tile and simplified for its zoom level
+        """
+        z, x, y = int(z), int(x), int(y)
+        if z > 22 or x >= 2 ** z or y >= 2 ** z:
+            return Response({'error': 'Invalid tile coordinates'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Trip.objects.filter(pk=pk).exists():
+            return Response({'error': 'Trip not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        bounds = tile_bounds(z, x, y)
+        tolerance = tile_tolerance(z)
+        features = []
+        segments = RouteSegment.objects.filter(trip_id=pk).only('id', 'sequence', 'polyline')
+        for segment in segments:
+            coords = _segment_coordinates(segment)
+            for piece in clip_linestring(simplify_linestring(coords, tolerance), bounds):
+                features.append(_line_feature(piece, {'segment': segment.id, 'sequence': segment.sequence}))
+
+        response = Response({'type': 'FeatureCollection', 'features': features})
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
+
+
+def _segment_coordinates(segment):
+    """Decode a RouteSegment polyline (JSON list of [lat, lng]) into tuples."""
+    try:
+        return [(lat, lng) for lat, lng in json.loads(segment.polyline or '[]')]
+    except (ValueError, TypeError):
+        return []
+
+
+def _line_feature(coords, properties):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'LineString', 'coordinates': [[lng, lat] for lat, lng in coords]},
+        'properties': properties,
+    }
+
+
+def _stream_trip_geojson(trip_id):
+    """Yield a GeoJSON FeatureCollection one feature at a time."""
+    yield '{"type":"FeatureCollection","features":['
+    first = True
+    segments = RouteSegment.objects.filter(trip_id=trip_id).only('id', 'sequence', 'distance', 'polyline')
+    for segment in segments.iterator(chunk_size=50):
+        feature = _line_feature(_segment_coordinates(segment), {
+            'kind': 'route',
+            'segment': segment.id,
+            'sequence': segment.sequence,
+            'distance_miles': segment.distance,
+        })
+        yield ('' if first else ',') + json.dumps(feature, separators=(',', ':'))
+        first = False
+    for stop in Stop.objects.filter(trip_id=trip_id).iterator(chunk_size=500):
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [stop.longitude, stop.latitude]},
+            'properties': {
+                'kind': 'stop',
+                'stop_type': stop.stop_type,
+                'location': stop.location,
+                'sequence': stop.sequence,
+            },
+        }
+        yield ('' if first else ',') + json.dumps(feature, separators=(',', ':'))
+        first = False
+    yield ']}'
+
 
 class GeocodingView(APIView):
     """
@@ -245,7 +377,7 @@ class GeocodingView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        geocoding_service = GeocodingService()
+        geocoding_service = GeocodingService(MapboxBudget.for_request(request))
         data = serializer.validated_data
         if data.get('query'):
             result = geocoding_service.search(data['query'])
@@ -256,10 +388,63 @@ class GeocodingView(APIView):
         
         if result['success']:
             return Response(result)
+        elif result.get('retry_after'):
+            return Response(result, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                            headers={'Retry-After': str(result['retry_after'])})
         else:
             return Response(result, status=status.HTTP_400_BAD_REQUEST)
 
 
+class MatrixView(APIView):
+    """
+    View for travel distances and durations from every source to every destination
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        serializer = MatrixSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        from .matrix import MatrixService
+
+        data = serializer.validated_data
+        matrix = MatrixService(MapboxBudget.for_request(request)).matrix(data['sources'], data.get('destinations'))
+        return Response({
+            'distances_miles': matrix.distances.round(3).tolist(),
+            'durations_hours': matrix.durations.round(4).tolist(),
+            'estimated': matrix.estimated.tolist(),
+            **matrix.summary(),
+        })
+
+
+class BreadcrumbView(APIView):
+    """
+    View to upload GPS pings in batches and read them back downsampled for the map
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        serializer = BreadcrumbQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(breadcrumb_track(**serializer.validated_data))
+
+    def post(self, request):
+        serializer = BreadcrumbBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        if not User.objects.filter(pk=data['user_id']).exists():
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        if data.get('trip_id') is not None and not Trip.objects.filter(pk=data['trip_id']).exists():
+            return Response({'error': 'Trip not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        received = record_breadcrumbs(data['user_id'], data['points'], trip_id=data.get('trip_id'))
+        return Response({'received': received}, status=status.HTTP_201_CREATED)
+
+
 class MapboxTokenView(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []
@@ -1,5 +1,9 @@
 """
 ASGI config for truck_driver_project project.
+
+Serves the Django app plus the Server-Sent Events stream of change events
+(settings.EVENTS_PATH), which is handled here directly so long-lived
+connections do not each hold a Django worker thread.
 """
 
 import os
@@ -8,4 +12,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_driver_project.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from django.conf import settings  # noqa: E402
+from .events import sse_application  # noqa: E402
+
+EVENTS_PATH = getattr(settings, 'EVENTS_PATH', '/api/events/')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await sse_application(scope, receive, send)
+    return await django_application(scope, receive, send)
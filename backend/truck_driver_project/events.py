@@ -0,0 +1,197 @@
+"""
+In-process change event broker and the Server-Sent Events endpoint that streams it
+
+Models publish compact events (e.g. 'logsheet.updated') when their writes
+commit; connected clients receive the events matching their filters and
+update their views instead of polling. The broker lives in the serving
+process, so every client only sees writes made by that same process:
+run a single ASGI process (or put a shared broker behind `broker`) when
+scaling out.
+"""
+import asyncio
+import collections
+import json
+import threading
+import uuid
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+# Query parameters a client can filter on, matched against the event data
+FILTER_FIELDS = ('user_id', 'trip_id', 'log_sheet_id')
+
+
+class Subscription:
+    """A client's queue of matching events, owned by the event loop serving it."""
+
+    def __init__(self, loop, filters, queue_size):
+        self.loop = loop
+        self.filters = filters
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def matches(self, event):
+        return all(event['data'].get(name) == value for name, value in self.filters.items())
+
+    def deliver(self, event):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client fell behind: drop what it has not read and have it refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'id': event['id'], 'type': 'resync', 'data': {}})
+
+
+class EventBroker:
+    """
+    Thread-safe publish/subscribe hub with a short replay history
+
+    publish() may be called from any thread (sync views run in worker
+    threads); events are handed to each subscriber's event loop. Event ids
+    are "<process epoch>-<sequence>", so a client reconnecting with a
+    Last-Event-ID from before a restart (or from another process) is told
+    to resync rather than silently missing events.
+    """
+
+    def __init__(self, history=1000, queue_size=500):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = collections.deque(maxlen=history)
+        self._sequence = 0
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, event_type, data):
+        """Send an event to every matching subscriber and return it."""
+        with self._lock:
+            self._sequence += 1
+            event = {'id': f"{self.epoch}-{self._sequence}", 'type': event_type, 'data': data}
+            self._history.append((self._sequence, event))
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.matches(event):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+                except RuntimeError:
+                    # Its event loop is gone
+                    self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, filters=None, last_event_id=None):
+        """
+        Register a subscriber on the running event loop
+
+        Args:
+            filters: {field: value} the event data must match
+            last_event_id: Id of the last event the client saw; missed
+                events still in the history are queued first (or a
+                'resync' event when they are not)
+        """
+        subscription = Subscription(asyncio.get_running_loop(), filters or {}, self.queue_size)
+        with self._lock:
+            if last_event_id:
+                for event in self._missed(last_event_id):
+                    if event['type'] == 'resync' or subscription.matches(event):
+                        subscription.deliver(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _missed(self, last_event_id):
+        epoch, _, sequence = last_event_id.partition('-')
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) < oldest - 1:
+            return [{'id': f"{self.epoch}-{self._sequence}", 'type': 'resync', 'data': {}}]
+        return [event for number, event in self._history if number > int(sequence)]
+
+
+broker = EventBroker(
+    history=getattr(settings, 'EVENTS_HISTORY', 1000),
+    queue_size=getattr(settings, 'EVENTS_QUEUE_SIZE', 500),
+)
+
+
+def publish_on_commit(event_type, data):
+    """Publish an event once the current transaction commits (at once outside a transaction)."""
+    if broker.has_subscribers():
+        transaction.on_commit(lambda: broker.publish(event_type, data))
+
+
+def format_event(event):
+    """Encode an event in the text/event-stream format."""
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _respond(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def sse_application(scope, receive, send):
+    """
+    ASGI app streaming change events to one client as Server-Sent Events
+
+    Query parameters user_id, trip_id and log_sheet_id narrow the stream.
+    Browsers' EventSource reconnects on its own and sends Last-Event-ID,
+    which replays the events it missed.
+    """
+    if scope['method'] != 'GET':
+        return await _respond(send, 405, {'error': 'Method not allowed'})
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    filters = {}
+    for name in FILTER_FIELDS:
+        if name in params:
+            try:
+                filters[name] = int(params[name][-1])
+            except ValueError:
+                return await _respond(send, 400, {name: ['A valid integer is required.']})
+    headers = dict(scope.get('headers') or [])
+    last_event_id = headers.get(b'last-event-id', b'').decode('latin-1') or params.get('last_event_id', [''])[-1]
+
+    subscription = broker.subscribe(filters, last_event_id)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),  # Stop nginx from buffering the stream
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        while True:
+            received = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({received, disconnected}, timeout=heartbeat,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if received not in done:
+                received.cancel()
+                if disconnected in done:
+                    break
+                # Comment line: keeps proxies from closing an idle stream
+                chunk = ': keepalive\n\n'
+            else:
+                events = [received.result()]
+                while not subscription.queue.empty():
+                    events.append(subscription.queue.get_nowait())
+                chunk = ''.join(format_event(event) for event in events)
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+    except OSError:
+        pass  # Client went away mid-write
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
@@ -0,0 +1,206 @@
+"""
+Custom middleware for the truck driver project
+"""
+import gzip
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .routers import RequestRoute, replica_alias, reset_route, set_route
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+def _parse_accept_encoding(header):
+    """Return a dict of coding -> q-value from an Accept-Encoding header."""
+    codings = {}
+    for part in header.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        coding, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+def _is_compressible(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return (
+        content_type.startswith('text/')
+        or 'json' in content_type
+        or 'javascript' in content_type
+        or 'xml' in content_type
+    )
+
+
+def _gzip_stream(chunks, level):
+    # wbits=31 produces a gzip container around the deflate stream
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = z.compress(chunk)
+        if data:
+            yield data
+    yield z.flush()
+
+
+def _brotli_stream(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress text/JSON responses with brotli or gzip, negotiated from the
+    client's Accept-Encoding header.
+
+    Brotli is preferred when the ``brotli`` package is installed and the
+    client accepts it. Responses smaller than RESPONSE_COMPRESSION_MIN_SIZE
+    bytes, responses that are already encoded and binary payloads (PDFs,
+    ZIPs) are passed through untouched.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        # Avoid re-encoding and leave binary formats alone
+        if response.has_header('Content-Encoding'):
+            return response
+        if not _is_compressible(response.get('Content-Type')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = self._negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            if encoding == 'br':
+                response.streaming_content = _brotli_stream(
+                    response.streaming_content,
+                    getattr(settings, 'BROTLI_QUALITY', 5),
+                )
+            else:
+                response.streaming_content = _gzip_stream(
+                    response.streaming_content,
+                    getattr(settings, 'GZIP_LEVEL', 6),
+                )
+            # Compressed size of a stream is unknown until it has been sent
+            if response.has_header('Content-Length'):
+                del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(
+                    response.content, quality=getattr(settings, 'BROTLI_QUALITY', 5)
+                )
+            else:
+                compressed = gzip.compress(
+                    response.content, compresslevel=getattr(settings, 'GZIP_LEVEL', 6), mtime=0
+                )
+            # Only use the compressed content if it is actually shorter
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag no longer matches the encoded bytes
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+
+        return response
+
+    @staticmethod
+    def _negotiate(accept_encoding):
+        """Pick 'br' or 'gzip' (in that order of preference), or None."""
+        codings = _parse_accept_encoding(accept_encoding)
+        wildcard = codings.get('*', 0.0)
+        best = None
+        best_q = 0.0
+        candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+        for coding in candidates:
+            q = codings.get(coding, wildcard)
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _routed_stream(route, chunks):
+    # Streaming bodies are produced after the middleware returns: restore the
+    # request's routing around each chunk
+    iterator = iter(chunks)
+    while True:
+        token = set_route(route)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            reset_route(token)
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe-method requests read from the read replica (see routers.py)
+
+    A request that writes sets a cookie holding the time until which the
+    client's reads stay on the primary (READ_YOUR_WRITES_SECONDS). Does
+    nothing when no replica is configured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        alias = replica_alias()
+        if alias is None:
+            return self.get_response(request)
+
+        cookie = getattr(settings, 'READ_YOUR_WRITES_COOKIE', 'db_primary_until')
+        try:
+            pinned = float(request.COOKIES.get(cookie, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        safe = request.method in SAFE_METHODS
+        route = RequestRoute(alias if safe and not pinned else None)
+
+        token = set_route(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_route(token)
+
+        # Unsafe methods count as writes even if they only wrote through a raw cursor
+        if route.wrote or (not safe and response.status_code < 400):
+            window = getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5)
+            response.set_cookie(cookie, f"{time.time() + window:.3f}", max_age=window,
+                                httponly=True, samesite='Lax')
+        elif response.streaming and not response.is_async and route.replica:
+            response.streaming_content = _routed_stream(route, response.streaming_content)
+        return response
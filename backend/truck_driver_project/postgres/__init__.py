@@ -0,0 +1,4 @@
+"""
+PostgreSQL database backend with optional psycopg connection pooling
+(ENGINE 'truck_driver_project.postgres'; see DB_CONN_MODE in settings)
+"""
@@ -0,0 +1,129 @@
+"""
+Django's PostgreSQL backend plus an optional per-process psycopg connection pool
+
+When the database settings carry a POOL dict, connect() borrows a connection
+from a psycopg_pool.ConnectionPool and close() hands it back, so Django's
+end-of-request close keeps the server connection open for the next request
+(and, on serverless platforms, for the next invocation in the same
+container). Without POOL the backend behaves exactly like the stock one.
+Either way it counts connects and the time they took, for connection_metrics().
+"""
+import atexit
+import collections
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+# (process id, alias) -> ConnectionPool; pools are never shared across a fork
+_pools = {}
+_lock = threading.Lock()
+_counters = collections.defaultdict(lambda: {'connects': 0, 'connect_ms': 0.0})
+
+POOL_DEFAULTS = {
+    'min_size': 1,
+    'max_size': 10,
+    'timeout': 10.0,         # Seconds to wait for a free connection
+    'max_idle': 300.0,       # Seconds before an idle connection above min_size is closed
+    'max_lifetime': 3600.0,  # Seconds before a connection is replaced
+    'check': True,           # Check connections (one round trip) before handing them out
+}
+
+
+def get_pool(alias, conn_params, options):
+    """Return this process's pool for a database alias, creating it on first use."""
+    key = (os.getpid(), alias)
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            try:
+                from psycopg_pool import ConnectionPool
+            except ImportError:
+                raise ImproperlyConfigured(
+                    "Pooled database connections require psycopg_pool (pip install 'psycopg[pool]')"
+                )
+            options = {**POOL_DEFAULTS, **options}
+            pool = ConnectionPool(
+                kwargs=conn_params,
+                min_size=options['min_size'],
+                max_size=options['max_size'],
+                timeout=options['timeout'],
+                max_idle=options['max_idle'],
+                max_lifetime=options['max_lifetime'],
+                check=ConnectionPool.check_connection if options['check'] else None,
+                name=alias,
+                open=True,
+            )
+            _pools[key] = pool
+            atexit.register(pool.close, timeout=5)
+    return pool
+
+
+def close_pools():
+    """Close every pool of this process (connections must have been handed back)."""
+    with _lock:
+        pools = [pool for (pid, _), pool in _pools.items() if pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        options = self.settings_dict.get('POOL')
+        if options is None:
+            connection = super().get_new_connection(conn_params)
+        else:
+            connection = get_pool(self.alias, conn_params, options).getconn()
+            isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+            if isolation_level is None:
+                self.isolation_level = base.IsolationLevel.READ_COMMITTED
+            else:
+                self.isolation_level = base.IsolationLevel(isolation_level)
+                connection.isolation_level = self.isolation_level
+        with _lock:
+            counters = _counters[self.alias]
+            counters['connects'] += 1
+            counters['connect_ms'] += (time.perf_counter() - started) * 1000
+        return connection
+
+    def _close(self):
+        if self.connection is not None and self.settings_dict.get('POOL') is not None:
+            pool = _pools.get((os.getpid(), self.alias))
+            if pool is not None:
+                # The pool rolls back an open transaction and drops a broken connection
+                with self.wrap_database_errors:
+                    return pool.putconn(self.connection)
+        return super()._close()
+
+
+def connection_metrics():
+    """
+    Per-alias connection settings and counters for this process
+
+    'connects' counts Django connects (new server connections, or borrows
+    from the pool); 'pool' holds psycopg_pool statistics when pooling is on.
+    """
+    from django.db import connections
+
+    metrics = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        counters = dict(_counters.get(alias) or {'connects': 0, 'connect_ms': 0.0})
+        counters['connect_ms'] = round(counters['connect_ms'], 1)
+        entry = {
+            'engine': settings_dict['ENGINE'],
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+            'server_side_cursors': not settings_dict.get('DISABLE_SERVER_SIDE_CURSORS', False),
+            'pooled': settings_dict.get('POOL') is not None,
+            **counters,
+        }
+        pool = _pools.get((os.getpid(), alias))
+        if pool is not None:
+            entry['pool'] = pool.get_stats()
+        metrics[alias] = entry
+    return metrics
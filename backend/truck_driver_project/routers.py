@@ -0,0 +1,77 @@
+"""
+Read-replica database routing
+
+ReplicaRoutingMiddleware marks each safe-method request (GET, HEAD,
+OPTIONS) as allowed to read from the replica alias; ReplicaRouter then
+sends its reads there. Everything else reads from the primary:
+
+- writes, and any request with an unsafe method (trip calculate, log sheet
+  generate, ...), so their reads see what they write
+- the rest of a request once it has written (e.g. a PDF download that
+  rehydrates an archived sheet), and reads inside transaction.atomic()
+- requests from a client that wrote less than READ_YOUR_WRITES_SECONDS
+  ago (tracked with a cookie), so replication lag never hides its own writes
+- code outside a request (jobs, management commands)
+"""
+import contextvars
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_route = contextvars.ContextVar('db_route', default=None)
+
+
+class RequestRoute:
+    """Routing state of one request: the replica alias it may read from, and whether it has written."""
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+def replica_alias():
+    """The configured replica alias, or None when no replica is configured."""
+    alias = getattr(settings, 'DB_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def current_route():
+    return _route.get()
+
+
+def set_route(route):
+    """Make `route` current; returns a token for reset_route()."""
+    return _route.set(route)
+
+
+def reset_route(token):
+    _route.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None or route.replica is None or route.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return route.replica
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            route.wrote = True
+        # Explicit, so instances read from the replica are still saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
@@ -4,10 +4,13 @@ Django settings for truck_driver_project project.
 
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from django.core.exceptions import ImproperlyConfigured
+
+# Load environment variables (Vercel sets them directly, so skip importing dotenv there)
+if not os.getenv('VERCEL'):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -36,10 +39,13 @@ INSTALLED_APPS = [
     # Local apps
     'trips',
     'logs',
+    'jobs',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'truck_driver_project.middleware.ReplicaRoutingMiddleware',
+    'truck_driver_project.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,7 +80,7 @@ if os.getenv('VERCEL'):
     # Vercel PostgreSQL
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'truck_driver_project.postgres',
             'NAME': os.getenv('POSTGRES_DATABASE'),
             'USER': os.getenv('POSTGRES_USER'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
@@ -86,7 +92,7 @@ else:
     # Local development
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'truck_driver_project.postgres',
             'NAME': os.getenv('DB_NAME', 'truck_driver_db'),
             'USER': os.getenv('DB_USER', 'postgres'),
             'PASSWORD': os.getenv('DB_PASSWORD', 'postgres'),
@@ -95,6 +101,51 @@ else:
         }
     }
 
+# Database connection handling (DB_CONN_MODE):
+#   direct      a new connection per request (Django's default behaviour)
+#   persistent  each worker thread keeps its connection for DB_CONN_MAX_AGE seconds,
+#               checked before reuse
+#   pooled      connections are borrowed from a per-process psycopg pool (DB_POOL_*)
+#               and returned at the end of each request
+#   pgbouncer   connect through pgbouncer in transaction pooling mode: no server-side
+#               cursors or prepared statements, which need a session-bound server connection
+DB_CONN_MODE = os.getenv('DB_CONN_MODE', 'persistent')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+if DB_CONN_MODE == 'persistent':
+    DATABASES['default'].update(CONN_MAX_AGE=DB_CONN_MAX_AGE, CONN_HEALTH_CHECKS=True)
+elif DB_CONN_MODE == 'pooled':
+    DATABASES['default']['POOL'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        'check': os.getenv('DB_POOL_CHECK', 'True') == 'True',
+    }
+elif DB_CONN_MODE == 'pgbouncer':
+    DATABASES['default'].update(
+        CONN_MAX_AGE=DB_CONN_MAX_AGE,
+        CONN_HEALTH_CHECKS=True,
+        DISABLE_SERVER_SIDE_CURSORS=True,
+        OPTIONS={'prepare_threshold': None},
+    )
+elif DB_CONN_MODE != 'direct':
+    raise ImproperlyConfigured(f"Unknown DB_CONN_MODE {DB_CONN_MODE!r}")
+
+# Read replica (optional, enabled by DB_REPLICA_HOST): GET/HEAD/OPTIONS requests read
+# from it, except for READ_YOUR_WRITES_SECONDS after the same client wrote
+DB_REPLICA_ALIAS = 'replica'
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+READ_YOUR_WRITES_COOKIE = 'db_primary_until'
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES[DB_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['truck_driver_project.routers.ReplicaRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -151,8 +202,17 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'truck_driver_project.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Response compression (brotli when installed, gzip otherwise)
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '5'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
@@ -174,4 +234,57 @@ if DEBUG:
     CORS_ALLOW_ALL_ORIGINS = True
 
 # Map API settings
-MAP_API_KEY = os.getenv('MAP_API_KEY', '')
\ No newline at end of file
+MAP_API_KEY = os.getenv('MAP_API_KEY', '')
+
+# Mapbox call budgets: token buckets shared by all workers through the database.
+# Each client (user, or IP address) may burst MAPBOX_CLIENT_BURST calls, refilled
+# at MAPBOX_CLIENT_PER_MINUTE, and all clients together MAPBOX_GLOBAL_BURST /
+# MAPBOX_GLOBAL_PER_MINUTE; over budget, geocoding and directions fall back to
+# cached or local results. A per-minute rate of 0 disables that budget.
+MAPBOX_CLIENT_PER_MINUTE = float(os.getenv('MAPBOX_CLIENT_PER_MINUTE', '20'))
+MAPBOX_CLIENT_BURST = float(os.getenv('MAPBOX_CLIENT_BURST', '40'))
+MAPBOX_GLOBAL_PER_MINUTE = float(os.getenv('MAPBOX_GLOBAL_PER_MINUTE', '300'))
+MAPBOX_GLOBAL_BURST = float(os.getenv('MAPBOX_GLOBAL_BURST', '300'))
+MAPBOX_CACHE_TIMEOUT = int(os.getenv('MAPBOX_CACHE_TIMEOUT', str(24 * 60 * 60)))  # Seconds
+
+# Travel matrices (trips/matrix.py): days a cached Mapbox cell is trusted, and
+# whole matrices kept in memory per process
+MATRIX_CELL_MAX_AGE_DAYS = int(os.getenv('MATRIX_CELL_MAX_AGE_DAYS', '30'))
+MATRIX_MEMORY_ENTRIES = int(os.getenv('MATRIX_MEMORY_ENTRIES', '256'))
+
+# Seconds a rendered log sheet PDF stays in the cache
+PDF_CACHE_TIMEOUT = int(os.getenv('PDF_CACHE_TIMEOUT', str(24 * 60 * 60)))
+
+# Decimal places kept for route coordinates in API responses (5 ~= 1.1 m)
+ROUTE_COORDINATE_PRECISION = int(os.getenv('ROUTE_COORDINATE_PRECISION', '5'))
+
+# Background jobs (run with `python manage.py run_jobs --workers N`)
+JOB_RESULT_DIR = 'jobs'  # Under MEDIA_ROOT
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', str(24 * 60 * 60)))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', '30'))
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', str(15 * 60)))
+JOB_PURGE_INTERVAL = int(os.getenv('JOB_PURGE_INTERVAL', '60'))
+
+# Carrier and device details written to FMCSA ELD output files
+ELD_CARRIER_NAME = os.getenv('ELD_CARRIER_NAME', '')
+ELD_CARRIER_USDOT = os.getenv('ELD_CARRIER_USDOT', '')
+ELD_REGISTRATION_ID = os.getenv('ELD_REGISTRATION_ID', '')
+ELD_IDENTIFIER = os.getenv('ELD_IDENTIFIER', '')
+ELD_HOME_TIMEZONE = os.getenv('ELD_HOME_TIMEZONE', TIME_ZONE)  # Home terminal time zone for event times
+
+# Server-sent change events, streamed by the ASGI app
+# (e.g. `uvicorn truck_driver_project.asgi:application`); the broker is in-process
+EVENTS_PATH = '/api/events/'
+EVENTS_HEARTBEAT = int(os.getenv('EVENTS_HEARTBEAT', '15'))  # Seconds between keepalives
+EVENTS_QUEUE_SIZE = 500  # Undelivered events per client before it is told to resync
+EVENTS_HISTORY = 1000  # Recent events kept for replay on reconnect
+
+# Cold archive of old certified log sheets (`python manage.py archive_log_sheets`)
+LOG_ARCHIVE_DIR = os.getenv('LOG_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+LOG_ARCHIVE_AFTER_DAYS = int(os.getenv('LOG_ARCHIVE_AFTER_DAYS', '365'))
+
+# Cold-start budget checked by `python manage.py profile_imports`: milliseconds to
+# import the Vercel entry point and load the URLconf, and modules that must stay lazy
+COLD_START_BUDGET_MS = int(os.getenv('COLD_START_BUDGET_MS', '1000'))
+COLD_START_FORBIDDEN_MODULES = ['reportlab.platypus', 'reportlab.pdfgen', 'geopy', 'numpy']
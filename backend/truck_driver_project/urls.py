@@ -3,9 +3,12 @@ URL configuration for truck_driver_project project.
 """
 from django.contrib import admin
 from django.urls import path, include
+from .views import DatabaseMetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('trips.urls')),
     path('api/', include('logs.urls')),
+    path('api/', include('jobs.urls')),
+    path('api/db/metrics/', DatabaseMetricsView.as_view(), name='db-metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Project-level API views
+"""
+import os
+
+from django.conf import settings
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .postgres.base import connection_metrics
+
+
+class DatabaseMetricsView(APIView):
+    """
+    Database connection mode, connect counters and pool statistics of the
+    process serving the request (each worker process has its own)
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        return Response({
+            'mode': getattr(settings, 'DB_CONN_MODE', 'direct'),
+            'pid': os.getpid(),
+            'databases': connection_metrics(),
+        })
@@ -0,0 +1,35 @@
+// Subscribe to server-sent change events (logsheet.updated, logsheet.deleted, trip.updated, ...)
+
+const EVENT_TYPES = ['logsheet.updated', 'logsheet.deleted', 'trip.updated', 'trip.deleted', 'resync'];
+
+// `filters` may hold user_id, trip_id or log_sheet_id; returns an unsubscribe function
+export function subscribeToChanges(filters, onEvent) {
+  if (typeof EventSource === 'undefined') return () => {};
+
+  const params = new URLSearchParams();
+  Object.entries(filters || {}).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') params.set(key, value);
+  });
+  const query = params.toString();
+  // EventSource reconnects by itself and resumes from the last event id it saw
+  const source = new EventSource(`/api/events/${query ? `?${query}` : ''}`, { withCredentials: true });
+
+  const listeners = EVENT_TYPES.map((type) => {
+    const listener = (message) => {
+      let data = {};
+      try {
+        data = JSON.parse(message.data);
+      } catch (err) {
+        return;
+      }
+      onEvent({ type, data });
+    };
+    source.addEventListener(type, listener);
+    return [type, listener];
+  });
+
+  return () => {
+    listeners.forEach(([type, listener]) => source.removeEventListener(type, listener));
+    source.close();
+  };
+}
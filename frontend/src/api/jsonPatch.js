@@ -0,0 +1,35 @@
+// Build JSON Patch (RFC 6902) operations describing how `before` became `after`
+
+const isPlainObject = (value) =>
+  value !== null && typeof value === 'object' && !Array.isArray(value);
+
+const escapeToken = (key) => String(key).replace(/~/g, '~0').replace(/\//g, '~1');
+
+// Round-trip through JSON so Dates etc. compare the way the server stores them
+export const toJSONValue = (value) => (value === undefined ? undefined : JSON.parse(JSON.stringify(value)));
+
+const isEqual = (a, b) => JSON.stringify(a) === JSON.stringify(b);
+
+const diff = (before, after, path, ops) => {
+  if (isPlainObject(before) && isPlainObject(after)) {
+    Object.keys(before).forEach((key) => {
+      if (!(key in after)) ops.push({ op: 'remove', path: `${path}/${escapeToken(key)}` });
+    });
+    Object.keys(after).forEach((key) => {
+      const childPath = `${path}/${escapeToken(key)}`;
+      if (!(key in before)) {
+        ops.push({ op: 'add', path: childPath, value: after[key] });
+      } else {
+        diff(before[key], after[key], childPath, ops);
+      }
+    });
+  } else if (!isEqual(before, after)) {
+    // Arrays and scalars are replaced whole; visual log data is keyed objects
+    ops.push({ op: 'replace', path, value: after });
+  }
+  return ops;
+};
+
+export function createPatch(before, after) {
+  return diff(toJSONValue(before) ?? {}, toJSONValue(after) ?? {}, '', []);
+}
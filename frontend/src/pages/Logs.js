@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useLocation } from 'react-router-dom';
 import { 
   Paper, 
@@ -52,6 +52,8 @@ import {
   Draw as DrawIcon,
 } from '@mui/icons-material';
 import client from '../api/client';
+import { subscribeToChanges } from '../api/events';
+import { createPatch, toJSONValue } from '../api/jsonPatch';
 import MultiLogSheet from '../components/MultiLogSheet';
 import LoadingSpinner from '../components/LoadingSpinner';
 import ErrorMessage from '../components/ErrorMessage';
@@ -67,6 +69,8 @@ export default function Logs() {
   const [selectedLog, setSelectedLog] = useState(null);
   const [viewMode, setViewMode] = useState('list'); // 'list' or 'visual'
   const [selectedTrip, setSelectedTrip] = useState(null);
+  // Last saved visual log data and version per sheet id (base for patches)
+  const savedVisual = useRef({});
   const [viewEditable, setViewEditable] = useState(true);
 
   const [openNew, setOpenNew] = useState(false);
@@ -115,30 +119,50 @@ export default function Logs() {
     }
   }, [location.pathname]);
 
-  // Refresh logs when the component becomes visible (e.g., when navigating from trip planner)
+  // Apply pushed changes instead of refetching every sheet on focus: changed
+  // sheets are fetched one by one (bursts coalesced), deleted ones dropped
+  const itemsRef = useRef(items);
+  itemsRef.current = items;
   useEffect(() => {
-    const handleVisibilityChange = () => {
-      if (!document.hidden) {
-        loadLogs(true); // Force refresh when page becomes visible
-      }
-    };
-
-    const handleFocus = () => {
-      loadLogs(true); // Force refresh when window gains focus
+    const pending = new Set();
+    let timer = null;
+
+    const refreshSheets = async () => {
+      const ids = [...pending];
+      pending.clear();
+      timer = null;
+      const sheets = await Promise.all(ids.map((id) => (
+        client.get(`logs/${id}/`).then(({ data }) => data).catch(() => null)
+      )));
+      setItems(prev => {
+        const next = [...prev];
+        sheets.forEach((sheet) => {
+          if (!sheet) return;
+          delete savedVisual.current[sheet.id];
+          const index = next.findIndex(item => item.id === sheet.id);
+          if (index >= 0) next[index] = sheet;
+          else next.push(sheet);
+        });
+        return next.sort((a, b) => (a.date < b.date ? 1 : a.date > b.date ? -1 : 0));
+      });
     };
 
-    // Listen for page visibility changes and window focus
-    document.addEventListener('visibilitychange', handleVisibilityChange);
-    window.addEventListener('focus', handleFocus);
-
-    // Also refresh when the component mounts (in case user navigated from trip planner)
-    const timer = setTimeout(() => {
-      loadLogs(true); // Force refresh on mount
-    }, 100);
+    const unsubscribe = subscribeToChanges({}, ({ type, data }) => {
+      if (type === 'resync') {
+        loadLogs(true);
+      } else if (type === 'logsheet.deleted') {
+        setItems(prev => prev.filter(item => item.id !== data.log_sheet_id));
+      } else if (type === 'logsheet.updated') {
+        const current = itemsRef.current.find(item => item.id === data.log_sheet_id);
+        // Our own saves already updated the item in place
+        if (current && new Date(current.updated_at).getTime() === new Date(data.updated_at).getTime()) return;
+        pending.add(data.log_sheet_id);
+        if (!timer) timer = setTimeout(refreshSheets, 250);
+      }
+    });
 
     return () => {
-      document.removeEventListener('visibilitychange', handleVisibilityChange);
-      window.removeEventListener('focus', handleFocus);
+      unsubscribe();
       clearTimeout(timer);
     };
   }, []);
@@ -241,23 +265,41 @@ export default function Logs() {
     setSelectedTrip(null);
   };
 
+  // Send only what changed since the last save, guarded by the sheet's version
+  const saveVisualData = async (logData, logSheet) => {
+    const base = savedVisual.current[logSheet.id] || {
+      data: logSheet.visual_log_data || {},
+      version: logSheet.visual_log_version || 0,
+    };
+    const patch = createPatch(base.data, logData);
+    if (patch.length === 0) return;
+    try {
+      const { data } = await client.patch(`logs/${logSheet.id}/visual_data/`, {
+        version: base.version,
+        patch,
+      });
+      const saved = { data: toJSONValue(logData), version: data.visual_log_version };
+      savedVisual.current[logSheet.id] = saved;
+      setItems(prev => prev.map(item => (
+        item.id === logSheet.id
+          ? { ...item, visual_log_data: saved.data, visual_log_version: saved.version, updated_at: data.updated_at }
+          : item
+      )));
+    } catch (err) {
+      if (err?.response?.status === 409) {
+        // Someone else saved this sheet; reload it rather than overwrite their changes
+        delete savedVisual.current[logSheet.id];
+        await loadLogs(true);
+        throw new Error('This log sheet was changed elsewhere and has been reloaded. Please redo your last edit.');
+      }
+      throw err;
+    }
+  };
+
   const handleSaveLog = async (logData, logSheet) => {
     try {
       // Save visual log data to backend
-      try {
-        await client.put(`logs/${logSheet.id}/update_visual_data/`, {
-          visual_log_data: logData
-        });
-      } catch (err) {
-        if (err?.response?.status === 404) {
-          await client.put(`logs/${logSheet.id}/update_visual_data`, {
-            visual_log_data: logData
-          });
-        } else {
-          throw err;
-        }
-      }
-      await loadLogs(true); // Force refresh after saving visual data
+      await saveVisualData(logData, logSheet);
     } catch (err) {
       setError(err.response?.data?.error || err.message);
     }
@@ -276,19 +318,7 @@ export default function Logs() {
   const handleCertifyLog = async (logData, logSheet) => {
     try {
       // Save current visual entries first so they persist
-      try {
-        await client.put(`logs/${logSheet.id}/update_visual_data/`, {
-          visual_log_data: logData
-        });
-      } catch (err) {
-        if (err?.response?.status === 404) {
-          await client.put(`logs/${logSheet.id}/update_visual_data`, {
-            visual_log_data: logData
-          });
-        } else {
-          throw err;
-        }
-      }
+      await saveVisualData(logData, logSheet);
       // Then certify
       try {
         await client.post(`logs/${logSheet.id}/certify/`);